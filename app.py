@@ -1,5 +1,6 @@
 import os
 from flask import Flask
+from werkzeug.middleware.proxy_fix import ProxyFix
 from flask_wtf.csrf import CSRFProtect
 from dotenv import load_dotenv
 from routes.agb import agb_bp
@@ -9,6 +10,12 @@ load_dotenv()
 def create_app():
     app = Flask(__name__)
 
+    # Behind nginx/a load balancer, take the client address from the
+    # X-Forwarded-* headers the trusted proxies set (per-IP limits use it)
+    proxy_hops = int(os.getenv('TRUSTED_PROXY_HOPS', 0))
+    if proxy_hops:
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=proxy_hops, x_proto=proxy_hops)
+
     app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'dev-secret-key')
     app.config['SUPABASE_URL'] = os.getenv('SUPABASE_URL')
     app.config['SUPABASE_KEY'] = os.getenv('SUPABASE_KEY')
@@ -20,6 +27,55 @@ def create_app():
     app.config['MAIL_USERNAME'] = os.getenv('MAIL_USERNAME')
     app.config['MAIL_PASSWORD'] = os.getenv('MAIL_PASSWORD')
     app.config['MAIL_DEFAULT_SENDER'] = os.getenv('MAIL_DEFAULT_SENDER', 'noreply@shcap.com')
+    app.config['MAIL_OUTBOX_ENABLED'] = os.getenv('MAIL_OUTBOX_ENABLED', 'True') == 'True'
+    app.config['MAIL_OUTBOX_BATCH_SIZE'] = int(os.getenv('MAIL_OUTBOX_BATCH_SIZE', 50))
+    app.config['MAIL_OUTBOX_POLL_INTERVAL'] = float(os.getenv('MAIL_OUTBOX_POLL_INTERVAL', 2))
+    app.config['MAIL_OUTBOX_MAX_ATTEMPTS'] = int(os.getenv('MAIL_OUTBOX_MAX_ATTEMPTS', 5))
+
+    app.config['USER_CACHE_TTL'] = int(os.getenv('USER_CACHE_TTL', 30))
+    app.config['COMPRESS_MIN_SIZE'] = int(os.getenv('COMPRESS_MIN_SIZE', 1024))
+    app.config['PREDICT_BATCH_MAX_POINTS'] = int(os.getenv('PREDICT_BATCH_MAX_POINTS', 1000))
+    app.config['MONTE_CARLO_MAX_DRAWS'] = int(os.getenv('MONTE_CARLO_MAX_DRAWS', 100000))
+    app.config['MONTE_CARLO_MEMORY_MB'] = int(os.getenv('MONTE_CARLO_MEMORY_MB', 64))
+    app.config['MONTE_CARLO_WORKERS'] = int(os.getenv('MONTE_CARLO_WORKERS', 2))
+    app.config['MODEL_WATCH_INTERVAL'] = float(os.getenv('MODEL_WATCH_INTERVAL', 10))
+    app.config['SINGLEFLIGHT_TIMEOUT'] = float(os.getenv('SINGLEFLIGHT_TIMEOUT', 10))
+    app.config['PREDICTION_RATE_LIMITS'] = os.getenv('PREDICTION_RATE_LIMITS', 'default=2/10,admin=20/50')
+    app.config['PREDICTION_WORKERS'] = int(os.getenv('PREDICTION_WORKERS', os.cpu_count() or 2))
+    app.config['PREDICTION_QUEUE_SIZE'] = int(os.getenv('PREDICTION_QUEUE_SIZE', 64))
+    app.config['PREDICTION_QUEUE_TIMEOUT'] = float(os.getenv('PREDICTION_QUEUE_TIMEOUT', 30))
+    app.config['PREDICTION_RUN_GRACE'] = float(os.getenv('PREDICTION_RUN_GRACE', 30))
+    app.config['DATABASE_REPLICA_URLS'] = os.getenv('DATABASE_REPLICA_URLS', '')
+    app.config['REPLICA_MAX_LAG_SECONDS'] = float(os.getenv('REPLICA_MAX_LAG_SECONDS', 5))
+    app.config['REPLICA_HEALTH_INTERVAL'] = float(os.getenv('REPLICA_HEALTH_INTERVAL', 5))
+    app.config['READ_YOUR_WRITES_SECONDS'] = float(os.getenv('READ_YOUR_WRITES_SECONDS', 15))
+    app.config['DB_POOL_MIN_SIZE'] = int(os.getenv('DB_POOL_MIN_SIZE', 1))
+    app.config['DB_POOL_MAX_SIZE'] = int(os.getenv('DB_POOL_MAX_SIZE', 10))
+    app.config['DB_POOL_TIMEOUT'] = float(os.getenv('DB_POOL_TIMEOUT', 30))
+    app.config['DB_PREPARE_STATEMENTS'] = os.getenv('DB_PREPARE_STATEMENTS', 'True') == 'True'
+    app.config['DB_SLOW_QUERY_MS'] = float(os.getenv('DB_SLOW_QUERY_MS', 500))
+    app.config['DB_SLOW_QUERY_EXPLAIN_INTERVAL'] = float(os.getenv('DB_SLOW_QUERY_EXPLAIN_INTERVAL', 300))
+    app.config['ASYNC_DB_POOL_MIN_SIZE'] = int(os.getenv('ASYNC_DB_POOL_MIN_SIZE', 1))
+    app.config['ASYNC_DB_POOL_MAX_SIZE'] = int(os.getenv('ASYNC_DB_POOL_MAX_SIZE', 10))
+    app.config['ASYNC_DB_POOL_TIMEOUT'] = float(os.getenv('ASYNC_DB_POOL_TIMEOUT', 30))
+    app.config['TILE_CACHE_DIR'] = os.getenv('TILE_CACHE_DIR', 'tile_cache')
+    app.config['TILE_CACHE_MAX_ZOOM'] = int(os.getenv('TILE_CACHE_MAX_ZOOM', 16))
+
+    app.config['SESSION_COOKIE_SAMESITE'] = os.getenv('SESSION_COOKIE_SAMESITE', 'Lax')
+    app.config['SESSION_BACKEND'] = os.getenv('SESSION_BACKEND', 'cookie')
+    app.config['SESSION_SQLITE_PATH'] = os.getenv('SESSION_SQLITE_PATH', 'sessions.sqlite3')
+    app.config['SESSION_CACHE_TTL'] = int(os.getenv('SESSION_CACHE_TTL', 5))
+    app.config['SESSION_TOUCH_INTERVAL'] = int(os.getenv('SESSION_TOUCH_INTERVAL', 30))
+
+    app.config['TOKEN_PURGE_INTERVAL'] = int(os.getenv('TOKEN_PURGE_INTERVAL', 3600))
+    app.config['TOKEN_PURGE_BATCH_SIZE'] = int(os.getenv('TOKEN_PURGE_BATCH_SIZE', 1000))
+
+    app.config['BCRYPT_ROUNDS'] = int(os.getenv('BCRYPT_ROUNDS', 12))
+    app.config['PASSWORD_HASH_WORKERS'] = int(os.getenv('PASSWORD_HASH_WORKERS', max(1, (os.cpu_count() or 2) // 2)))
+    app.config['PASSWORD_HASH_PER_IP_LIMIT'] = int(os.getenv('PASSWORD_HASH_PER_IP_LIMIT', 2))
+
+    from utils.session_store import init_session_store
+    init_session_store(app)
 
     #debug line
     print(f" CSRF Enabled: {app.config.get('WTF_CSRF_ENABLED', 'Not Set')}")
@@ -36,6 +92,35 @@ def create_app():
     app.register_blueprint(public_bp)
     app.register_blueprint(agb_bp, url_prefix='/agb')
 
+    from utils.compression import init_compression
+    init_compression(app)
+
+    from utils.assets import init_assets
+    init_assets(app)
+
+    from utils.database import init_replicas
+    init_replicas(app)
+
+    from ml.services.model_registry import init_model_watcher
+    init_model_watcher(app)
+
+    from utils.email_templates import preload_email_templates
+    preload_email_templates()
+
+    from models.user import UserToken
+    from utils.background import PeriodicTask, start_on_first_request
+    token_purge = PeriodicTask(
+        'token-purge',
+        app.config['TOKEN_PURGE_INTERVAL'],
+        lambda: UserToken.delete_expired_tokens(batch_size=app.config['TOKEN_PURGE_BATCH_SIZE']),
+        app
+    )
+    start_on_first_request(app, token_purge)
+
+    if app.config['MAIL_OUTBOX_ENABLED']:
+        from utils.email_outbox import init_outbox
+        init_outbox(app)
+
     return app
 
 if __name__ == '__main__':
@@ -0,0 +1,95 @@
+# Script to Backfill Simplified Project Boundaries and Bounding Boxes
+
+import argparse
+import json
+import os
+import time
+
+import psycopg2
+from psycopg2.extras import execute_values
+from dotenv import load_dotenv
+
+from utils.geometry import GeometryError, boundary_bbox, repair_boundary, simplify_boundary
+
+load_dotenv()
+
+
+def backfill(database_url, batch_size):
+    """Compute boundary_simplified and the bounding box for projects that
+    do not have them yet.
+
+    Rows are visited in id order in batches, each committed on its own.
+    Stored boundaries are left as they are: a boundary is only repaired in
+    memory to simplify it, and ones that cannot be repaired are reported
+    and left at full resolution (they still get a bounding box, so they
+    are drawn on map tiles).
+    """
+    conn = psycopg2.connect(database_url)
+    last_id = 0
+    updated = invalid = 0
+    started = time.time()
+    try:
+        while True:
+            with conn, conn.cursor() as cursor:
+                cursor.execute("""
+                    SELECT id, boundary_coordinates
+                    FROM projects
+                    WHERE id > %s AND (boundary_simplified IS NULL OR bbox_min_lng IS NULL)
+                    ORDER BY id
+                    LIMIT %s
+                """, (last_id, batch_size))
+                rows = cursor.fetchall()
+                if not rows:
+                    break
+
+                values = []
+                for project_id, boundary in rows:
+                    if isinstance(boundary, str):
+                        boundary = json.loads(boundary)
+                    try:
+                        points, _ = repair_boundary(boundary)
+                        simplified = json.dumps(simplify_boundary(points))
+                    except GeometryError as e:
+                        print(f" Project {project_id}: {e}")
+                        invalid += 1
+                        points, simplified = boundary, None
+                    try:
+                        bbox = boundary_bbox(points) or (None, None, None, None)
+                    except GeometryError:
+                        bbox = (None, None, None, None)
+                    values.append((project_id, simplified, *bbox))
+
+                execute_values(cursor, """
+                    UPDATE projects
+                    SET boundary_simplified = data.simplified::jsonb,
+                        bbox_min_lng = data.min_lng::double precision,
+                        bbox_min_lat = data.min_lat::double precision,
+                        bbox_max_lng = data.max_lng::double precision,
+                        bbox_max_lat = data.max_lat::double precision
+                    FROM (VALUES %s) AS data (id, simplified, min_lng, min_lat, max_lng, max_lat)
+                    WHERE projects.id = data.id
+                """, values)
+                updated += len(values)
+                last_id = rows[-1][0]
+            print(f" Projects: {updated} updated, {invalid} invalid ({time.time() - started:.1f}s)")
+    finally:
+        conn.close()
+    return updated, invalid
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Backfill simplified project boundaries and bounding boxes')
+    parser.add_argument('--batch-size', type=int, default=1000, help='Projects processed per transaction')
+    args = parser.parse_args()
+
+    database_url = os.getenv('DATABASE_URL')
+    if not database_url:
+        print("❌ DATABASE_URL not found in environment variables")
+        return
+
+    backfill(database_url, args.batch_size)
+    print("✅ Project boundaries backfilled successfully!")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+# Script to Fingerprint and Precompress Static Assets
+
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import shutil
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_SOURCE = os.path.join(ROOT, 'static')
+DEFAULT_OUTPUT = os.path.join(ROOT, 'static', 'dist')
+
+# Formats that are already compressed gain nothing from gzip/brotli
+SKIP_COMPRESSION = {'.png', '.jpg', '.jpeg', '.gif', '.webp', '.woff', '.woff2', '.gz', '.br', '.zip', '.pdf'}
+
+# Variants smaller than this are not worth the extra file
+MIN_COMPRESS_SIZE = 256
+
+
+def fingerprint(path, content):
+    """css/base.css -> css/base.3f2a9c1d0b7e.css"""
+    digest = hashlib.sha256(content).hexdigest()[:12]
+    stem, ext = os.path.splitext(path)
+    return f"{stem}.{digest}{ext}"
+
+
+def write_variants(target, content):
+    """Write gzip and brotli variants next to an asset when they are smaller"""
+    variants = []
+    if os.path.splitext(target)[1].lower() in SKIP_COMPRESSION or len(content) < MIN_COMPRESS_SIZE:
+        return variants
+
+    # mtime=0 keeps gzip output byte-for-byte reproducible between builds
+    gzipped = gzip.compress(content, compresslevel=9, mtime=0)
+    if len(gzipped) < len(content):
+        with open(target + '.gz', 'wb') as f:
+            f.write(gzipped)
+        variants.append('gzip')
+
+    if brotli is not None:
+        compressed = brotli.compress(content, quality=11)
+        if len(compressed) < len(content):
+            with open(target + '.br', 'wb') as f:
+                f.write(compressed)
+            variants.append('br')
+
+    return variants
+
+
+def build(source, output):
+    """Copy every asset under `source` to a content-hashed name in `output`"""
+    if os.path.isdir(output):
+        shutil.rmtree(output)
+    os.makedirs(output)
+
+    manifest = {}
+    for dirpath, dirnames, filenames in os.walk(source):
+        # Never re-process a previous build
+        dirnames[:] = [d for d in dirnames if os.path.join(dirpath, d) != output]
+
+        for filename in sorted(filenames):
+            src = os.path.join(dirpath, filename)
+            logical = os.path.relpath(src, source).replace(os.sep, '/')
+            with open(src, 'rb') as f:
+                content = f.read()
+
+            hashed = fingerprint(logical, content)
+            target = os.path.join(output, hashed)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            with open(target, 'wb') as f:
+                f.write(content)
+
+            variants = write_variants(target, content)
+            manifest[logical] = hashed
+            print(f" {logical} -> {hashed} {' '.join(variants)}")
+
+    with open(os.path.join(output, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build fingerprinted, precompressed static assets')
+    parser.add_argument('--source', default=DEFAULT_SOURCE)
+    parser.add_argument('--output', default=DEFAULT_OUTPUT)
+    args = parser.parse_args()
+
+    if brotli is None:
+        print("brotli not installed - only gzip variants will be written")
+
+    manifest = build(args.source, args.output)
+    print(f"✅ Built {len(manifest)} assets into {args.output}")
+
+
+if __name__ == "__main__":
+    main()
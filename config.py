@@ -15,6 +15,58 @@ class Config:
     MAIL_USERNAME = os.getenv('MAIL_USERNAME')
     MAIL_PASSWORD = os.getenv('MAIL_PASSWORD')
     MAIL_DEFAULT_SENDER = os.getenv('MAIL_DEFAULT_SENDER', 'noreply@shcap.com')
+    MAIL_OUTBOX_ENABLED = os.getenv('MAIL_OUTBOX_ENABLED', 'True') == 'True'
+    MAIL_OUTBOX_BATCH_SIZE = int(os.getenv('MAIL_OUTBOX_BATCH_SIZE', 50))
+    MAIL_OUTBOX_POLL_INTERVAL = float(os.getenv('MAIL_OUTBOX_POLL_INTERVAL', 2))
+    MAIL_OUTBOX_MAX_ATTEMPTS = int(os.getenv('MAIL_OUTBOX_MAX_ATTEMPTS', 5))
+
+    USER_CACHE_TTL = int(os.getenv('USER_CACHE_TTL', 30))
+    COMPRESS_MIN_SIZE = int(os.getenv('COMPRESS_MIN_SIZE', 1024))
+    PREDICT_BATCH_MAX_POINTS = int(os.getenv('PREDICT_BATCH_MAX_POINTS', 1000))
+    MONTE_CARLO_MAX_DRAWS = int(os.getenv('MONTE_CARLO_MAX_DRAWS', 100000))
+    MONTE_CARLO_MEMORY_MB = int(os.getenv('MONTE_CARLO_MEMORY_MB', 64))
+    MONTE_CARLO_WORKERS = int(os.getenv('MONTE_CARLO_WORKERS', 2))
+    MODEL_REGISTRY_DIR = os.getenv('MODEL_REGISTRY_DIR')
+    MODEL_CACHE_MAX_MB = float(os.getenv('MODEL_CACHE_MAX_MB', 1024))
+    MODEL_WATCH_INTERVAL = float(os.getenv('MODEL_WATCH_INTERVAL', 10))
+    MODEL_FOLD_SCALER = os.getenv('MODEL_FOLD_SCALER', 'True') == 'True'
+    MODEL_FLOAT32 = os.getenv('MODEL_FLOAT32', 'False') == 'True'
+    SHADOW_SAMPLE_RATE = float(os.getenv('SHADOW_SAMPLE_RATE', 0))
+    SHADOW_WORKERS = int(os.getenv('SHADOW_WORKERS', 1))
+    SHADOW_QUEUE_SIZE = int(os.getenv('SHADOW_QUEUE_SIZE', 64))
+    SINGLEFLIGHT_TIMEOUT = float(os.getenv('SINGLEFLIGHT_TIMEOUT', 10))
+    PREDICTION_RATE_LIMITS = os.getenv('PREDICTION_RATE_LIMITS', 'default=2/10,admin=20/50')
+    PREDICTION_WORKERS = int(os.getenv('PREDICTION_WORKERS', os.cpu_count() or 2))
+    PREDICTION_QUEUE_SIZE = int(os.getenv('PREDICTION_QUEUE_SIZE', 64))
+    PREDICTION_QUEUE_TIMEOUT = float(os.getenv('PREDICTION_QUEUE_TIMEOUT', 30))
+    PREDICTION_RUN_GRACE = float(os.getenv('PREDICTION_RUN_GRACE', 30))
+    DATABASE_REPLICA_URLS = os.getenv('DATABASE_REPLICA_URLS', '')
+    REPLICA_MAX_LAG_SECONDS = float(os.getenv('REPLICA_MAX_LAG_SECONDS', 5))
+    REPLICA_HEALTH_INTERVAL = float(os.getenv('REPLICA_HEALTH_INTERVAL', 5))
+    READ_YOUR_WRITES_SECONDS = float(os.getenv('READ_YOUR_WRITES_SECONDS', 15))
+    DB_POOL_MIN_SIZE = int(os.getenv('DB_POOL_MIN_SIZE', 1))
+    DB_POOL_MAX_SIZE = int(os.getenv('DB_POOL_MAX_SIZE', 10))
+    DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', 30))
+    DB_PREPARE_STATEMENTS = os.getenv('DB_PREPARE_STATEMENTS', 'True') == 'True'
+    DB_SLOW_QUERY_MS = float(os.getenv('DB_SLOW_QUERY_MS', 500))
+    DB_SLOW_QUERY_EXPLAIN_INTERVAL = float(os.getenv('DB_SLOW_QUERY_EXPLAIN_INTERVAL', 300))
+    ASYNC_DB_POOL_MIN_SIZE = int(os.getenv('ASYNC_DB_POOL_MIN_SIZE', 1))
+    ASYNC_DB_POOL_MAX_SIZE = int(os.getenv('ASYNC_DB_POOL_MAX_SIZE', 10))
+    ASYNC_DB_POOL_TIMEOUT = float(os.getenv('ASYNC_DB_POOL_TIMEOUT', 30))
+    TILE_CACHE_DIR = os.getenv('TILE_CACHE_DIR', 'tile_cache')
+    TILE_CACHE_MAX_ZOOM = int(os.getenv('TILE_CACHE_MAX_ZOOM', 16))
+
+    SESSION_BACKEND = os.getenv('SESSION_BACKEND', 'cookie')
+    SESSION_SQLITE_PATH = os.getenv('SESSION_SQLITE_PATH', 'sessions.sqlite3')
+    SESSION_CACHE_TTL = int(os.getenv('SESSION_CACHE_TTL', 5))
+    SESSION_TOUCH_INTERVAL = int(os.getenv('SESSION_TOUCH_INTERVAL', 30))
+
+    TOKEN_PURGE_INTERVAL = int(os.getenv('TOKEN_PURGE_INTERVAL', 3600))
+    TOKEN_PURGE_BATCH_SIZE = int(os.getenv('TOKEN_PURGE_BATCH_SIZE', 1000))
+
+    BCRYPT_ROUNDS = int(os.getenv('BCRYPT_ROUNDS', 12))
+    PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', max(1, (os.cpu_count() or 2) // 2)))
+    PASSWORD_HASH_PER_IP_LIMIT = int(os.getenv('PASSWORD_HASH_PER_IP_LIMIT', 2))
 
     SESSION_COOKIE_SECURE = True
     SESSION_COOKIE_HTTPONLY = True
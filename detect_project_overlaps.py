@@ -0,0 +1,124 @@
+# Script to Detect Overlapping Carbon Projects
+
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+import psycopg2
+from psycopg2.extras import execute_values
+from dotenv import load_dotenv
+
+from utils.geometry import GeometryError, repair_boundary
+from utils.overlaps import MIN_OVERLAP_HECTARES, measure_overlap, overlapping_boxes
+
+load_dotenv()
+
+
+def load_boxes(cursor):
+    """Ids (ascending) and bounding boxes of every project with a boundary"""
+    cursor.execute("""
+        SELECT id, bbox_min_lng, bbox_min_lat, bbox_max_lng, bbox_max_lat
+        FROM projects
+        WHERE bbox_min_lng IS NOT NULL
+        ORDER BY id
+    """)
+    rows = cursor.fetchall()
+    ids = np.array([row[0] for row in rows], dtype=np.int64)
+    boxes = np.array([row[1:] for row in rows], dtype=float).reshape(-1, 4)
+    return ids, boxes
+
+
+def load_boundaries(cursor, project_ids, batch_size):
+    """{id: repaired boundary} for the given projects; boundaries that
+    cannot be repaired are reported and left out"""
+    boundaries = {}
+    for start in range(0, len(project_ids), batch_size):
+        batch = [int(project_id) for project_id in project_ids[start:start + batch_size]]
+        cursor.execute("SELECT id, boundary_coordinates FROM projects WHERE id = ANY(%s)", (batch,))
+        for project_id, boundary in cursor.fetchall():
+            if isinstance(boundary, str):
+                boundary = json.loads(boundary)
+            try:
+                points, _ = repair_boundary(boundary)
+            except GeometryError as e:
+                print(f" Project {project_id}: {e}")
+                continue
+            if points:
+                boundaries[project_id] = points
+    return boundaries
+
+
+def detect(database_url, min_hectares, batch_size):
+    """Find every pair of overlapping projects and store them in project_overlaps.
+
+    Candidate pairs come from a sweep over all bounding boxes, so the
+    whole table is checked in O(n log n + candidates) instead of pairwise;
+    only candidates get the exact polygon intersection. Stored pairs that
+    no longer overlap are removed, except ones recorded by project
+    creation after this run started.
+    """
+    conn = psycopg2.connect(database_url)
+    started = time.time()
+    try:
+        with conn, conn.cursor() as cursor:
+            cursor.execute("SELECT now()")
+            run_started_at = cursor.fetchone()[0]
+            ids, boxes = load_boxes(cursor)
+        print(f" Projects with a boundary: {len(ids)}")
+
+        pairs = [np.column_stack(batch) for batch in overlapping_boxes(boxes)]
+        pairs = np.vstack(pairs) if pairs else np.empty((0, 2), dtype=np.int64)
+        print(f" Candidate pairs: {len(pairs)} ({time.time() - started:.1f}s)")
+
+        with conn, conn.cursor() as cursor:
+            boundaries = load_boundaries(cursor, ids[np.unique(pairs)], batch_size)
+
+        overlaps = []
+        for i, j in pairs:
+            # ids ascend, so i < j keeps the lower project id first
+            project_id, other_id = int(ids[i]), int(ids[j])
+            if project_id not in boundaries or other_id not in boundaries:
+                continue
+            hectares, fraction, other_fraction = measure_overlap(boundaries[project_id], boundaries[other_id])
+            if hectares >= min_hectares:
+                overlaps.append((project_id, other_id, hectares, fraction, other_fraction))
+        print(f" Overlapping pairs: {len(overlaps)} ({time.time() - started:.1f}s)")
+
+        with conn, conn.cursor() as cursor:
+            execute_values(cursor, """
+                INSERT INTO project_overlaps (project_id, other_project_id, overlap_hectares, project_fraction, other_fraction)
+                VALUES %s
+                ON CONFLICT (project_id, other_project_id) DO UPDATE
+                SET overlap_hectares = EXCLUDED.overlap_hectares,
+                    project_fraction = EXCLUDED.project_fraction,
+                    other_fraction = EXCLUDED.other_fraction,
+                    detected_at = now()
+            """, overlaps, page_size=batch_size)
+            cursor.execute("DELETE FROM project_overlaps WHERE detected_at < %s", (run_started_at,))
+            removed = cursor.rowcount
+        print(f" Stale overlaps removed: {removed} ({time.time() - started:.1f}s)")
+    finally:
+        conn.close()
+    return overlaps
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Detect overlapping project boundaries for review')
+    parser.add_argument('--min-hectares', type=float, default=MIN_OVERLAP_HECTARES,
+                        help='Smallest overlap recorded, in hectares')
+    parser.add_argument('--batch-size', type=int, default=1000, help='Boundaries loaded and rows written per query')
+    args = parser.parse_args()
+
+    database_url = os.getenv('DATABASE_URL')
+    if not database_url:
+        print("❌ DATABASE_URL not found in environment variables")
+        return
+
+    detect(database_url, args.min_hectares, args.batch_size)
+    print("✅ Project overlaps detected successfully!")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,261 @@
+# Script to Replay a Realistic Traffic Mix Against a Running SHCAP Instance
+
+import argparse
+import http.cookiejar
+import json
+import random
+import re
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+DEFAULT_MIX = 'login=5,dashboard=35,predict=30,polygon=15,export=5,projects=10'
+
+CSRF_PATTERN = re.compile(r'name="csrf_token"[^>]*value="([^"]+)"')
+
+# Rough bounding box of the East African regions used by the seeder
+LAT_RANGE = (-3.5, 1.2)
+LNG_RANGE = (29.8, 40.0)
+
+
+class VirtualUser:
+    """A logged-in browser session with its own cookie jar"""
+
+    def __init__(self, base_url, email, password, timeout):
+        self.base_url = base_url.rstrip('/')
+        self.email = email
+        self.password = password
+        self.timeout = timeout
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar())
+        )
+
+    def request(self, path, data=None, json_body=None):
+        headers = {}
+        if json_body is not None:
+            data = json.dumps(json_body).encode('utf-8')
+            headers['Content-Type'] = 'application/json'
+        elif data is not None:
+            data = urllib.parse.urlencode(data).encode('utf-8')
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+
+        req = urllib.request.Request(self.base_url + path, data=data, headers=headers)
+        with self.opener.open(req, timeout=self.timeout) as response:
+            body = response.read()
+            return response.status, response.geturl(), body
+
+    def login(self):
+        _, _, body = self.request('/auth/login')
+        match = CSRF_PATTERN.search(body.decode('utf-8', errors='ignore'))
+        form = {'email': self.email, 'password': self.password, 'submit': 'Login'}
+        if match:
+            form['csrf_token'] = match.group(1)
+
+        status, final_url, _ = self.request('/auth/login', data=form)
+        if '/auth/login' in final_url:
+            raise RuntimeError(f'Login rejected for {self.email}')
+        return status
+
+
+def random_point():
+    return random.uniform(*LAT_RANGE), random.uniform(*LNG_RANGE)
+
+
+def random_polygon():
+    """A small farm-sized polygon around a random centroid"""
+    lat, lng = random_point()
+    vertices = random.randint(4, 10)
+    coordinates = []
+    for i in range(vertices):
+        angle = 2 * np.pi * i / vertices
+        radius = random.uniform(0.0005, 0.002)
+        coordinates.append({'lat': lat + radius * np.sin(angle), 'lng': lng + radius * np.cos(angle)})
+    return coordinates
+
+
+def op_dashboard(user):
+    return user.request('/dashboard/')[0]
+
+
+def op_projects(user):
+    return user.request('/dashboard/api/projects')[0]
+
+
+def op_predict(user):
+    lat, lng = random_point()
+    return user.request('/agb/predict', json_body={'latitude': lat, 'longitude': lng, 'country': 'kenya'})[0]
+
+
+def op_polygon(user):
+    return user.request('/agb/predict-polygon', json_body={
+        'coordinates': random_polygon(),
+        'area_hectares': round(random.uniform(0.5, 20.0), 2)
+    })[0]
+
+
+def op_export(user):
+    return user.request('/agb/api/reports/generate-csv')[0]
+
+
+OPERATIONS = {
+    'dashboard': op_dashboard,
+    'projects': op_projects,
+    'predict': op_predict,
+    'polygon': op_polygon,
+    'export': op_export,
+}
+
+
+def parse_mix(mix):
+    weights = {}
+    for part in mix.split(','):
+        name, weight = part.split('=')
+        name = name.strip()
+        if name != 'login' and name not in OPERATIONS:
+            raise ValueError(f'Unknown operation in mix: {name}')
+        weights[name] = float(weight)
+    return weights
+
+
+class LoadGenerator:
+    """Open-loop load generator.
+
+    Requests are scheduled at a fixed rate regardless of how fast the server
+    answers, and latency is measured from the scheduled start time so queueing
+    delay is not hidden when the server falls behind.
+    """
+
+    def __init__(self, base_url, credentials, mix, rps, duration, concurrency, timeout):
+        self.base_url = base_url
+        self.credentials = credentials
+        self.mix = mix
+        self.rps = rps
+        self.duration = duration
+        self.timeout = timeout
+        self.executor = ThreadPoolExecutor(max_workers=concurrency)
+
+        self.lock = threading.Lock()
+        self.sessions = []
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.error_samples = {}
+
+    def new_session(self):
+        email, password = random.choice(self.credentials)
+        user = VirtualUser(self.base_url, email, password, self.timeout)
+        user.login()
+        with self.lock:
+            self.sessions.append(user)
+        return user
+
+    def pick_session(self):
+        with self.lock:
+            if self.sessions:
+                return random.choice(self.sessions)
+        return self.new_session()
+
+    def record(self, name, scheduled_at, error=None):
+        elapsed = time.perf_counter() - scheduled_at
+        with self.lock:
+            self.latencies[name].append(elapsed)
+            if error is not None:
+                self.errors[name] += 1
+                self.error_samples.setdefault(name, error)
+
+    def run_operation(self, name, scheduled_at):
+        try:
+            if name == 'login':
+                self.new_session()
+            else:
+                status = OPERATIONS[name](self.pick_session())
+                if status >= 400:
+                    raise RuntimeError(f'HTTP {status}')
+            self.record(name, scheduled_at)
+        except urllib.error.HTTPError as e:
+            self.record(name, scheduled_at, error=f'HTTP {e.code}')
+        except Exception as e:
+            self.record(name, scheduled_at, error=str(e))
+
+    def run(self):
+        names = list(self.mix.keys())
+        weights = np.array(list(self.mix.values()))
+        weights = weights / weights.sum()
+
+        total = int(self.rps * self.duration)
+        schedule = np.random.choice(names, size=total, p=weights)
+        interval = 1.0 / self.rps
+
+        print(f" Sending {total} requests at {self.rps} req/s for {self.duration}s")
+        started = time.perf_counter()
+        for i, name in enumerate(schedule):
+            scheduled_at = started + i * interval
+            delay = scheduled_at - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            self.executor.submit(self.run_operation, name, scheduled_at)
+
+        self.executor.shutdown(wait=True)
+        return time.perf_counter() - started
+
+    def report(self, elapsed):
+        print()
+        print(f"{'operation':<12}{'count':>8}{'errors':>8}{'err%':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+        all_latencies = []
+        total_errors = 0
+        for name in sorted(self.latencies):
+            samples = np.array(self.latencies[name]) * 1000
+            all_latencies.append(samples)
+            errors = self.errors[name]
+            total_errors += errors
+            p50, p95, p99 = np.percentile(samples, [50, 95, 99])
+            print(f"{name:<12}{len(samples):>8}{errors:>8}{100.0 * errors / len(samples):>7.1f}%"
+                  f"{p50:>10.1f}{p95:>10.1f}{p99:>10.1f}")
+
+        if all_latencies:
+            samples = np.concatenate(all_latencies)
+            p50, p95, p99 = np.percentile(samples, [50, 95, 99])
+            print(f"{'ALL':<12}{len(samples):>8}{total_errors:>8}{100.0 * total_errors / len(samples):>7.1f}%"
+                  f"{p50:>10.1f}{p95:>10.1f}{p99:>10.1f}")
+            print(f"\nAchieved throughput: {len(samples) / elapsed:.1f} req/s over {elapsed:.1f}s")
+
+        for name, sample in self.error_samples.items():
+            print(f" First {name} error: {sample}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate realistic load against SHCAP')
+    parser.add_argument('--base-url', default='http://localhost:5000')
+    parser.add_argument('--rps', type=float, default=20.0, help='Target requests per second')
+    parser.add_argument('--duration', type=float, default=60.0, help='Test duration in seconds')
+    parser.add_argument('--concurrency', type=int, default=64, help='Maximum in-flight requests')
+    parser.add_argument('--timeout', type=float, default=30.0, help='Per-request timeout in seconds')
+    parser.add_argument('--mix', default=DEFAULT_MIX, help='Weighted operation mix, e.g. predict=50,dashboard=50')
+    parser.add_argument('--email-pattern', default='loadtest+{i}@example.org',
+                        help='Email template matching seed_large_portfolio.py')
+    parser.add_argument('--user-count', type=int, default=1000, help='Number of seeded users to log in as')
+    parser.add_argument('--password', default='LoadTest123!')
+    args = parser.parse_args()
+
+    credentials = [(args.email_pattern.format(i=i), args.password) for i in range(args.user_count)]
+
+    generator = LoadGenerator(
+        base_url=args.base_url,
+        credentials=credentials,
+        mix=parse_mix(args.mix),
+        rps=args.rps,
+        duration=args.duration,
+        concurrency=args.concurrency,
+        timeout=args.timeout,
+    )
+    elapsed = generator.run()
+    generator.report(elapsed)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,24 +1,46 @@
 # ml/services/agb_predictor.py - REAL PIPELINE VERSION
-import joblib
 import numpy as np
 import os
 import random
+from ml.services.forest_uncertainty import DEFAULT_QUANTILES, summarize
+from ml.services.model_registry import DEFAULT_KEY, MODELS_DIR, ModelRegistry
+from ml.services.shadow import ShadowScorer
+
+# Realistic biomass range (Mg/ha) of the training data
+AGB_MIN = 2.0
+AGB_MAX = 135.0
 
 class AGBPredictor:
-    def __init__(self):
-        self.model = None
-        self.scaler = None
+    def __init__(self, registry=None):
+        self.registry = registry or ModelRegistry(
+            os.getenv('MODEL_REGISTRY_DIR', MODELS_DIR),
+            int(float(os.getenv('MODEL_CACHE_MAX_MB', 1024)) * 1024 * 1024),
+            fold_scaler=os.getenv('MODEL_FOLD_SCALER', 'True') == 'True',
+            float32=os.getenv('MODEL_FLOAT32', 'False') == 'True',
+        )
+        self.shadow = ShadowScorer(
+            self.registry,
+            sample_rate=float(os.getenv('SHADOW_SAMPLE_RATE', 0)),
+            workers=int(os.getenv('SHADOW_WORKERS', 1)),
+            queue_size=int(os.getenv('SHADOW_QUEUE_SIZE', 64)),
+            clip=(AGB_MIN, AGB_MAX),
+        )
         self.feature_names = None
         self.load_model()
+
+    # The default model is read through the registry so it follows hot swaps
+    @property
+    def model(self):
+        return self.registry.get_by_key(DEFAULT_KEY).model
+
+    @property
+    def scaler(self):
+        return self.registry.get_by_key(DEFAULT_KEY).scaler
     
     def load_model(self):
-        """Load your ACTUAL cleaned production model"""
+        """Load your ACTUAL cleaned production model; country models load on first use"""
         try:
-            model_path = os.path.join(os.path.dirname(__file__), '../models/shcap_production_model_cleaned.pkl')
-            scaler_path = os.path.join(os.path.dirname(__file__), '../models/shcap_production_scaler_cleaned.pkl')
-            
-            self.model = joblib.load(model_path)
-            self.scaler = joblib.load(scaler_path)
+            self.registry.get_by_key(DEFAULT_KEY)
             
             self.feature_names = [
                 'B2', 'B3', 'B4', 'B8', 'B11', 'B12', 'HH', 'HV', 'elevation',
@@ -93,12 +115,19 @@ class AGBPredictor:
         
         return features
     
-    def predict(self, latitude, longitude, country='kenya'):
+    def predict(self, latitude, longitude, country='kenya', region=None):
         """Predict AGB using your actual model - produces realistic variation"""
+        return self.predict_with_version(latitude, longitude, country, region)[0]
+
+    def predict_with_version(self, latitude, longitude, country='kenya', region=None):
+        """Like predict(), also returning the 'key@version' tag of the model
+        used ('fallback' when the random fallback was used)"""
         if self.model is None or self.scaler is None:
             raise Exception("Model not loaded")
         
         try:
+            handle = self.registry.get(country, region)
+
             # Create realistic features that will produce natural biomass variation
             features = self.create_realistic_features(latitude, longitude)
             
@@ -107,23 +136,92 @@ class AGBPredictor:
             for feature_name in self.feature_names:
                 features_array.append(features[feature_name])
             
-            # Scale features using your actual scaler
-            features_scaled = self.scaler.transform([features_array])
-            
-            # Predict using your actual trained model
-            prediction = self.model.predict(features_scaled)[0]
+            # Predict using the model registered for this country; the
+            # handle scales the features or uses its scaler-folded model
+            prediction = handle.predict([features_array])[0]
             
             # Ensure realistic biomass range (2-135 Mg/ha based on your training)
-            prediction = max(2.0, min(135.0, prediction))
+            prediction = max(AGB_MIN, min(AGB_MAX, prediction))
+            self.shadow.maybe_score(handle, [features_array], [prediction])
             
-            print(f"Biomass estimation: {prediction:.2f} Mg/ha at {latitude:.4f}, {longitude:.4f}")
+            print(f"Biomass estimation: {prediction:.2f} Mg/ha at {latitude:.4f}, {longitude:.4f} ({handle.tag})")
             
-            return prediction
+            return prediction, handle.tag
             
         except Exception as e:
             print(f"Prediction error, using realistic fallback: {e}")
             # Realistic fallback in the range of East African biomass
-            return random.uniform(10.0, 60.0)  # Typical range for smallholder farms
+            return random.uniform(10.0, 60.0), 'fallback'  # Typical range for smallholder farms
+
+    def feature_matrix(self, points):
+        """Build the (n_points, n_features) input matrix for (lat, lng) pairs"""
+        rows = []
+        for latitude, longitude in points:
+            features = self.create_realistic_features(latitude, longitude)
+            rows.append([features[name] for name in self.feature_names])
+        return np.array(rows, dtype=np.float64)
+
+    def group_points(self, points, country='kenya', region=None):
+        """Split a batch by the registry model that serves each point.
+
+        Points are (lat, lng) or (lat, lng, country[, region]) tuples; points
+        without their own country use the batch-level one. Returns
+        {registry key: [indices into points]} so each model runs once.
+        """
+        groups = {}
+        for i, point in enumerate(points):
+            point_country = point[2] if len(point) > 2 and point[2] else country
+            point_region = point[3] if len(point) > 3 and point[3] else region
+            key = self.registry.resolve(point_country, point_region)
+            groups.setdefault(key, []).append(i)
+        return groups
+
+    def predict_batch(self, points, country='kenya', region=None):
+        """Predict AGB for many points with one model call per country model.
+
+        Returns one {'agb_estimate', 'model_version'} dict per point.
+        """
+        if self.model is None or self.scaler is None:
+            raise Exception("Model not loaded")
+
+        results = [None] * len(points)
+        for key, indices in self.group_points(points, country, region).items():
+            handle = self.registry.get_by_key(key)
+            features = self.feature_matrix([points[i][:2] for i in indices])
+            predictions = np.clip(handle.predict(features), AGB_MIN, AGB_MAX)
+            self.shadow.maybe_score(handle, features, predictions)
+            for i, prediction in zip(indices, predictions):
+                results[i] = {'agb_estimate': float(prediction), 'model_version': handle.tag}
+        return results
+
+    def predict_with_uncertainty(self, points, country='kenya', quantiles=DEFAULT_QUANTILES, region=None):
+        """Predict AGB with the spread of the individual trees of the ensemble.
+
+        Every tree is evaluated for every point in one vectorized pass per
+        country model. Each tree's output is clipped to the training range
+        before the mean, standard deviation and quantiles are taken. Unlike
+        predict() there is no random fallback: an interval around made-up
+        numbers would be worse than an error.
+        """
+        if self.model is None or self.scaler is None:
+            raise Exception("Model not loaded")
+
+        results = [None] * len(points)
+        for key, indices in self.group_points(points, country, region).items():
+            handle = self.registry.get_by_key(key)
+            features = self.feature_matrix([points[i][:2] for i in indices])
+            per_tree = np.clip(handle.get_forest().per_tree_predictions(handle.prepare(features)), AGB_MIN, AGB_MAX)
+            summary = summarize(per_tree, quantiles)
+            self.shadow.maybe_score(handle, features, summary['mean'])
+
+            for j, i in enumerate(indices):
+                results[i] = {
+                    'agb_estimate': float(summary['mean'][j]),
+                    'std': float(summary['std'][j]),
+                    'quantiles': {f"p{q * 100:g}": float(values[j]) for q, values in summary['quantiles'].items()},
+                    'model_version': handle.tag,
+                }
+        return results
 
 # Global instance
 agb_predictor = AGBPredictor()
\ No newline at end of file
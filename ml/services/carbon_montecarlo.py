@@ -0,0 +1,114 @@
+# ml/services/carbon_montecarlo.py - Monte Carlo error propagation for CO2e totals
+import os
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+CARBON_FRACTION = 0.47      # IPCC default carbon content of dry biomass
+CARBON_FRACTION_SD = 0.02   # IPCC range 0.44-0.51
+CO2_PER_CARBON = 3.67       # 44/12
+
+# Relative (1 sigma) errors used when a project carries no estimate of its own
+DEFAULT_AGB_RELATIVE_SD = 0.3
+DEFAULT_AREA_RELATIVE_SD = 0.05
+
+DEFAULT_QUANTILES = (0.025, 0.05, 0.5, 0.95, 0.975)
+DEFAULT_MEMORY_LIMIT = 64 * 1024 * 1024
+
+
+def _log_params(mean, relative_sd):
+    """Mean and sigma of log(X) for a lognormal X with the given mean and relative SD"""
+    sigma2 = np.log1p(np.square(relative_sd))
+    return np.log(mean) - sigma2 / 2, sigma2
+
+
+def _simulate_block_sums(mu, sigma, draws, rng, cells):
+    """Sum of exp(mu + sigma * z) over projects for `draws` draws, `cells` floats at a time"""
+    n_projects = mu.shape[0]
+    project_chunk = min(n_projects, max(1, cells))
+    draw_chunk = max(1, cells // project_chunk)
+    buffer = np.empty((draw_chunk, project_chunk), dtype=np.float32)
+    sums = np.zeros(draws)
+
+    for d in range(0, draws, draw_chunk):
+        nd = min(draw_chunk, draws - d)
+        for p in range(0, n_projects, project_chunk):
+            width = min(project_chunk, n_projects - p)
+            block = buffer[:nd, :width]
+            rng.standard_normal(out=block, dtype=np.float32)
+            block *= sigma[p:p + width]
+            block += mu[p:p + width]
+            np.exp(block, out=block)
+            sums[d:d + nd] += block.sum(axis=1, dtype=np.float64)
+    return sums
+
+
+def simulate_co2e(agb, area, agb_sd=None, draws=10000,
+                  agb_relative_sd=DEFAULT_AGB_RELATIVE_SD,
+                  area_relative_sd=DEFAULT_AREA_RELATIVE_SD,
+                  carbon_fraction=CARBON_FRACTION, carbon_fraction_sd=CARBON_FRACTION_SD,
+                  quantiles=DEFAULT_QUANTILES, memory_limit=DEFAULT_MEMORY_LIMIT,
+                  workers=None, seed=None):
+    """Credible intervals for the total CO2e (Mg) of one or many projects.
+
+    `agb` is Mg/ha and `area` hectares, one entry per project. AGB and area
+    errors are lognormal and independent between projects; `agb_sd` gives
+    per-project absolute AGB errors (e.g. from the per-tree spread) and
+    falls back to `agb_relative_sd`. Their product is lognormal too, so one
+    normal draw per project per iteration covers both. The carbon fraction
+    is a single shared factor per draw, as it is the same IPCC constant for
+    every project.
+
+    Draws are generated in float32 blocks of at most `memory_limit` bytes in
+    total, split across `workers` threads with independent random streams.
+    """
+    agb = np.asarray(agb, dtype=np.float64)
+    area = np.asarray(area, dtype=np.float64)
+    if agb_sd is None:
+        agb_rel = np.full(agb.shape, agb_relative_sd)
+    else:
+        agb_rel = np.asarray(agb_sd, dtype=np.float64) / np.where(agb > 0, agb, 1)
+
+    # Projects without biomass or area contribute nothing
+    keep = (agb > 0) & (area > 0)
+    agb, area, agb_rel = agb[keep], area[keep], agb_rel[keep]
+
+    mu_agb, var_agb = _log_params(agb, agb_rel)
+    mu_area, var_area = _log_params(area, area_relative_sd)
+    mu = (mu_agb + mu_area).astype(np.float32)
+    sigma = np.sqrt(var_agb + var_area).astype(np.float32)
+
+    workers = workers or min(4, os.cpu_count() or 1)
+    workers = max(1, min(workers, draws))
+    cells = max(1, memory_limit // (4 * workers))
+    rngs = [np.random.default_rng(s) for s in np.random.SeedSequence(seed).spawn(workers + 1)]
+    shares = [len(part) for part in np.array_split(np.arange(draws), workers)]
+
+    if len(mu) == 0:
+        biomass = np.zeros(draws)
+    elif workers == 1:
+        biomass = _simulate_block_sums(mu, sigma, draws, rngs[0], cells)
+    else:
+        # numpy releases the GIL in the generator and ufuncs, so threads scale
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            parts = pool.map(_simulate_block_sums, [mu] * workers, [sigma] * workers,
+                             shares, rngs[:workers], [cells] * workers)
+            biomass = np.concatenate(list(parts))
+
+    fractions = np.clip(rngs[-1].normal(carbon_fraction, carbon_fraction_sd, draws), 0, 1)
+    co2e = biomass * fractions * CO2_PER_CARBON
+
+    return {
+        'projects': int(keep.sum()),
+        'draws': draws,
+        'point_estimate': float((agb * area).sum() * carbon_fraction * CO2_PER_CARBON),
+        'mean': float(co2e.mean()),
+        'std': float(co2e.std()),
+        'quantiles': {f"p{q * 100:g}": float(v) for q, v in zip(quantiles, np.quantile(co2e, quantiles))},
+    }
+
+
+def simulate_projects(projects, **kwargs):
+    """Run simulate_co2e over Project objects (e.g. Project.get_by_user)"""
+    agb = [float(p.estimated_agb or 0) for p in projects]
+    area = [float(p.area_hectares or 0) for p in projects]
+    return simulate_co2e(agb, area, **kwargs)
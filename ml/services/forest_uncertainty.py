@@ -0,0 +1,81 @@
+# ml/services/forest_uncertainty.py - per-tree spread of a tree ensemble
+import numpy as np
+
+DEFAULT_QUANTILES = (0.05, 0.5, 0.95)
+
+# Upper bound on the (trees x points) node-index matrix held at once
+MAX_CELLS_PER_CHUNK = 262_144
+
+
+class ForestArrays:
+    """All trees of a bagged ensemble packed into padded 2-D arrays.
+
+    Row t holds tree t's nodes, so one numpy step advances every
+    (tree, point) pair one level down its tree. A full prediction takes
+    max_depth steps instead of a Python loop per tree per point. Leaves
+    point back at themselves, so pairs that reach a leaf early stay put.
+    """
+
+    def __init__(self, model):
+        estimators = getattr(model, 'estimators_', None)
+        if estimators is None or not all(hasattr(e, 'tree_') for e in estimators):
+            raise TypeError(f"{type(model).__name__} is not a bagged tree ensemble")
+        if getattr(model, 'estimators_features_', None) is not None:
+            raise TypeError("Ensembles trained on feature subsets are not supported")
+
+        trees = [e.tree_ for e in estimators]
+        n_trees = len(trees)
+        max_nodes = max(t.node_count for t in trees)
+
+        self.n_trees = n_trees
+        self.max_depth = max(t.max_depth for t in trees)
+        self.left = np.zeros((n_trees, max_nodes), dtype=np.int32)
+        self.right = np.zeros((n_trees, max_nodes), dtype=np.int32)
+        self.feature = np.zeros((n_trees, max_nodes), dtype=np.int32)
+        self.threshold = np.full((n_trees, max_nodes), np.inf)
+        self.value = np.zeros((n_trees, max_nodes))
+
+        for i, tree in enumerate(trees):
+            n = tree.node_count
+            nodes = np.arange(n, dtype=np.int32)
+            is_leaf = tree.children_left == -1
+            self.left[i, :n] = np.where(is_leaf, nodes, tree.children_left)
+            self.right[i, :n] = np.where(is_leaf, nodes, tree.children_right)
+            self.feature[i, :n] = np.where(is_leaf, 0, tree.feature)
+            self.threshold[i, :n] = np.where(is_leaf, np.inf, tree.threshold)
+            self.value[i, :n] = tree.value[:, 0, 0]
+
+    def per_tree_predictions(self, X):
+        """Return an (n_trees, n_points) matrix of individual tree outputs"""
+        # Trees compare float32 features against their thresholds
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        n_points, n_features = X.shape
+        out = np.empty((self.n_trees, n_points))
+
+        # Flat views let every level be a handful of 1-D np.take calls
+        left, right = self.left.ravel(), self.right.ravel()
+        feature, threshold = self.feature.ravel(), self.threshold.ravel()
+        value = self.value.ravel()
+        tree_offsets = (np.arange(self.n_trees, dtype=np.int64) * self.left.shape[1])[:, None]
+
+        chunk = max(1, MAX_CELLS_PER_CHUNK // self.n_trees)
+        for start in range(0, n_points, chunk):
+            block = X[start:start + chunk]
+            flat_block = block.ravel()
+            row_offsets = (np.arange(block.shape[0], dtype=np.int64) * n_features)[None, :]
+            node = np.broadcast_to(tree_offsets, (self.n_trees, block.shape[0])).copy()
+            for _ in range(self.max_depth):
+                values = np.take(flat_block, row_offsets + np.take(feature, node))
+                go_left = values <= np.take(threshold, node)
+                node = tree_offsets + np.where(go_left, np.take(left, node), np.take(right, node))
+            out[:, start:start + chunk] = np.take(value, node)
+        return out
+
+
+def summarize(per_tree, quantiles=DEFAULT_QUANTILES):
+    """Mean, standard deviation and quantiles across trees for each point"""
+    return {
+        'mean': per_tree.mean(axis=0),
+        'std': per_tree.std(axis=0),
+        'quantiles': {q: np.quantile(per_tree, q, axis=0) for q in quantiles},
+    }
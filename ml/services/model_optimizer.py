@@ -0,0 +1,105 @@
+# ml/services/model_optimizer.py - fold feature scaling into the model
+import copy
+import warnings
+import numpy as np
+
+# Folded trees compare raw float32 features against rescaled thresholds, so
+# a sample lying within float32 rounding of a split can take the other
+# branch; anything beyond this fraction means the fold is wrong.
+MAX_MISMATCH_FRACTION = 0.001
+EQUIVALENCE_SAMPLES = 2048
+
+
+def scaler_affine(scaler):
+    """Return (a, b) with scaler.transform(x) == a * x + b per feature"""
+    n_features = scaler.n_features_in_
+    if hasattr(scaler, 'with_mean') and hasattr(scaler, 'with_std'):
+        # StandardScaler: (x - mean) / scale
+        mean = scaler.mean_ if scaler.mean_ is not None else np.zeros(n_features)
+        scale = scaler.scale_ if scaler.scale_ is not None else np.ones(n_features)
+        a = 1.0 / scale
+        return a, -mean * a
+    if hasattr(scaler, 'min_') and hasattr(scaler, 'scale_'):
+        # MinMaxScaler: x * scale + min
+        return np.asarray(scaler.scale_, dtype=np.float64), np.asarray(scaler.min_, dtype=np.float64)
+    raise TypeError(f"Cannot fold {type(scaler).__name__}")
+
+
+def _fold_tree(tree, a, b):
+    """Rewrite split thresholds from scaled to raw feature units:
+    a * x + b <= t  <=>  x <= (t - b) / a  (a > 0)"""
+    state = tree.__getstate__()
+    nodes = state['nodes'].copy()
+    internal = nodes['left_child'] != -1
+    features = nodes['feature'][internal]
+    nodes['threshold'][internal] = (nodes['threshold'][internal] - b[features]) / a[features]
+    state['nodes'] = nodes
+    tree.__setstate__(state)
+
+
+def _trees(model):
+    if hasattr(model, 'tree_'):
+        return [model.tree_]
+    estimators = getattr(model, 'estimators_', None)
+    if estimators is not None:
+        trees = [e.tree_ for e in np.ravel(estimators)]
+        if trees and getattr(model, 'estimators_features_', None) is None:
+            return trees
+    return None
+
+
+def fold_scaler(model, scaler, float32=False):
+    """Copy of `model` that takes raw features instead of scaler output.
+
+    Tree models (single trees, forests, gradient boosting) get rescaled split
+    thresholds; linear models get rescaled coefficients and intercept.
+    With `float32`, linear coefficients are stored as float32 so inference
+    runs in single precision; trees already compare in float32.
+    """
+    a, b = scaler_affine(scaler)
+    if np.any(a <= 0):
+        raise TypeError("Cannot fold a scaler that reverses feature order")
+
+    folded = copy.deepcopy(model)
+    trees = _trees(folded)
+    if trees is not None:
+        for tree in trees:
+            _fold_tree(tree, a, b)
+        return folded
+
+    if hasattr(folded, 'coef_') and hasattr(folded, 'intercept_'):
+        coef = np.asarray(folded.coef_, dtype=np.float64)
+        folded.intercept_ = folded.intercept_ + coef @ b
+        folded.coef_ = coef * a
+        if float32:
+            folded.coef_ = folded.coef_.astype(np.float32)
+            folded.intercept_ = np.asarray(folded.intercept_, dtype=np.float32)
+        return folded
+
+    raise TypeError(f"Cannot fold a scaler into {type(model).__name__}")
+
+
+def check_equivalence(model, scaler, folded, float32=False, samples=EQUIVALENCE_SAMPLES, seed=0):
+    """Compare the folded model with scaler.transform + model.predict.
+
+    Inputs are drawn around the scaler's training distribution. Returns the
+    fraction of predictions that differ and the largest difference; raises
+    ValueError when the fold does not reproduce the two-step path.
+    """
+    a, b = scaler_affine(scaler)
+    z = np.random.default_rng(seed).normal(0, 1.5, size=(samples, len(a)))
+    raw = (z - b) / a
+
+    with warnings.catch_warnings():
+        # Scalers fitted on DataFrames warn about plain arrays
+        warnings.simplefilter('ignore', UserWarning)
+        expected = model.predict(scaler.transform(raw))
+    actual = folded.predict(raw.astype(np.float32) if float32 else raw)
+
+    tolerance = 1e-4 if float32 else 1e-9
+    mismatched = ~np.isclose(actual, expected, rtol=tolerance, atol=tolerance)
+    fraction = float(mismatched.mean())
+    max_diff = float(np.abs(actual - expected).max())
+    if fraction > MAX_MISMATCH_FRACTION:
+        raise ValueError(f"Folded model differs on {fraction:.2%} of samples (max diff {max_diff:.4g})")
+    return fraction, max_diff
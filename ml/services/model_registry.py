@@ -0,0 +1,372 @@
+# ml/services/model_registry.py - versioned, per-country model artifacts
+import json
+import os
+import sys
+import threading
+from collections import OrderedDict
+import joblib
+import numpy as np
+from ml.services.forest_uncertainty import ForestArrays
+from ml.services.model_optimizer import check_equivalence, fold_scaler
+
+MODELS_DIR = os.path.join(os.path.dirname(__file__), '../models')
+DEFAULT_KEY = 'default'
+
+# Used when the registry directory has no manifest.json yet
+LEGACY_MANIFEST = {
+    'models': [{
+        'key': DEFAULT_KEY,
+        'version': 'legacy',
+        'model': 'shcap_production_model_cleaned.pkl',
+        'scaler': 'shcap_production_scaler_cleaned.pkl',
+    }]
+}
+
+
+def normalize_key(country=None, region=None):
+    """'Kenya', 'Central ' -> 'kenya/central'"""
+    country = (country or '').strip().lower()
+    region = (region or '').strip().lower()
+    if country and region:
+        return f"{country}/{region}"
+    return country or DEFAULT_KEY
+
+
+class ModelHandle:
+    """One loaded model + scaler pair from the registry.
+
+    Handles are immutable once published: a request keeps using the handle
+    it started with even if a newer version is swapped in meanwhile. Callers
+    pass raw feature matrices to predict()/prepare(); whether the scaler
+    runs first or has been folded into the model is up to the handle.
+    """
+
+    def __init__(self, key, version, model, scaler, nbytes):
+        self.key = key
+        self.version = version
+        self.model = model
+        self.scaler = scaler
+        self.nbytes = nbytes
+        self.folded = False
+        self.dtype = np.float64
+        self._forest = None
+
+    @property
+    def tag(self):
+        return f"{self.key}@{self.version}"
+
+    def optimize(self, float32=False):
+        """Fold the scaler into the model so inference skips transform().
+
+        The folded model replaces the original only after it reproduces the
+        two-step predictions; otherwise the handle keeps scaling as before.
+        """
+        try:
+            folded = fold_scaler(self.model, self.scaler, float32=float32)
+            fraction, max_diff = check_equivalence(self.model, self.scaler, folded, float32=float32)
+        except (TypeError, ValueError) as e:
+            print(f"Model {self.tag} not optimized: {e}")
+            return False
+
+        self.model = folded
+        self.folded = True
+        self.dtype = np.float32 if float32 else np.float64
+        print(f"Model {self.tag} scaler folded (mismatch {fraction:.3%}, max diff {max_diff:.3g})")
+        return True
+
+    def prepare(self, features):
+        """Turn raw features into the matrix the model consumes"""
+        if self.folded:
+            return np.asarray(features, dtype=self.dtype)
+        return self.scaler.transform(features)
+
+    def predict(self, features):
+        return self.model.predict(self.prepare(features))
+
+    def get_forest(self):
+        if self._forest is None:
+            self._forest = ForestArrays(self.model)
+        return self._forest
+
+    def warm(self):
+        """Run a throwaway prediction so the first real request pays no
+        first-call costs, and reject models that cannot predict at all"""
+        n_features = getattr(self.scaler, 'n_features_in_', None) or self.model.n_features_in_
+        predictions = self.predict(np.zeros((8, n_features)))
+        if not np.all(np.isfinite(predictions)):
+            raise ValueError(f"Model {self.tag} produced non-finite warm-up predictions")
+
+
+class ModelRegistry:
+    """Loads models listed in a manifest on first use and keeps the most
+    recently used ones resident within a memory budget.
+
+    manifest.json lists one entry per model version:
+
+        {"models": [
+            {"key": "default", "version": "2025-06", "model": "...pkl", "scaler": "...pkl"},
+            {"key": "kenya", "version": "2025-06", "model": "kenya/2025-06/model.pkl", ...},
+            {"key": "kenya", "version": "2025-09", "model": "kenya/2025-09/model.pkl", ..., "active": true},
+            {"key": "kenya", "version": "2025-10", ..., "candidate": true},
+            {"key": "kenya/central", ...}
+        ]}
+
+    A request resolves to the most specific key available:
+    country/region, then country, then default. Each key serves its
+    pinned version (pins.json, written by the admin endpoints), else the
+    entry marked active, else the last non-candidate one listed. Entries
+    marked candidate are only scored in shadow (see ml.services.shadow).
+    A model's footprint is taken as the size of its pickles on disk, which
+    tracks the in-memory size of tree ensembles closely.
+    """
+
+    def __init__(self, directory=MODELS_DIR, max_bytes=1024 * 1024 * 1024, fold_scaler=True, float32=False):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.fold_scaler = fold_scaler
+        self.float32 = float32
+        self.versions = {}
+        self.pins = {}
+        self._signature = None
+        self._resident = OrderedDict()
+        self._lock = threading.Lock()
+        self._load_locks = {}
+        self._refresh_lock = threading.Lock()
+        self._read_manifest()
+
+    @property
+    def manifest_path(self):
+        return os.path.join(self.directory, 'manifest.json')
+
+    @property
+    def pins_path(self):
+        return os.path.join(self.directory, 'pins.json')
+
+    def _stat_signature(self):
+        signature = []
+        for path in (self.manifest_path, self.pins_path):
+            try:
+                st = os.stat(path)
+                signature.append((st.st_mtime_ns, st.st_size))
+            except FileNotFoundError:
+                signature.append(None)
+        return tuple(signature)
+
+    def _read_manifest(self):
+        self._signature = self._stat_signature()
+        try:
+            with open(self.manifest_path) as f:
+                manifest = json.load(f)
+        except FileNotFoundError:
+            manifest = LEGACY_MANIFEST
+        try:
+            with open(self.pins_path) as f:
+                pins = json.load(f)
+        except FileNotFoundError:
+            pins = {}
+
+        versions = {}
+        for entry in manifest['models']:
+            versions.setdefault(entry['key'], []).append(entry)
+        self.versions = versions
+        self.pins = pins
+
+    def selected_entry(self, key):
+        """Manifest entry a key should currently serve"""
+        entries = self.versions[key]
+        pinned = self.pins.get(key)
+        for entry in entries:
+            if pinned is not None and entry.get('version') == pinned:
+                return entry
+        for entry in reversed(entries):
+            if entry.get('active'):
+                return entry
+        # Shadow candidates only serve traffic when pinned or marked active
+        serving = [entry for entry in entries if not entry.get('candidate')]
+        return (serving or entries)[-1]
+
+    def candidate_entry(self, key):
+        """Manifest entry marked as the shadow candidate for a key, if any"""
+        for entry in reversed(self.versions.get(key, [])):
+            if entry.get('candidate') and entry is not self.selected_entry(key):
+                return entry
+        return None
+
+    def resolve(self, country=None, region=None):
+        """Registry key that serves a country/region"""
+        key = normalize_key(country, region)
+        if key in self.versions:
+            return key
+        country_key = key.split('/')[0]
+        if country_key in self.versions:
+            return country_key
+        return DEFAULT_KEY
+
+    def get(self, country=None, region=None):
+        return self.get_by_key(self.resolve(country, region))
+
+    def get_by_key(self, key):
+        with self._lock:
+            handle = self._resident.get(key)
+            if handle is not None:
+                self._resident.move_to_end(key)
+                return handle
+            load_lock = self._load_locks.setdefault(key, threading.Lock())
+
+        # Load outside the registry lock so other models stay available;
+        # the per-key lock keeps concurrent requests from loading twice
+        with load_lock:
+            with self._lock:
+                handle = self._resident.get(key)
+            while handle is None:
+                loaded = self._load(key, self.selected_entry(key))
+                with self._lock:
+                    # refresh() only swaps resident models, so a version it
+                    # switched away from during the load must not be published
+                    if self.selected_entry(key).get('version') == loaded.version:
+                        handle = self._resident[key] = loaded
+                        self._evict(keep=key)
+        return handle
+
+    def load_entry(self, key, entry):
+        """Load a manifest entry without making it resident (e.g. a shadow candidate)"""
+        return self._load(key, entry)
+
+    def _load(self, key, entry):
+        model_path = os.path.join(self.directory, entry['model'])
+        scaler_path = os.path.join(self.directory, entry['scaler'])
+        handle = ModelHandle(
+            key, entry.get('version'),
+            joblib.load(model_path), joblib.load(scaler_path),
+            os.path.getsize(model_path) + os.path.getsize(scaler_path),
+        )
+        print(f"Loaded model '{key}' version {handle.version} ({handle.nbytes / 1e6:.1f} MB)")
+        if self.fold_scaler:
+            handle.optimize(float32=self.float32)
+        return handle
+
+    def _evict(self, keep):
+        """Drop least recently used models until the budget is met.
+
+        The default model is never evicted: it serves every country without
+        a model of its own.
+        """
+        total = sum(h.nbytes for h in self._resident.values())
+        for key in list(self._resident):
+            if total <= self.max_bytes:
+                break
+            if key in (keep, DEFAULT_KEY):
+                continue
+            total -= self._resident.pop(key).nbytes
+            print(f"Evicted model '{key}' from memory")
+
+    def refresh(self, force=False):
+        """Pick up manifest/pin changes and hot-swap resident models.
+
+        New versions are loaded and warmed next to the running ones, then
+        published with a single dict assignment. Requests already holding
+        the old handle finish on it; the old model is freed once the last
+        of them lets go. A version that fails to load or warm is skipped and
+        the old one keeps serving. Returns the list of (key, old, new)
+        versions swapped.
+        """
+        with self._refresh_lock:
+            if not force and self._stat_signature() == self._signature:
+                return []
+            self._read_manifest()
+
+            with self._lock:
+                resident = dict(self._resident)
+            for key in list(resident):
+                if key not in self.versions:
+                    with self._lock:
+                        self._resident.pop(key, None)
+
+            swapped = []
+            for key, current in resident.items():
+                if key not in self.versions:
+                    continue
+                entry = self.selected_entry(key)
+                if entry.get('version') == current.version:
+                    continue
+                try:
+                    handle = self._load(key, entry)
+                    handle.warm()
+                except Exception as e:
+                    print(f"Model '{key}' version {entry.get('version')} not swapped in: {e}")
+                    continue
+                with self._lock:
+                    self._resident[key] = handle
+                    self._evict(keep=key)
+                swapped.append((key, current.version, handle.version))
+                print(f"Swapped model '{key}' {current.version} -> {handle.version}")
+            return swapped
+
+    def write_pins(self, pins):
+        """Persist pins next to the manifest so every worker process follows them"""
+        tmp_path = f"{self.pins_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(pins, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.pins_path)
+
+    def pin(self, key, version):
+        if key not in self.versions:
+            raise KeyError(f"Unknown model '{key}'")
+        if version not in [e.get('version') for e in self.versions[key]]:
+            raise KeyError(f"Model '{key}' has no version '{version}'")
+        self.write_pins({**self.pins, key: version})
+        return self.refresh(force=True)
+
+    def unpin(self, key):
+        pins = dict(self.pins)
+        pins.pop(key, None)
+        self.write_pins(pins)
+        return self.refresh(force=True)
+
+    def rollback(self, key):
+        """Pin a key to the last version listed before the one it serves now.
+
+        Shadow candidates are skipped: unless pinned or marked active they
+        never served production traffic.
+        """
+        if key not in self.versions:
+            raise KeyError(f"Unknown model '{key}'")
+        entries = self.versions[key]
+        current = entries.index(self.selected_entry(key))
+        earlier = [entry for entry in entries[:current] if not entry.get('candidate')]
+        if not earlier:
+            raise KeyError(f"Model '{key}' has no earlier version to roll back to")
+        return self.pin(key, earlier[-1].get('version'))
+
+    def status(self):
+        with self._lock:
+            resident = {key: h for key, h in self._resident.items()}
+        return {
+            key: {
+                'versions': [e.get('version') for e in entries],
+                'selected': self.selected_entry(key).get('version'),
+                'pinned': self.pins.get(key),
+                'resident': resident[key].version if key in resident else None,
+            }
+            for key, entries in self.versions.items()
+        }
+
+    def resident(self):
+        with self._lock:
+            return [(h.key, h.version, h.nbytes) for h in self._resident.values()]
+
+
+def init_model_watcher(app):
+    """Poll the model manifest and hot-swap new versions in every worker"""
+    from utils.background import PeriodicTask, start_on_first_request
+
+    def watch():
+        # Nothing to swap until this process has loaded the predictor
+        module = sys.modules.get('ml.services.agb_predictor')
+        predictor = getattr(module, 'agb_predictor', None)
+        if predictor is not None:
+            predictor.registry.refresh()
+
+    task = PeriodicTask('model-watch', app.config.get('MODEL_WATCH_INTERVAL', 10), watch, app)
+    start_on_first_request(app, task)
+    return task
@@ -0,0 +1,170 @@
+# ml/services/shadow.py - score candidate models on live traffic off the request path
+import math
+import os
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+
+class RunningStats:
+    """Streaming count/mean/variance plus min, max and mean |x|.
+
+    Batches are merged with the parallel form of Welford's algorithm, so an
+    update costs a few numpy reductions however large the batch is.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.abs_sum = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        n = values.size
+        if not n:
+            return
+        batch_mean = float(values.mean())
+        batch_m2 = float(np.square(values - batch_mean).sum())
+
+        total = self.count + n
+        delta = batch_mean - self.mean
+        self.mean += delta * n / total
+        self.m2 += batch_m2 + delta * delta * self.count * n / total
+        self.count = total
+        self.abs_sum += float(np.abs(values).sum())
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+
+    def to_dict(self):
+        if not self.count:
+            return {'count': 0}
+        return {
+            'count': self.count,
+            'mean': self.mean,
+            'std': math.sqrt(self.m2 / self.count),
+            'mean_abs': self.abs_sum / self.count,
+            'min': self.min,
+            'max': self.max,
+        }
+
+
+class ShadowScorer:
+    """Re-score a sample of production predictions with candidate models.
+
+    The request thread only draws a random number and, when sampled, hands
+    the raw feature matrix and the production predictions to a small
+    background pool; the candidate sees exactly the inputs production saw.
+    When the pool's queue is full the sample is dropped rather than
+    delaying the request.
+    """
+
+    def __init__(self, registry, sample_rate=0.0, workers=1, queue_size=64, clip=None):
+        self.registry = registry
+        self.sample_rate = sample_rate
+        self.workers = workers
+        self.queue_size = queue_size
+        self.clip = clip
+        self._executor = None
+        self._executor_pid = None
+        self._pending = None
+        self._lock = threading.Lock()
+        # Loaded candidate models by key. Guarded by their own lock, held
+        # while a new version loads so each is loaded once and the slow
+        # load does not hold up the counters
+        self._candidates = {}
+        self._candidates_lock = threading.Lock()
+        self._stats = {}
+        self.submitted = 0
+        self.dropped = 0
+        self.failed = 0
+
+    def _get_executor(self):
+        # Created lazily so every forked worker gets its own pool
+        if self._executor is None or self._executor_pid != os.getpid():
+            with self._lock:
+                if self._executor is None or self._executor_pid != os.getpid():
+                    self._pending = threading.BoundedSemaphore(self.workers + self.queue_size)
+                    self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='shadow')
+                    self._executor_pid = os.getpid()
+        return self._executor
+
+    def maybe_score(self, handle, features, predictions):
+        """Sample a production call for shadow scoring; never blocks"""
+        if self.sample_rate <= 0 or random.random() >= self.sample_rate:
+            return
+        if self.registry.candidate_entry(handle.key) is None:
+            return
+
+        executor = self._get_executor()
+        if not self._pending.acquire(blocking=False):
+            with self._lock:
+                self.dropped += 1
+            return
+        with self._lock:
+            self.submitted += 1
+        future = executor.submit(self._score, handle, np.array(features, dtype=np.float64), np.asarray(predictions))
+        future.add_done_callback(lambda _: self._pending.release())
+
+    def _candidate(self, key):
+        entry = self.registry.candidate_entry(key)
+        if entry is None:
+            return None
+        with self._candidates_lock:
+            cached = self._candidates.get(key)
+            if cached is None or cached.version != entry.get('version'):
+                cached = self.registry.load_entry(key, entry)
+                self._candidates[key] = cached
+            return cached
+
+    def _score(self, handle, features, predictions):
+        try:
+            candidate = self._candidate(handle.key)
+            if candidate is None:
+                return
+            shadow = candidate.predict(features)
+            if self.clip is not None:
+                shadow = np.clip(shadow, *self.clip)
+            deltas = shadow - predictions
+
+            stats_key = (handle.key, handle.version, candidate.version)
+            with self._lock:
+                stats = self._stats.get(stats_key)
+                if stats is None:
+                    stats = self._stats[stats_key] = {
+                        'delta': RunningStats(), 'production': RunningStats(), 'candidate': RunningStats()
+                    }
+                stats['delta'].update(deltas)
+                stats['production'].update(predictions)
+                stats['candidate'].update(shadow)
+        except Exception as e:
+            with self._lock:
+                self.failed += 1
+            print(f"Shadow scoring failed for '{handle.key}': {e}")
+
+    def report(self):
+        with self._lock:
+            comparisons = [
+                {
+                    'key': key,
+                    'production_version': production_version,
+                    'candidate_version': candidate_version,
+                    **{name: s.to_dict() for name, s in stats.items()},
+                }
+                for (key, production_version, candidate_version), stats in self._stats.items()
+            ]
+        return {
+            'sample_rate': self.sample_rate,
+            'submitted': self.submitted,
+            'dropped': self.dropped,
+            'failed': self.failed,
+            'comparisons': comparisons,
+        }
+
+    def reset(self):
+        with self._lock:
+            self._stats = {}
+            self.submitted = self.dropped = self.failed = 0
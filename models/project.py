@@ -1,12 +1,193 @@
 from datetime import datetime
 from utils.database import execute_query
+from utils.async_database import execute_query_async
+from utils.query_registry import register_query
+from utils.compression import delta_encode_coordinates
+from utils.geometry import (
+    GeometryError, SIMPLIFY_ZOOMS, repair_boundary, simplify_boundary, boundary_for_zoom, boundary_bbox
+)
+from utils.tile_cache import invalidate_project_tiles
+from utils.overlaps import MIN_OVERLAP_HECTARES, measure_overlap
 import json
 
+# Every projects query is declared here once; the sync and async accessors
+# share them and they are prepared per connection (utils.query_registry).
+# Dashboard, analytics and export reads are read_only and may hit a replica.
+CREATE_PROJECT_QUERY = register_query('projects.create', """
+    INSERT INTO projects (
+        user_id, project_name, project_type, country, region,
+        description, area_hectares, boundary_coordinates, boundary_simplified,
+        bbox_min_lng, bbox_min_lat, bbox_max_lng, bbox_max_lat,
+        estimated_agb, estimated_carbon, estimated_co2, status
+    )
+    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+    RETURNING id, user_id, project_name, project_type, country, region,
+            description, area_hectares, boundary_coordinates, boundary_simplified,
+            estimated_agb, estimated_carbon, estimated_co2, status,
+            created_at, updated_at
+""")
+
+PROJECT_BY_ID_QUERY = register_query('projects.by_id', """
+    SELECT id, user_id, project_name, project_type, country, region,
+           description, area_hectares, boundary_coordinates, boundary_simplified,
+           estimated_agb, estimated_carbon, estimated_co2, status,
+           created_at, updated_at
+    FROM projects
+    WHERE id = %s
+""")
+
+PROJECTS_BY_USER_QUERY = register_query('projects.by_user', """
+    SELECT id, user_id, project_name, project_type, country, region,
+           description, area_hectares, boundary_coordinates, boundary_simplified,
+           estimated_agb, estimated_carbon, estimated_co2, status,
+           created_at, updated_at
+    FROM projects
+    WHERE user_id = %s
+    ORDER BY created_at DESC
+""", read_only=True)
+
+USER_STATS_QUERY = register_query('projects.user_stats', """
+    SELECT 
+        COUNT(*) as total_projects,
+        COUNT(CASE WHEN status = 'completed' THEN 1 END) as completed_projects,
+        COUNT(CASE WHEN status = 'in_progress' THEN 1 END) as in_progress_projects,
+        COALESCE(SUM(area_hectares), 0) as total_area,
+        COALESCE(SUM(estimated_agb), 0) as total_agb,
+        COALESCE(SUM(estimated_carbon), 0) as total_carbon,
+        COALESCE(SUM(estimated_co2), 0) as total_co2
+    FROM projects
+    WHERE user_id = %s
+""", read_only=True)
+
+# Ownership-checked lookups and updates: the (id, user_id) filter runs in
+# SQL, so a project is fetched or changed in one round-trip only when the
+# caller owns it
+OWNED_PROJECT_QUERY = register_query('projects.owned_by_id', """
+    SELECT id, user_id, project_name, project_type, country, region,
+           description, area_hectares, boundary_coordinates, boundary_simplified,
+           estimated_agb, estimated_carbon, estimated_co2, status,
+           created_at, updated_at
+    FROM projects
+    WHERE id = %s AND user_id = %s
+""")
+
+UPDATE_OWNED_STATUS_QUERY = register_query('projects.update_owned_status', """
+    UPDATE projects
+    SET status = %s, updated_at = CURRENT_TIMESTAMP
+    WHERE id = %s AND user_id = %s
+    RETURNING id, user_id, project_name, project_type, country, region,
+            description, area_hectares, boundary_coordinates, boundary_simplified,
+            estimated_agb, estimated_carbon, estimated_co2, status,
+            created_at, updated_at
+""")
+
+UPDATE_OWNED_STATUSES_QUERY = register_query('projects.update_owned_statuses', """
+    UPDATE projects
+    SET status = %s, updated_at = CURRENT_TIMESTAMP
+    WHERE id = ANY(%s) AND user_id = %s
+    RETURNING id, bbox_min_lng, bbox_min_lat, bbox_max_lng, bbox_max_lat
+""")
+
+PROJECT_EXISTS_QUERY = register_query('projects.exists', "SELECT 1 AS found FROM projects WHERE id = %s")
+
+UPDATE_ESTIMATES_QUERY = register_query('projects.update_estimates', """
+    UPDATE projects 
+    SET estimated_agb = %s, 
+        estimated_carbon = %s, 
+        estimated_co2 = %s,
+        updated_at = CURRENT_TIMESTAMP
+    WHERE id = %s
+""")
+
+UPDATE_STATUS_QUERY = register_query('projects.update_status', """
+    UPDATE projects 
+    SET status = %s, updated_at = CURRENT_TIMESTAMP
+    WHERE id = %s
+""")
+
+DELETE_PROJECT_QUERY = register_query('projects.delete', "DELETE FROM projects WHERE id = %s")
+
+# Projects drawn on one vector tile, matched on their bounding box (GiST
+# index on the box expression). One query per simplification level: each
+# reads the coarsest stored boundary that is exact enough for its zooms.
+# They run on the primary because the rendered tiles are cached.
+def _tile_query(level, all_projects):
+    levels = [z for z in SIMPLIFY_ZOOMS if level is not None and z >= level]
+    boundary = ", ".join([f"boundary_simplified -> '{z}'" for z in levels] + ["boundary_coordinates"])
+    owner = "" if all_projects else "user_id = %s AND "
+    name = f"projects.tile_{'all' if all_projects else 'owned'}_{f'z{level}' if level else 'full'}"
+    return register_query(name, f"""
+    SELECT id, project_name, project_type, status, area_hectares,
+           estimated_agb, estimated_carbon, estimated_co2,
+           COALESCE({boundary}) AS boundary
+    FROM projects
+    WHERE {owner}box(point(bbox_min_lng, bbox_min_lat), point(bbox_max_lng, bbox_max_lat))
+          && box(point(%s, %s), point(%s, %s))
+""")
+
+TILE_QUERIES = {
+    (level, all_projects): _tile_query(level, all_projects)
+    for level in (*SIMPLIFY_ZOOMS, None)
+    for all_projects in (False, True)
+}
+
+# Projects whose bounding box meets a new project's; only these can overlap it
+OVERLAP_CANDIDATES_QUERY = register_query('projects.overlap_candidates', """
+    SELECT id, user_id, boundary_coordinates
+    FROM projects
+    WHERE id <> %s
+      AND box(point(bbox_min_lng, bbox_min_lat), point(bbox_max_lng, bbox_max_lat))
+          && box(point(%s, %s), point(%s, %s))
+""")
+
+# Overlapping pairs are stored lower project id first
+RECORD_OVERLAPS_QUERY = register_query('project_overlaps.record', """
+    INSERT INTO project_overlaps (project_id, other_project_id, overlap_hectares, project_fraction, other_fraction)
+    SELECT * FROM unnest(%s::integer[], %s::integer[], %s::double precision[],
+                         %s::double precision[], %s::double precision[])
+    ON CONFLICT (project_id, other_project_id) DO UPDATE
+    SET overlap_hectares = EXCLUDED.overlap_hectares,
+        project_fraction = EXCLUDED.project_fraction,
+        other_fraction = EXCLUDED.other_fraction,
+        detected_at = now()
+""")
+
+OVERLAP_COLUMNS = """
+    SELECT o.project_id, p.project_name, p.user_id,
+           o.other_project_id, q.project_name AS other_project_name, q.user_id AS other_user_id,
+           o.overlap_hectares, o.project_fraction, o.other_fraction, o.detected_at
+    FROM project_overlaps o
+    JOIN projects p ON p.id = o.project_id
+    JOIN projects q ON q.id = o.other_project_id
+"""
+
+OVERLAPS_QUERY = register_query('project_overlaps.largest', OVERLAP_COLUMNS + """
+    WHERE o.overlap_hectares >= %s
+    ORDER BY o.overlap_hectares DESC, o.project_id, o.other_project_id
+    LIMIT %s
+""", read_only=True)
+
+PROJECT_OVERLAPS_QUERY = register_query('project_overlaps.by_project', OVERLAP_COLUMNS + """
+    WHERE (o.project_id = %s OR o.other_project_id = %s) AND o.overlap_hectares >= %s
+    ORDER BY o.overlap_hectares DESC, o.project_id, o.other_project_id
+    LIMIT %s
+""", read_only=True)
+
+EMPTY_USER_STATS = {
+    'total_projects': 0,
+    'completed_projects': 0,
+    'in_progress_projects': 0,
+    'total_area': 0,
+    'total_agb': 0,
+    'total_carbon': 0,
+    'total_co2': 0
+}
+
 class Project:
     def __init__(self, id, user_id, project_name, project_type, country, region,
                  description, area_hectares, boundary_coordinates, 
                  estimated_agb=None, estimated_carbon=None, estimated_co2=None,
-                 status='draft', created_at=None, updated_at=None):
+                 status='draft', created_at=None, updated_at=None, boundary_simplified=None):
         self.id = id
         self.user_id = str(user_id) if user_id else None
         self.project_name = project_name
@@ -16,46 +197,48 @@ class Project:
         self.description = description
         self.area_hectares = area_hectares
         self.boundary_coordinates = boundary_coordinates
+        # Douglas-Peucker simplified boundaries keyed by maximum zoom (utils.geometry)
+        self.boundary_simplified = boundary_simplified
         self.estimated_agb = estimated_agb
         self.estimated_carbon = estimated_carbon
         self.estimated_co2 = estimated_co2
         self.status = status
         self.created_at = created_at
         self.updated_at = updated_at
+        # Overlaps with other projects found when this one was created
+        self.overlaps = []
 
     @staticmethod
     def create(user_id, project_name, project_type, country, region, 
             description, area_hectares, boundary_coordinates,
             estimated_agb=None, estimated_carbon=None, estimated_co2=None, status='draft'):
-        """Create a new project - let database generate SERIAL ID"""
+        """Create a new project - let database generate SERIAL ID
+
+        The boundary is validated and repaired first (GeometryError if it is
+        not a usable polygon) and stored with its simplified versions.
+        """
         
         print(f" Creating project for user_id: {user_id}")
         
         # Keep user_id as string
         user_id_str = str(user_id) if user_id else None
         
-        # Convert boundary coordinates to JSON string if it's a list/dict
-        if isinstance(boundary_coordinates, (list, dict)):
-            boundary_coordinates = json.dumps(boundary_coordinates)
+        if isinstance(boundary_coordinates, str):
+            try:
+                boundary_coordinates = json.loads(boundary_coordinates)
+            except json.JSONDecodeError as e:
+                raise GeometryError('Boundary is not valid JSON') from e
+        boundary_coordinates, repairs = repair_boundary(boundary_coordinates)
+        if repairs:
+            print(f" Repaired boundary: {'; '.join(repairs)}")
+        boundary_simplified = simplify_boundary(boundary_coordinates)
+        bbox = boundary_bbox(boundary_coordinates) or (None, None, None, None)
         
         # FIX: Remove ID from INSERT - let database generate SERIAL ID automatically
-        query = """
-            INSERT INTO projects (
-                user_id, project_name, project_type, country, region,
-                description, area_hectares, boundary_coordinates,
-                estimated_agb, estimated_carbon, estimated_co2, status
-            )
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-            RETURNING id, user_id, project_name, project_type, country, region,
-                    description, area_hectares, boundary_coordinates,
-                    estimated_agb, estimated_carbon, estimated_co2, status,
-                    created_at, updated_at
-        """
-        
         params = (
             user_id_str, project_name, project_type, country, region,
-            description, area_hectares, boundary_coordinates,
-            estimated_agb, estimated_carbon, estimated_co2, status
+            description, area_hectares, json.dumps(boundary_coordinates), json.dumps(boundary_simplified),
+            *bbox, estimated_agb, estimated_carbon, estimated_co2, status
         )
         
         print(f" Executing query with {len(params)} parameters")
@@ -63,11 +246,20 @@ class Project:
         print(f" User ID: {user_id_str}")
         print(f" Status: {status}")
         
-        result = execute_query(query, params, fetch_one=True)
+        result = execute_query(CREATE_PROJECT_QUERY, params, fetch_one=True)
         
         if result:
             print(f" Project created successfully with ID: {result['id']}")
-            return Project(**result)
+            project = Project(**result)
+            invalidate_project_tiles(project.user_id, project.bbox)
+            try:
+                project.overlaps = project.check_overlaps()
+            except Exception as e:
+                # The project is saved; detect_project_overlaps.py catches up
+                print(f" Overlap check failed for project {project.id}: {e}")
+            if project.overlaps:
+                print(f" Project {project.id} overlaps {len(project.overlaps)} other projects")
+            return project
         
         print(" Project creation failed - no result returned")
         return None
@@ -75,119 +267,224 @@ class Project:
     @staticmethod
     def get_by_id(project_id):
         """Get a project by ID"""
-        query = """
-            SELECT id, user_id, project_name, project_type, country, region,
-                   description, area_hectares, boundary_coordinates,
-                   estimated_agb, estimated_carbon, estimated_co2, status,
-                   created_at, updated_at
-            FROM projects
-            WHERE id = %s
-        """
-        
-        result = execute_query(query, (project_id,), fetch_one=True)
+        result = execute_query(PROJECT_BY_ID_QUERY, (project_id,), fetch_one=True)
         
         if result:
             return Project(**result)
         return None
 
+    @staticmethod
+    async def get_by_id_async(project_id):
+        """Async version of get_by_id for async views"""
+        result = await execute_query_async(PROJECT_BY_ID_QUERY, (project_id,), fetch_one=True)
+        return Project(**result) if result else None
+
+    @staticmethod
+    def get_owned(project_id, user_id):
+        """Get a project only if it belongs to user_id"""
+        result = execute_query(OWNED_PROJECT_QUERY, (project_id, user_id), fetch_one=True)
+        return Project(**result) if result else None
+
+    @staticmethod
+    async def get_owned_async(project_id, user_id):
+        """Async version of get_owned for async views"""
+        result = await execute_query_async(OWNED_PROJECT_QUERY, (project_id, user_id), fetch_one=True)
+        return Project(**result) if result else None
+
+    @staticmethod
+    def exists(project_id):
+        return execute_query(PROJECT_EXISTS_QUERY, (project_id,), fetch_one=True) is not None
+
     @staticmethod
     def get_by_user(user_id):
         """Get all projects for a user"""
         
         # user_id_str = str(user_id) if user_id else None
         
-        query = """
-            SELECT id, user_id, project_name, project_type, country, region,
-                   description, area_hectares, boundary_coordinates,
-                   estimated_agb, estimated_carbon, estimated_co2, status,
-                   created_at, updated_at
-            FROM projects
-            WHERE user_id = %s
-            ORDER BY created_at DESC
-        """
-        
-        results = execute_query(query, (user_id,), fetch_all=True)
+        results = execute_query(PROJECTS_BY_USER_QUERY, (user_id,), fetch_all=True)
         
         if results:
             return [Project(**row) for row in results]
         return []
 
+    @staticmethod
+    async def get_by_user_async(user_id):
+        """Async version of get_by_user for async views"""
+        results = await execute_query_async(PROJECTS_BY_USER_QUERY, (user_id,), fetch_all=True)
+        return [Project(**row) for row in results or []]
+
     @staticmethod
     def get_user_stats(user_id):
         """Get project statistics for a user"""
         
         user_id_str = str(user_id) if user_id else None
         
-        query = """
-            SELECT 
-                COUNT(*) as total_projects,
-                COUNT(CASE WHEN status = 'completed' THEN 1 END) as completed_projects,
-                COUNT(CASE WHEN status = 'in_progress' THEN 1 END) as in_progress_projects,
-                COALESCE(SUM(area_hectares), 0) as total_area,
-                COALESCE(SUM(estimated_agb), 0) as total_agb,
-                COALESCE(SUM(estimated_carbon), 0) as total_carbon,
-                COALESCE(SUM(estimated_co2), 0) as total_co2
-            FROM projects
-            WHERE user_id = %s
-        """
-        
-        result = execute_query(query, (user_id_str,), fetch_one=True)
+        result = execute_query(USER_STATS_QUERY, (user_id_str,), fetch_one=True)
         
         if result:
             return result
         
-        return {
-            'total_projects': 0,
-            'completed_projects': 0,
-            'in_progress_projects': 0,
-            'total_area': 0,
-            'total_agb': 0,
-            'total_carbon': 0,
-            'total_co2': 0
-        }
+        return dict(EMPTY_USER_STATS)
+
+    @staticmethod
+    async def get_user_stats_async(user_id):
+        """Async version of get_user_stats for async views"""
+        user_id_str = str(user_id) if user_id else None
+        result = await execute_query_async(USER_STATS_QUERY, (user_id_str,), fetch_one=True)
+        return result or dict(EMPTY_USER_STATS)
+
+    @staticmethod
+    def get_tile_features(user_id, level, bounds):
+        """Projects whose bounding box meets (min_lng, min_lat, max_lng,
+        max_lat), with the boundary at simplification `level` (a zoom from
+        SIMPLIFY_ZOOMS, or None for full resolution). With user_id None
+        every user's projects are returned."""
+        query = TILE_QUERIES[(level, user_id is None)]
+        params = tuple(bounds) if user_id is None else (str(user_id), *bounds)
+        return execute_query(query, params, fetch_all=True) or []
+
+    def check_overlaps(self):
+        """Measure the overlap of this project with every project whose
+        bounding box meets its own, and record for review those that
+        overlap it by at least MIN_OVERLAP_HECTARES.
+
+        Returns the overlaps found, largest first; `same_owner` tells
+        whether the other project belongs to the same user. Run when a
+        project is created; detect_project_overlaps.py re-checks the whole
+        table.
+        """
+        bbox = self.bbox
+        if bbox is None:
+            return []
+        points = self._boundary_points()
+        rows = execute_query(OVERLAP_CANDIDATES_QUERY, (self.id, *bbox), fetch_all=True) or []
+
+        overlaps = []
+        for row in rows:
+            other = row['boundary_coordinates']
+            if isinstance(other, str):
+                other = json.loads(other)
+            try:
+                # Rows from before boundaries were validated may need repairs
+                other, _ = repair_boundary(other)
+                if not other:
+                    continue
+                hectares, fraction, other_fraction = measure_overlap(points, other)
+            except GeometryError as e:
+                print(f" Overlap check skipped project {row['id']}: {e}")
+                continue
+            if hectares >= MIN_OVERLAP_HECTARES:
+                overlaps.append({
+                    'other_project_id': row['id'],
+                    'same_owner': str(row['user_id']) == str(self.user_id),
+                    'overlap_hectares': hectares,
+                    'project_fraction': fraction,
+                    'other_fraction': other_fraction
+                })
+        overlaps.sort(key=lambda overlap: overlap['overlap_hectares'], reverse=True)
+
+        if overlaps:
+            pairs = [
+                (self.id, o['other_project_id'], o['overlap_hectares'], o['project_fraction'], o['other_fraction'])
+                if self.id < o['other_project_id'] else
+                (o['other_project_id'], self.id, o['overlap_hectares'], o['other_fraction'], o['project_fraction'])
+                for o in overlaps
+            ]
+            execute_query(RECORD_OVERLAPS_QUERY, tuple(map(list, zip(*pairs))))
+        return overlaps
+
+    @staticmethod
+    async def get_overlaps_async(project_id=None, min_hectares=0, limit=50):
+        """Recorded overlaps between projects, largest first; with
+        project_id only those of that project"""
+        if project_id is None:
+            return await execute_query_async(OVERLAPS_QUERY, (min_hectares, limit), fetch_all=True) or []
+        return await execute_query_async(PROJECT_OVERLAPS_QUERY, (project_id, project_id, min_hectares, limit),
+                                         fetch_all=True) or []
 
     def update_estimates(self, agb, carbon, co2):
         """Update AGB estimates for the project"""
-        query = """
-            UPDATE projects 
-            SET estimated_agb = %s, 
-                estimated_carbon = %s, 
-                estimated_co2 = %s,
-                updated_at = CURRENT_TIMESTAMP
-            WHERE id = %s
-        """
-        
-        execute_query(query, (agb, carbon, co2, self.id))
+        execute_query(UPDATE_ESTIMATES_QUERY, (agb, carbon, co2, self.id))
         self.estimated_agb = agb
         self.estimated_carbon = carbon
         self.estimated_co2 = co2
+        invalidate_project_tiles(self.user_id, self.bbox)
 
     def update_status(self, status):
         """Update project status"""
-        query = """
-            UPDATE projects 
-            SET status = %s, updated_at = CURRENT_TIMESTAMP
-            WHERE id = %s
-        """
-        
-        execute_query(query, (status, self.id))
+        execute_query(UPDATE_STATUS_QUERY, (status, self.id))
         self.status = status
+        invalidate_project_tiles(self.user_id, self.bbox)
+
+    @staticmethod
+    def update_owned_status(project_id, user_id, status):
+        """Set the status of a project owned by user_id in one statement.
+
+        Returns the updated Project, or None when the project does not
+        exist or belongs to someone else.
+        """
+        result = execute_query(UPDATE_OWNED_STATUS_QUERY, (status, project_id, user_id), fetch_one=True)
+        if not result:
+            return None
+        project = Project(**result)
+        invalidate_project_tiles(project.user_id, project.bbox)
+        return project
+
+    @staticmethod
+    def update_owned_statuses(project_ids, user_id, status):
+        """Set the status of many projects owned by user_id in one statement.
+
+        Returns the ids that were updated; ids that do not exist or belong
+        to someone else are left untouched.
+        """
+        if not project_ids:
+            return []
+        results = execute_query(UPDATE_OWNED_STATUSES_QUERY, (status, list(project_ids), user_id), fetch_all=True)
+        for row in results or []:
+            if row['bbox_min_lng'] is not None:
+                invalidate_project_tiles(user_id, (row['bbox_min_lng'], row['bbox_min_lat'],
+                                                   row['bbox_max_lng'], row['bbox_max_lat']))
+        return [row['id'] for row in results or []]
 
     def delete(self):
         """Delete the project"""
-        query = "DELETE FROM projects WHERE id = %s"
-        execute_query(query, (self.id,))
-    
-    def to_dict(self):
-        """Convert project to dictionary"""
-        # Handle boundary_coordinates safely
+        execute_query(DELETE_PROJECT_QUERY, (self.id,))
+        invalidate_project_tiles(self.user_id, self.bbox)
+
+    def _boundary_points(self):
         if isinstance(self.boundary_coordinates, str):
             try:
-                boundary_coords = json.loads(self.boundary_coordinates)
+                return json.loads(self.boundary_coordinates)
             except (json.JSONDecodeError, TypeError):
-                boundary_coords = []
-        else:
-            boundary_coords = self.boundary_coordinates or []
+                return []
+        return self.boundary_coordinates or []
+
+    @property
+    def bbox(self):
+        """(min_lng, min_lat, max_lng, max_lat) of the boundary, or None"""
+        try:
+            return boundary_bbox(self._boundary_points())
+        except GeometryError:
+            return None
+    
+    def to_dict(self, delta_coordinates=False, zoom=None):
+        """Convert project to dictionary
+
+        With delta_coordinates the boundary is returned in the compact
+        delta-e6 form from utils.compression instead of a list of points.
+        With a map zoom the coarsest stored boundary that still looks exact
+        at that zoom is returned instead of the full-resolution one.
+        """
+        # Handle boundary_coordinates safely
+        boundary_coords = self._boundary_points()
+
+        simplified = self.boundary_simplified
+        if isinstance(simplified, str):
+            simplified = json.loads(simplified)
+        boundary_coords = boundary_for_zoom(boundary_coords, simplified, zoom)
+
+        if delta_coordinates:
+            boundary_coords = delta_encode_coordinates(boundary_coords)
         
         return {
             'id': self.id,
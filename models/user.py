@@ -1,8 +1,219 @@
 from datetime import datetime, timedelta
 from utils.database import execute_query
-import bcrypt
+from utils.async_database import execute_query_async
+from utils.query_registry import register_query
+from utils.cache import TTLCache
+from utils import password_hasher
+from flask import current_app, has_app_context
+import base64
+import json
 import secrets
 
+# Process-wide cache of recently loaded users, keyed by user id
+_user_cache = TTLCache(maxsize=1024, ttl=30)
+
+# Every users/user_tokens query is declared here once; see utils.query_registry
+CREATE_USER_QUERY = register_query('users.create', """
+    INSERT INTO users (email, password_hash, role, first_name, last_name,
+                     organization, phone_number)
+    VALUES (%s, %s, %s, %s, %s, %s, %s)
+    RETURNING id, email, password_hash, role, first_name, last_name,
+              organization, email_verified, two_factor_enabled, phone_number,
+              created_at, last_login
+""")
+
+USER_BY_EMAIL_QUERY = register_query('users.by_email', """
+    SELECT id, email, password_hash, role, first_name, last_name,
+           organization, email_verified, two_factor_enabled, phone_number,
+           created_at, last_login
+    FROM users
+    WHERE email = %s
+""")
+
+USER_BY_ID_QUERY = register_query('users.by_id', """
+    SELECT id, email, password_hash, role, first_name, last_name,
+           organization, email_verified, two_factor_enabled, phone_number,
+           created_at, last_login
+    FROM users
+    WHERE id = %s
+""")
+
+UPDATE_LAST_LOGIN_QUERY = register_query('users.update_last_login', "UPDATE users SET last_login = %s WHERE id = %s",
+                                         read_back=False)
+
+ENABLE_TWO_FACTOR_QUERY = register_query('users.enable_two_factor', "UPDATE users SET two_factor_enabled = true WHERE id = %s")
+
+DISABLE_TWO_FACTOR_QUERY = register_query('users.disable_two_factor', "UPDATE users SET two_factor_enabled = false WHERE id = %s")
+
+VERIFY_EMAIL_QUERY = register_query('users.verify_email', "UPDATE users SET email_verified = true WHERE id = %s")
+
+UPDATE_PASSWORD_QUERY = register_query('users.update_password', "UPDATE users SET password_hash = %s WHERE id = %s")
+
+# The columns an admin may see; never the password hash or phone number
+DIRECTORY_COLUMNS = """id, email, role, first_name, last_name, organization,
+           email_verified, two_factor_enabled, created_at, last_login"""
+
+ALL_USERS_QUERY = register_query('users.all', f"""
+    SELECT {DIRECTORY_COLUMNS}
+    FROM users
+    ORDER BY created_at DESC
+""", read_only=True)
+
+USER_ROLE_COUNTS_QUERY = register_query('users.role_counts', """
+    SELECT role, count(*) AS count
+    FROM users
+    GROUP BY role
+""", read_only=True)
+
+# Search terms shorter than a trigram use the prefix indexes instead
+TRIGRAM_MIN_LENGTH = 3
+
+CREATE_TOKEN_QUERY = register_query('user_tokens.create', """
+    INSERT INTO user_tokens (user_id, token, token_type, expires_at)
+    VALUES (%s, %s, %s, %s)
+    RETURNING id, token
+""")
+
+VERIFY_TOKEN_QUERY = register_query('user_tokens.verify', """
+    SELECT user_id
+    FROM user_tokens
+    WHERE token = %s AND token_type = %s
+      AND NOT used AND expires_at > now()
+""")
+
+CONSUME_TOKEN_QUERY = register_query('user_tokens.consume', """
+    UPDATE user_tokens
+    SET used = true
+    WHERE token = %s AND token_type = %s
+      AND NOT used AND expires_at > now()
+    RETURNING user_id
+""")
+
+# Consumes a password reset token and sets the new hash in one statement,
+# so the token is only used up if the password actually changes
+RESET_PASSWORD_QUERY = register_query('users.reset_password', """
+    WITH consumed AS (
+        UPDATE user_tokens
+        SET used = true
+        WHERE token = %s AND token_type = 'password_reset'
+          AND NOT used AND expires_at > now()
+        RETURNING user_id
+    )
+    UPDATE users
+    SET password_hash = %s
+    FROM consumed
+    WHERE users.id = consumed.user_id
+    RETURNING users.id
+""")
+
+MARK_TOKEN_USED_QUERY = register_query('user_tokens.mark_used', "UPDATE user_tokens SET used = true WHERE token = %s")
+
+# Expired and used tokens are purged by separate queries so each batch is
+# found through its own index (an OR of the two cannot use either)
+DELETE_EXPIRED_TOKENS_QUERY = register_query('user_tokens.delete_expired', """
+    DELETE FROM user_tokens
+    WHERE id IN (
+        SELECT id FROM user_tokens
+        WHERE expires_at < now()
+        LIMIT %s
+        FOR UPDATE SKIP LOCKED
+    )
+""", read_back=False)
+
+DELETE_USED_TOKENS_QUERY = register_query('user_tokens.delete_used', """
+    DELETE FROM user_tokens
+    WHERE id IN (
+        SELECT id FROM user_tokens
+        WHERE used
+        LIMIT %s
+        FOR UPDATE SKIP LOCKED
+    )
+""", read_back=False)
+
+def _like_escape(term):
+    return term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def encode_directory_cursor(row):
+    """Opaque keyset cursor pointing just past `row` (users.created_at is NOT NULL)"""
+    raw = json.dumps([row['created_at'].isoformat(), str(row['id'])]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_directory_cursor(cursor):
+    """(created_at, id) from encode_directory_cursor; ValueError if malformed"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        created_at, user_id = json.loads(raw)
+        return datetime.fromisoformat(created_at), str(user_id)
+    except (TypeError, ValueError) as e:
+        raise ValueError('Invalid cursor') from e
+
+
+def _directory_query(role=None, organization=None, email_verified=None, search=None,
+                     after=None, limit=50):
+    """The named query and parameters for one page of the admin user directory.
+
+    Pages are keyset-paginated newest first on (created_at, id), so every page
+    costs the same however deep it is. Each combination of filters is its own
+    named query: the planner then picks the matching index for each, and the
+    verification filter is written as a literal so the partial index on
+    unverified users applies. Searches are not prepared: only a plan made
+    for the actual pattern turns a prefix into a text_pattern_ops range or
+    weighs a rare substring against walking the created_at index.
+    """
+    name = ['users.directory']
+    conditions = []
+    params = []
+
+    if role:
+        name.append('role')
+        conditions.append("role = %s")
+        params.append(role)
+    if organization:
+        name.append('organization')
+        conditions.append("organization = %s")
+        params.append(organization)
+    if email_verified is not None:
+        name.append('verified' if email_verified else 'unverified')
+        conditions.append("email_verified" if email_verified else "NOT email_verified")
+    if search:
+        term = _like_escape(search.lower())
+        if len(search) < TRIGRAM_MIN_LENGTH:
+            name.append('prefix')
+            conditions.append(
+                "(lower(email) LIKE %s OR lower(first_name) LIKE %s OR lower(last_name) LIKE %s)"
+            )
+            params.extend([term + '%'] * 3)
+        else:
+            name.append('substring')
+            conditions.append(
+                "(lower(email) LIKE %s OR lower(first_name || ' ' || last_name) LIKE %s)"
+            )
+            params.extend(['%' + term + '%'] * 2)
+    if after is not None:
+        name.append('after')
+        conditions.append("(created_at, id) < (%s, %s)")
+        params.extend(after)
+
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    query = register_query('.'.join(name), f"""
+    SELECT {DIRECTORY_COLUMNS}
+    FROM users
+    {where}
+    ORDER BY created_at DESC, id DESC
+    LIMIT %s
+""", read_only=True, prepare=not search)
+    # One extra row tells whether there is a next page
+    params.append(limit + 1)
+    return query, tuple(params)
+
+
+def _directory_page(rows, limit):
+    next_cursor = encode_directory_cursor(rows[limit - 1]) if len(rows) > limit else None
+    return {'users': rows[:limit], 'next_cursor': next_cursor}
+
+
 class User:
     def __init__(self, id, email, password_hash, role, first_name, last_name,
                  organization, email_verified=False, two_factor_enabled=False,
@@ -21,29 +232,29 @@ class User:
         self.last_login = last_login
 
     @staticmethod
-    def hash_password(password):
-        salt = bcrypt.gensalt()
-        return bcrypt.hashpw(password.encode('utf-8'), salt).decode('utf-8')
+    def hash_password(password, client_ip=None):
+        return password_hasher.hash_password(password, client_ip=client_ip)
 
     @staticmethod
-    def verify_password(password, password_hash):
-        return bcrypt.checkpw(password.encode('utf-8'), password_hash.encode('utf-8'))
+    def verify_password(password, password_hash, client_ip=None):
+        return password_hasher.verify_password(password, password_hash, client_ip=client_ip)
 
-    @staticmethod
-    def create(email, password, role, first_name, last_name, organization, phone_number=None):
-        password_hash = User.hash_password(password)
+    def rehash_password_if_needed(self, password, client_ip=None):
+        """Re-hash a just-verified password when the configured bcrypt cost changed"""
+        if password_hasher.needs_rehash(self.password_hash):
+            try:
+                self.update_password(password, client_ip=client_ip)
+            except password_hasher.PasswordHasherBusy:
+                # Best effort - the upgrade is retried on the next login
+                pass
 
-        query = """
-            INSERT INTO users (email, password_hash, role, first_name, last_name,
-                             organization, phone_number)
-            VALUES (%s, %s, %s, %s, %s, %s, %s)
-            RETURNING id, email, password_hash, role, first_name, last_name,
-                      organization, email_verified, two_factor_enabled, phone_number,
-                      created_at, last_login
-        """
+    @staticmethod
+    def create(email, password, role, first_name, last_name, organization, phone_number=None,
+               client_ip=None):
+        password_hash = User.hash_password(password, client_ip=client_ip)
 
         result = execute_query(
-            query,
+            CREATE_USER_QUERY,
             (email, password_hash, role, first_name, last_name, organization, phone_number),
             fetch_one=True
         )
@@ -54,15 +265,7 @@ class User:
 
     @staticmethod
     def get_by_email(email):
-        query = """
-            SELECT id, email, password_hash, role, first_name, last_name,
-                   organization, email_verified, two_factor_enabled, phone_number,
-                   created_at, last_login
-            FROM users
-            WHERE email = %s
-        """
-
-        result = execute_query(query, (email,), fetch_one=True)
+        result = execute_query(USER_BY_EMAIL_QUERY, (email,), fetch_one=True)
 
         if result:
             return User(**result)
@@ -70,53 +273,119 @@ class User:
 
     @staticmethod
     def get_by_id(user_id):
-        query = """
-            SELECT id, email, password_hash, role, first_name, last_name,
-                   organization, email_verified, two_factor_enabled, phone_number,
-                   created_at, last_login
-            FROM users
-            WHERE id = %s
-        """
-
-        result = execute_query(query, (user_id,), fetch_one=True)
+        result = execute_query(USER_BY_ID_QUERY, (user_id,), fetch_one=True)
 
         if result:
             return User(**result)
         return None
 
+    @staticmethod
+    async def get_by_id_async(user_id):
+        """Async version of get_by_id for async views"""
+        result = await execute_query_async(USER_BY_ID_QUERY, (user_id,), fetch_one=True)
+        return User(**result) if result else None
+
+    @staticmethod
+    def _cache_user(key, user):
+        if user:
+            ttl = current_app.config.get('USER_CACHE_TTL', 30) if has_app_context() else None
+            _user_cache.set(key, user, ttl=ttl)
+
+    @staticmethod
+    def get_cached(user_id):
+        """Get a user by ID, served from the short-TTL cache when possible"""
+        key = str(user_id)
+        user = _user_cache.get(key)
+        if user is None:
+            user = User.get_by_id(user_id)
+            User._cache_user(key, user)
+        return user
+
+    @staticmethod
+    async def get_cached_async(user_id):
+        """Async version of get_cached"""
+        key = str(user_id)
+        user = _user_cache.get(key)
+        if user is None:
+            user = await User.get_by_id_async(user_id)
+            User._cache_user(key, user)
+        return user
+
+    @staticmethod
+    def invalidate_cache(user_id):
+        _user_cache.pop(str(user_id))
+
     def update_last_login(self):
-        query = "UPDATE users SET last_login = %s WHERE id = %s"
-        execute_query(query, (datetime.now(), self.id))
+        execute_query(UPDATE_LAST_LOGIN_QUERY, (datetime.now(), self.id))
+        User.invalidate_cache(self.id)
 
     def enable_two_factor(self):
-        query = "UPDATE users SET two_factor_enabled = true WHERE id = %s"
-        execute_query(query, (self.id,))
+        execute_query(ENABLE_TWO_FACTOR_QUERY, (self.id,))
         self.two_factor_enabled = True
+        User.invalidate_cache(self.id)
 
     def disable_two_factor(self):
-        query = "UPDATE users SET two_factor_enabled = false WHERE id = %s"
-        execute_query(query, (self.id,))
+        execute_query(DISABLE_TWO_FACTOR_QUERY, (self.id,))
         self.two_factor_enabled = False
+        User.invalidate_cache(self.id)
 
     def verify_email(self):
-        query = "UPDATE users SET email_verified = true WHERE id = %s"
-        execute_query(query, (self.id,))
+        execute_query(VERIFY_EMAIL_QUERY, (self.id,))
         self.email_verified = True
+        User.invalidate_cache(self.id)
+
+    def update_password(self, new_password, client_ip=None):
+        password_hash = User.hash_password(new_password, client_ip=client_ip)
+        execute_query(UPDATE_PASSWORD_QUERY, (password_hash, self.id))
+        self.password_hash = password_hash
+        User.invalidate_cache(self.id)
+
+    @staticmethod
+    def reset_password(token, new_password, client_ip=None):
+        """Set a new password with a password reset token.
 
-    def update_password(self, new_password):
-        password_hash = User.hash_password(new_password)
-        query = "UPDATE users SET password_hash = %s WHERE id = %s"
-        execute_query(query, (password_hash, self.id))
+        The password is hashed before the token is touched; the token is
+        then consumed and the hash written in one statement. Returns the
+        user's id, or None when the token is invalid, expired or was used
+        meanwhile. PasswordHasherBusy leaves the token valid.
+        """
+        password_hash = User.hash_password(new_password, client_ip=client_ip)
+        result = execute_query(RESET_PASSWORD_QUERY, (token, password_hash), fetch_one=True)
+        if not result:
+            return None
+        User.invalidate_cache(result['id'])
+        return result['id']
 
     @staticmethod
     def get_all_users():
-        query = """
-            SELECT id, email, role, first_name, last_name, organization,
-                   email_verified, two_factor_enabled, created_at, last_login
-            FROM users
-            ORDER BY created_at DESC
+        return execute_query(ALL_USERS_QUERY, fetch_all=True)
+
+    @staticmethod
+    def search_directory(role=None, organization=None, email_verified=None, search=None,
+                         cursor=None, limit=50):
+        """One page of users for the admin directory, newest first.
+
+        Returns {'users': [...], 'next_cursor': str or None}; pass
+        `next_cursor` back as `cursor` for the following page. Raises
+        ValueError for a malformed cursor.
         """
-        return execute_query(query, fetch_all=True)
+        after = decode_directory_cursor(cursor) if cursor else None
+        query, params = _directory_query(role, organization, email_verified, search, after, limit)
+        return _directory_page(execute_query(query, params, fetch_all=True), limit)
+
+    @staticmethod
+    async def search_directory_async(role=None, organization=None, email_verified=None, search=None,
+                                     cursor=None, limit=50):
+        """Async version of search_directory for async views"""
+        after = decode_directory_cursor(cursor) if cursor else None
+        query, params = _directory_query(role, organization, email_verified, search, after, limit)
+        return _directory_page(await execute_query_async(query, params, fetch_all=True), limit)
+
+    @staticmethod
+    def count_by_role():
+        """{role: number of users}, without loading the users themselves"""
+        rows = execute_query(USER_ROLE_COUNTS_QUERY, fetch_all=True)
+        return {row['role']: row['count'] for row in rows}
 
 class UserToken:
     @staticmethod
@@ -124,14 +393,8 @@ class UserToken:
         token = secrets.token_urlsafe(32)
         expires_at = datetime.now() + timedelta(minutes=expiry_minutes)
 
-        query = """
-            INSERT INTO user_tokens (user_id, token, token_type, expires_at)
-            VALUES (%s, %s, %s, %s)
-            RETURNING id, token
-        """
-
         result = execute_query(
-            query,
+            CREATE_TOKEN_QUERY,
             (user_id, token, token_type, expires_at),
             fetch_one=True
         )
@@ -140,31 +403,38 @@ class UserToken:
 
     @staticmethod
     def verify_token(token, token_type):
-        query = """
-            SELECT user_id, expires_at, used
-            FROM user_tokens
-            WHERE token = %s AND token_type = %s
-        """
+        """Check a token is still usable without consuming it"""
+        result = execute_query(VERIFY_TOKEN_QUERY, (token, token_type), fetch_one=True)
+        return result['user_id'] if result else None
 
-        result = execute_query(query, (token, token_type), fetch_one=True)
-
-        if not result:
-            return None
-
-        if result['used']:
-            return None
-
-        if datetime.now() > result['expires_at']:
-            return None
+    @staticmethod
+    def consume_token(token, token_type):
+        """Atomically mark a valid token as used and return its user_id.
 
-        return result['user_id']
+        A single UPDATE both validates and consumes the token, so two requests
+        racing with the same token cannot both succeed.
+        """
+        result = execute_query(CONSUME_TOKEN_QUERY, (token, token_type), fetch_one=True)
+        return result['user_id'] if result else None
 
     @staticmethod
     def mark_as_used(token):
-        query = "UPDATE user_tokens SET used = true WHERE token = %s"
-        execute_query(query, (token,))
+        execute_query(MARK_TOKEN_USED_QUERY, (token,))
 
     @staticmethod
-    def delete_expired_tokens():
-        query = "DELETE FROM user_tokens WHERE expires_at < %s"
-        execute_query(query, (datetime.now(),))
+    def delete_expired_tokens(batch_size=1000, max_batches=None):
+        """Delete expired and used tokens in bounded batches.
+
+        Each batch is its own short transaction so the purge never holds
+        locks on a large part of user_tokens. Returns the number of rows deleted.
+        """
+        deleted = 0
+        batches = 0
+        for query in (DELETE_EXPIRED_TOKENS_QUERY, DELETE_USED_TOKENS_QUERY):
+            while max_batches is None or batches < max_batches:
+                count = execute_query(query, (batch_size,))
+                deleted += count
+                batches += 1
+                if count < batch_size:
+                    break
+        return deleted
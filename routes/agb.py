@@ -1,11 +1,44 @@
-from flask import Blueprint, request, jsonify, render_template, session
-from utils.decorators import login_required, two_factor_verified
+from flask import Blueprint, request, jsonify, render_template, session, current_app
+from flask_wtf.csrf import generate_csrf
+from utils.decorators import login_required, two_factor_verified, role_required, prediction_admission, csrf_required
+from utils.compression import wants_delta_coordinates
+from utils.geometry import GeometryError, requested_zoom, simplify_level
+from utils.singleflight import SingleFlight
+from utils.tile_cache import ALL_PROJECTS, get_tile_cache
+from utils.vector_tiles import Layer, add_boundary, encode_tile, tile_bounds, valid_tile
 from models.project import Project  
 from datetime import datetime
-import json
+from decimal import Decimal
+import hashlib
+import time
 
 agb_bp = Blueprint('agb', __name__)
 
+# Concurrent identical prediction requests share one computation
+prediction_flight = SingleFlight('agb-predict')
+polygon_flight = SingleFlight('agb-predict-polygon')
+
+# Coordinates are rounded to 5 decimals (~1 m) when matching requests
+COORDINATE_KEY_PRECISION = 5
+
+PROJECT_STATUSES = ['draft', 'in_progress', 'completed']
+
+# Most projects one batch status update may change
+BATCH_STATUS_MAX_PROJECTS = 1000
+
+
+def _project_not_owned(project_id):
+    """404/403 response once an ownership-filtered query matched nothing"""
+    if not Project.exists(project_id):
+        return jsonify({
+            'success': False,
+            'error': 'Project not found'
+        }), 404
+    return jsonify({
+        'success': False,
+        'error': 'Unauthorized'
+    }), 403
+
 @agb_bp.route('/test', methods=['GET'])
 @login_required
 @two_factor_verified
@@ -109,10 +142,17 @@ def create_project():
         
         if project:
             print(f"Project created successfully with ID: {project.id}, Status: {project.status}")
+            # Other users' projects are only counted; their ids and areas
+            # are for admins (/dashboard/api/admin/overlaps)
             return jsonify({
                 'success': True,
                 'message': 'Project created successfully!',
-                'project': project.to_dict()
+                'project': project.to_dict(),
+                'overlap_count': len(project.overlaps),
+                'overlaps': [
+                    {key: value for key, value in overlap.items() if key != 'same_owner'}
+                    for overlap in project.overlaps if overlap['same_owner']
+                ]
             })
         else:
             return jsonify({
@@ -120,6 +160,11 @@ def create_project():
                 'error': 'Failed to create project'
             }), 500
             
+    except GeometryError as e:
+        return jsonify({
+            'success': False,
+            'error': f'Invalid project boundary: {e}'
+        }), 400
     except Exception as e:
         print(f"Error creating project: {e}")
         import traceback
@@ -139,30 +184,17 @@ def update_project_status(project_id):
         new_status = data.get('status')
         
         # Validate status
-        valid_statuses = ['draft', 'in_progress', 'completed']
-        if new_status not in valid_statuses:
+        if new_status not in PROJECT_STATUSES:
             return jsonify({
                 'success': False,
-                'error': f'Invalid status. Must be one of: {", ".join(valid_statuses)}'
+                'error': f'Invalid status. Must be one of: {", ".join(PROJECT_STATUSES)}'
             }), 400
         
-        project = Project.get_by_id(project_id)
+        # Update status only if the user owns the project
+        project = Project.update_owned_status(project_id, session.get('user_id'), new_status)
         
         if not project:
-            return jsonify({
-                'success': False,
-                'error': 'Project not found'
-            }), 404
-        
-        # Check if user owns this project
-        if project.user_id != session.get('user_id'):
-            return jsonify({
-                'success': False,
-                'error': 'Unauthorized'
-            }), 403
-        
-        # Update status
-        project.update_status(new_status)
+            return _project_not_owned(project_id)
         
         return jsonify({
             'success': True,
@@ -183,23 +215,11 @@ def update_project_status(project_id):
 def complete_project(project_id):
     """Mark project as completed"""
     try:
-        project = Project.get_by_id(project_id)
+        # Update status to completed only if the user owns the project
+        project = Project.update_owned_status(project_id, session.get('user_id'), 'completed')
         
         if not project:
-            return jsonify({
-                'success': False,
-                'error': 'Project not found'
-            }), 404
-        
-        # Check if user owns this project
-        if project.user_id != session.get('user_id'):
-            return jsonify({
-                'success': False,
-                'error': 'Unauthorized'
-            }), 403
-        
-        # Update status to completed
-        project.update_status('completed')
+            return _project_not_owned(project_id)
         
         return jsonify({
             'success': True,
@@ -214,30 +234,70 @@ def complete_project(project_id):
             'error': str(e)
         }), 500
 
-@agb_bp.route('/project/<int:project_id>', methods=['GET'])
+@agb_bp.route('/projects/update-status', methods=['POST'])
 @login_required
 @two_factor_verified
-def get_project(project_id):
-    """Get a specific project"""
+def update_projects_status():
+    """Set the status of many of the user's projects in one query.
+
+    Body: {"project_ids": [1, 2, ...], "status": "completed"}. Ids the user
+    does not own (or that do not exist) are returned in `not_updated`.
+    """
     try:
-        project = Project.get_by_id(project_id)
-        
-        if not project:
+        data = request.get_json(silent=True) or {}
+        new_status = data.get('status')
+        project_ids = data.get('project_ids')
+
+        if new_status not in PROJECT_STATUSES:
             return jsonify({
                 'success': False,
-                'error': 'Project not found'
-            }), 404
-        
-        # Check if user owns this project
-        if project.user_id != session.get('user_id'):
+                'error': f'Invalid status. Must be one of: {", ".join(PROJECT_STATUSES)}'
+            }), 400
+
+        if not isinstance(project_ids, list) or not project_ids or \
+                not all(isinstance(i, int) and not isinstance(i, bool) for i in project_ids):
             return jsonify({
                 'success': False,
-                'error': 'Unauthorized'
-            }), 403
+                'error': 'project_ids must be a non-empty list of project ids'
+            }), 400
+
+        if len(project_ids) > BATCH_STATUS_MAX_PROJECTS:
+            return jsonify({
+                'success': False,
+                'error': f'At most {BATCH_STATUS_MAX_PROJECTS} projects per request'
+            }), 400
+
+        requested = list(dict.fromkeys(project_ids))
+        updated = set(Project.update_owned_statuses(requested, session.get('user_id'), new_status))
+
+        return jsonify({
+            'success': True,
+            'status': new_status,
+            'updated': [i for i in requested if i in updated],
+            'not_updated': [i for i in requested if i not in updated]
+        })
+
+    except Exception as e:
+        print(f"Error updating project statuses: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@agb_bp.route('/project/<int:project_id>', methods=['GET'])
+@login_required
+@two_factor_verified
+async def get_project(project_id):
+    """Get a specific project"""
+    try:
+        project = await Project.get_owned_async(project_id, session.get('user_id'))
+        
+        if not project:
+            return _project_not_owned(project_id)
         
         return jsonify({
             'success': True,
-            'project': project.to_dict()
+            'project': project.to_dict(delta_coordinates=wants_delta_coordinates(), zoom=requested_zoom())
         })
         
     except Exception as e:
@@ -265,7 +325,10 @@ def test_project_creation():
             region='Test Region',
             description='Test project creation',
             area_hectares=10.5,
-            boundary_coordinates=[{"lat": -1.2921, "lng": 36.8219}],
+            boundary_coordinates=[
+                {"lat": -1.2921, "lng": 36.8219}, {"lat": -1.2921, "lng": 36.8249},
+                {"lat": -1.2951, "lng": 36.8249}, {"lat": -1.2951, "lng": 36.8219}
+            ],
             estimated_agb=25.5,
             estimated_carbon=12.75,
             estimated_co2=46.79
@@ -303,20 +366,22 @@ def projects_page():
 @agb_bp.route('/api/projects', methods=['GET'])
 @login_required
 @two_factor_verified
-def get_user_projects_api():
+async def get_user_projects_api():
     """API endpoint to get projects data (for dashboard)"""
     try:
         user_id = session.get('user_id')
         print(f"DEBUG: Fetching projects for user_id: {user_id}")
         
-        projects = Project.get_by_user(user_id)
+        projects = await Project.get_by_user_async(user_id)
         print(f"DEBUG: Found {len(projects)} projects")
         
         # Debug each project
         for i, project in enumerate(projects):
             print(f"DEBUG: Project {i}: {project.project_name}, ID: {project.id}")
         
-        projects_dict = [p.to_dict() for p in projects]
+        delta = wants_delta_coordinates()
+        zoom = requested_zoom()
+        projects_dict = [p.to_dict(delta_coordinates=delta, zoom=zoom) for p in projects]
         
         return jsonify({
             'success': True,
@@ -332,6 +397,62 @@ def get_user_projects_api():
             'error': str(e)
         }), 500
 
+MVT_MIMETYPE = 'application/vnd.mapbox-vector-tile'
+
+# Project columns carried as vector tile feature properties
+TILE_PROPERTIES = ('project_name', 'project_type', 'status', 'area_hectares',
+                   'estimated_agb', 'estimated_carbon', 'estimated_co2')
+
+def _render_project_tile(user_id, z, x, y):
+    """Encode the projects of user_id (every user's when None) in tile z/x/y"""
+    layer = Layer('projects')
+    for row in Project.get_tile_features(user_id, simplify_level(z), tile_bounds(z, x, y)):
+        properties = {name: float(row[name]) if isinstance(row[name], Decimal) else row[name]
+                      for name in TILE_PROPERTIES}
+        add_boundary(layer, z, x, y, row['id'], row['boundary'], properties)
+    return encode_tile([layer])
+
+@agb_bp.route('/tiles/<int:z>/<int:x>/<int:y>', methods=['GET'])
+@login_required
+@two_factor_verified
+def project_tile(z, x, y):
+    """Mapbox Vector Tile (layer `projects`) of project boundaries and AGB estimates.
+
+    Boundaries are clipped to the tile plus a small buffer and quantized to
+    the tile's 4096-unit grid. Admins see every project, everyone else
+    their own. Tiles are cached on local disk until a project in them changes.
+    """
+    if not valid_tile(z, x, y):
+        return jsonify({'success': False, 'error': 'Tile not found'}), 404
+
+    try:
+        all_projects = session.get('user_role') == 'admin'
+        user_id = None if all_projects else session.get('user_id')
+        scope = ALL_PROJECTS if all_projects else user_id
+        cache = get_tile_cache(current_app) if current_app.config.get('TILE_CACHE_DIR') else None
+
+        data = cache.get(scope, z, x, y) if cache else None
+        if data is None:
+            rendered_at = time.time()
+            data = _render_project_tile(user_id, z, x, y)
+            if cache:
+                cache.put(scope, z, x, y, data, rendered_at)
+
+        response = current_app.response_class(data, mimetype=MVT_MIMETYPE)
+        # Revalidated on every use, so a changed project shows up at once
+        response.headers['Cache-Control'] = 'private, no-cache'
+        response.set_etag(hashlib.md5(data).hexdigest())
+        return response.make_conditional(request)
+
+    except Exception as e:
+        print(f"Error rendering tile {z}/{x}/{y}: {e}")
+        import traceback
+        traceback.print_exc()
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
 # ==================== AGB PREDICTION ROUTES ====================
 
 # @agb_bp.route('/predict', methods=['POST'])
@@ -415,6 +536,7 @@ def get_user_projects_api():
 @agb_bp.route('/predict', methods=['POST'])
 @login_required  
 @two_factor_verified
+@prediction_admission('interactive', 'predict')
 def predict_agb():
     """API endpoint for AGB prediction using ACTUAL model"""
     print("========== AGB PREDICTION WITH ACTUAL MODEL ==========")
@@ -424,19 +546,39 @@ def predict_agb():
         latitude = data.get('latitude')
         longitude = data.get('longitude')
         country = data.get('country', 'kenya')  # Get country from frontend
+        region = data.get('region')
         
         print(f"Coordinates: {latitude}, {longitude}, Country: {country}")
         
         # Predict AGB using your ACTUAL model with country context
         from ml.services.agb_predictor import agb_predictor
-        agb_estimate = agb_predictor.predict(latitude, longitude, country)
+        from ml.services.model_registry import normalize_key
+        quantiles = parse_quantiles(data) if data.get('uncertainty') else None
+
+        def run_prediction():
+            if quantiles is not None:
+                result = agb_predictor.predict_with_uncertainty(
+                    [(latitude, longitude)], country, quantiles, region
+                )[0]
+                return result['agb_estimate'], result['model_version'], _round_uncertainty(result)
+            return agb_predictor.predict_with_version(latitude, longitude, country, region) + (None,)
+
+        key = (
+            round(float(latitude), COORDINATE_KEY_PRECISION),
+            round(float(longitude), COORDINATE_KEY_PRECISION),
+            normalize_key(country, region),
+            quantiles,
+        )
+        agb_estimate, model_version, uncertainty = prediction_flight.do(
+            key, run_prediction, timeout=current_app.config.get('SINGLEFLIGHT_TIMEOUT', 10)
+        )
         
         # Calculate carbon equivalent (using IPCC standard conversion)
         carbon_stock = agb_estimate * 0.47  # 47% carbon content
         co2_equivalent = carbon_stock * 3.67  # CO2 to carbon ratio
         
         print("========== PREDICTION SUCCESSFUL ==========")
-        return jsonify({
+        response = {
             'success': True,
             'agb_estimate': round(agb_estimate, 2),
             'carbon_stock': round(carbon_stock, 2),
@@ -446,8 +588,12 @@ def predict_agb():
                 'latitude': latitude,
                 'longitude': longitude
             },
+            'model_version': model_version,
             'units': 'Mg/ha'
-        })
+        }
+        if uncertainty is not None:
+            response['uncertainty'] = uncertainty
+        return jsonify(response)
         
     except Exception as e:
         print(f"========== PREDICTION FAILED ==========")
@@ -459,9 +605,88 @@ def predict_agb():
             'error': str(e)
         }), 400
 
+def parse_quantiles(data):
+    """Read requested quantiles, e.g. [0.05, 0.5, 0.95], from a prediction request"""
+    from ml.services.forest_uncertainty import DEFAULT_QUANTILES
+    quantiles = data.get('quantiles') or DEFAULT_QUANTILES
+    if not isinstance(quantiles, (list, tuple)) or len(quantiles) > 9:
+        raise ValueError('quantiles must be a list of at most 9 values')
+    quantiles = tuple(float(q) for q in quantiles)
+    if any(q <= 0 or q >= 1 for q in quantiles):
+        raise ValueError('quantiles must be between 0 and 1')
+    return quantiles
+
+def _round_uncertainty(result):
+    return {
+        'std': round(result['std'], 2),
+        'quantiles': {name: round(value, 2) for name, value in result['quantiles'].items()},
+    }
+
+@agb_bp.route('/predict-batch', methods=['POST'])
+@login_required
+@two_factor_verified
+@prediction_admission('bulk', 'batch')
+def predict_batch():
+    """Predict AGB for many points in one request, optionally with per-tree uncertainty"""
+    try:
+        data = request.get_json()
+        points = data.get('points', [])
+        country = data.get('country', 'kenya')
+        max_points = current_app.config.get('PREDICT_BATCH_MAX_POINTS', 1000)
+
+        if not points:
+            return jsonify({'success': False, 'error': 'No points provided'}), 400
+        if len(points) > max_points:
+            return jsonify({
+                'success': False,
+                'error': f'At most {max_points} points per request'
+            }), 400
+
+        # Points may carry their own country/region; mixed batches are
+        # grouped so each country model runs once
+        coordinates = [
+            (float(p['latitude']), float(p['longitude']), p.get('country'), p.get('region'))
+            for p in points
+        ]
+
+        from ml.services.agb_predictor import agb_predictor
+        if data.get('uncertainty'):
+            results = agb_predictor.predict_with_uncertainty(coordinates, country, parse_quantiles(data))
+        else:
+            results = agb_predictor.predict_batch(coordinates, country)
+
+        predictions = []
+        for (latitude, longitude, point_country, _), result in zip(coordinates, results):
+            prediction = {
+                'latitude': latitude,
+                'longitude': longitude,
+                'country': point_country or country,
+                'agb_estimate': round(result['agb_estimate'], 2),
+                'co2_equivalent': round(result['agb_estimate'] * 0.47 * 3.67, 2),
+                'model_version': result['model_version'],
+            }
+            if 'std' in result:
+                prediction['uncertainty'] = _round_uncertainty(result)
+            predictions.append(prediction)
+
+        return jsonify({
+            'success': True,
+            'country': country,
+            'predictions': predictions,
+            'units': 'Mg/ha'
+        })
+
+    except Exception as e:
+        print(f"Batch prediction failed: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+
 @agb_bp.route('/predict-polygon', methods=['POST'])
 @login_required
 @two_factor_verified
+@prediction_admission('bulk', 'polygon')
 def predict_polygon():
     """Predict AGB for a polygon area"""
     try:
@@ -482,9 +707,18 @@ def predict_polygon():
         
         print(f"Polygon centroid: {centroid_lat}, {centroid_lng}")
         
-        # Predict at centroid using new coordinate-based method
+        # Predict at centroid using new coordinate-based method; identical
+        # polygons requested concurrently share one prediction
         from ml.services.agb_predictor import agb_predictor
-        agb_estimate = agb_predictor.predict(centroid_lat, centroid_lng)
+        key = tuple(
+            (round(float(coord['lat']), COORDINATE_KEY_PRECISION), round(float(coord['lng']), COORDINATE_KEY_PRECISION))
+            for coord in coordinates
+        )
+        agb_estimate, model_version = polygon_flight.do(
+            key,
+            lambda: agb_predictor.predict_with_version(centroid_lat, centroid_lng),
+            timeout=current_app.config.get('SINGLEFLIGHT_TIMEOUT', 10)
+        )
         
         # Calculate totals based on area
         area_hectares = data.get('area_hectares', 0)
@@ -507,6 +741,7 @@ def predict_polygon():
             'total_carbon': round(total_carbon, 2),
             'total_co2': round(total_co2, 2),
             'area_hectares': area_hectares,
+            'model_version': model_version,
             'units': 'Mg/ha'
         })
         
@@ -519,6 +754,108 @@ def predict_polygon():
             'error': str(e)
         }), 400
 
+@agb_bp.route('/admin/models', methods=['GET'])
+@login_required
+@two_factor_verified
+@role_required('admin')
+def admin_models():
+    """Model versions per registry key: listed, selected, pinned and resident,
+    with the CSRF token the model and shadow admin actions require"""
+    try:
+        from ml.services.agb_predictor import agb_predictor
+        return jsonify({
+            'success': True,
+            'models': agb_predictor.registry.status(),
+            'csrf_token': generate_csrf()
+        })
+
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@agb_bp.route('/admin/models/<path:key>/<action>', methods=['POST'])
+@login_required
+@two_factor_verified
+@role_required('admin')
+@csrf_required
+def admin_model_action(key, action):
+    """Pin a model key to a version, unpin it, or roll back to the previous version.
+
+    Pins are written next to the manifest, so every worker picks them up on
+    its next manifest poll; this worker swaps immediately.
+    """
+    try:
+        from ml.services.agb_predictor import agb_predictor
+        registry = agb_predictor.registry
+
+        if action == 'pin':
+            version = (request.get_json(silent=True) or {}).get('version')
+            if not version:
+                return jsonify({'success': False, 'error': 'version is required'}), 400
+            swapped = registry.pin(key, version)
+        elif action == 'unpin':
+            swapped = registry.unpin(key)
+        elif action == 'rollback':
+            swapped = registry.rollback(key)
+        else:
+            return jsonify({'success': False, 'error': f'Unknown action: {action}'}), 404
+
+        print(f"Admin {session.get('user_id')} {action} model '{key}'")
+        return jsonify({
+            'success': True,
+            'swapped': [{'key': k, 'from': old, 'to': new} for k, old, new in swapped],
+            'models': registry.status()
+        })
+
+    except KeyError as e:
+        return jsonify({
+            'success': False,
+            'error': e.args[0]
+        }), 404
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@agb_bp.route('/admin/shadow', methods=['GET', 'DELETE'])
+@login_required
+@two_factor_verified
+@role_required('admin')
+@csrf_required
+def admin_shadow_report():
+    """Candidate vs production deltas from shadow scoring; DELETE resets them"""
+    try:
+        from ml.services.agb_predictor import agb_predictor
+        if request.method == 'DELETE':
+            agb_predictor.shadow.reset()
+        return jsonify({
+            'success': True,
+            'shadow': agb_predictor.shadow.report()
+        })
+
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@agb_bp.route('/admin/metrics', methods=['GET'])
+@login_required
+@two_factor_verified
+@role_required('admin')
+def admin_prediction_metrics():
+    """Request coalescing and admission queue counters of the prediction endpoints"""
+    from utils.admission import get_admission
+    _, queue = get_admission(current_app)
+    return jsonify({
+        'success': True,
+        'singleflight': [prediction_flight.metrics(), polygon_flight.metrics()],
+        'queue': queue.stats()
+    })
+
 @agb_bp.route('/estimate', methods=['GET'])
 @login_required
 @two_factor_verified
@@ -536,11 +873,11 @@ def analytics_dashboard():
 @agb_bp.route('/api/analytics/project-stats', methods=['GET'])
 @login_required
 @two_factor_verified
-def get_project_stats():
+async def get_project_stats():
     """API endpoint for project statistics"""
     try:
         user_id = session.get('user_id')
-        projects = Project.get_by_user(user_id)
+        projects = await Project.get_by_user_async(user_id)
         
         # Calculate statistics
         total_projects = len(projects)
@@ -579,6 +916,78 @@ def get_project_stats():
         }), 500
     
 
+def _run_co2e_simulation(projects):
+    """Monte Carlo CO2e intervals for projects, driven by query parameters"""
+    from ml.services.carbon_montecarlo import (
+        DEFAULT_AGB_RELATIVE_SD, DEFAULT_AREA_RELATIVE_SD, simulate_projects
+    )
+    max_draws = current_app.config.get('MONTE_CARLO_MAX_DRAWS', 100000)
+    draws = min(request.args.get('draws', 10000, type=int), max_draws)
+    if draws < 100:
+        raise ValueError('draws must be at least 100')
+
+    return simulate_projects(
+        projects,
+        draws=draws,
+        agb_relative_sd=request.args.get('agb_sd', DEFAULT_AGB_RELATIVE_SD, type=float),
+        area_relative_sd=request.args.get('area_sd', DEFAULT_AREA_RELATIVE_SD, type=float),
+        memory_limit=current_app.config.get('MONTE_CARLO_MEMORY_MB', 64) * 1024 * 1024,
+        workers=current_app.config.get('MONTE_CARLO_WORKERS', 2),
+        seed=request.args.get('seed', type=int),
+    )
+
+@agb_bp.route('/api/analytics/co2-uncertainty', methods=['GET'])
+@login_required
+@two_factor_verified
+def get_portfolio_co2_uncertainty():
+    """Credible interval of total CO2e across all of the user's projects"""
+    try:
+        projects = Project.get_by_user(session.get('user_id'))
+        return jsonify({
+            'success': True,
+            'co2e': _run_co2e_simulation(projects),
+            'units': 'Mg CO2e'
+        })
+
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@agb_bp.route('/project/<int:project_id>/co2-uncertainty', methods=['GET'])
+@login_required
+@two_factor_verified
+def get_project_co2_uncertainty(project_id):
+    """Credible interval of total CO2e for one project"""
+    try:
+        project = Project.get_owned(project_id, session.get('user_id'))
+        if not project:
+            return _project_not_owned(project_id)
+
+        return jsonify({
+            'success': True,
+            'project_id': project_id,
+            'co2e': _run_co2e_simulation([project]),
+            'units': 'Mg CO2e'
+        })
+
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
 @agb_bp.route('/api/analytics/carbon-timeline', methods=['GET'])
 @login_required
 @two_factor_verified
@@ -687,7 +1096,7 @@ def generate_json_report():
         }
         
         from flask import make_response
-        response = make_response(json.dumps(report_data, indent=2))
+        response = make_response(current_app.json.dumps(report_data))
         response.headers['Content-Disposition'] = 'attachment; filename=carbon-projects-export.json'
         response.headers['Content-type'] = 'application/json'
         return response
@@ -1,10 +1,13 @@
-from flask import Blueprint, render_template, redirect, url_for, flash, session, request
+from flask import Blueprint, render_template, redirect, url_for, flash, session, request, current_app
 from forms.auth_forms import (RegistrationForm, LoginForm, PasswordResetRequestForm,
                                PasswordResetForm, TwoFactorForm)
 from models.user import User, UserToken
 from utils.email_service import (send_password_reset_email, send_2fa_code_email,
                                   send_welcome_email, generate_2fa_code)
 from utils.decorators import logout_required, login_required
+from utils.current_user import get_current_user, forget_current_user
+from utils.password_hasher import PasswordHasherBusy
+from utils.session_store import revoke_user_sessions
 
 auth_bp = Blueprint('auth', __name__)
 
@@ -22,7 +25,8 @@ def register():
                 first_name=form.first_name.data,
                 last_name=form.last_name.data,
                 organization=form.organization.data,
-                phone_number=form.phone_number.data if form.phone_number.data else None
+                phone_number=form.phone_number.data if form.phone_number.data else None,
+                client_ip=request.remote_addr
             )
 
             if user:
@@ -32,6 +36,9 @@ def register():
             else:
                 flash('Registration failed. Please try again.', 'danger')
 
+        except PasswordHasherBusy:
+            flash('Too many requests right now. Please wait a moment and try again.', 'warning')
+            return render_template('auth/register.html', form=form), 429
         except Exception as e:
             flash(f'An error occurred during registration: {str(e)}', 'danger')
 
@@ -46,7 +53,10 @@ def login():
         try:
             user = User.get_by_email(form.email.data)
 
-            if user and User.verify_password(form.password.data, user.password_hash):
+            if user and User.verify_password(form.password.data, user.password_hash,
+                                             client_ip=request.remote_addr):
+                user.rehash_password_if_needed(form.password.data, client_ip=request.remote_addr)
+
                 if user.two_factor_enabled:
                     code = generate_2fa_code()
                     token = UserToken.create_token(user.id, 'two_factor', expiry_minutes=10)
@@ -72,6 +82,9 @@ def login():
             else:
                 flash('Invalid email or password.', 'danger')
 
+        except PasswordHasherBusy:
+            flash('Too many login attempts right now. Please wait a moment and try again.', 'warning')
+            return render_template('auth/login.html', form=form), 429
         except Exception as e:
             flash(f'An error occurred during login: {str(e)}', 'danger')
 
@@ -115,6 +128,7 @@ def verify_2fa():
 @auth_bp.route('/logout')
 @login_required
 def logout():
+    forget_current_user()
     session.clear()
     flash('You have been logged out successfully.', 'success')
     return redirect(url_for('public.index'))
@@ -147,24 +161,25 @@ def reset_password(token):
     form = PasswordResetForm()
 
     try:
+        # Checked without consuming it; the token is only used up together
+        # with the password change itself
         user_id = UserToken.verify_token(token, 'password_reset')
+        if user_id and form.validate_on_submit():
+            user_id = User.reset_password(token, form.password.data, client_ip=request.remote_addr)
+            if user_id:
+                revoke_user_sessions(current_app, user_id)
+                flash('Your password has been reset successfully. You can now log in.', 'success')
+                return redirect(url_for('auth.login'))
 
         if not user_id:
             flash('Invalid or expired reset link.', 'danger')
             return redirect(url_for('auth.reset_password_request'))
 
-        if form.validate_on_submit():
-            user = User.get_by_id(user_id)
-
-            if user:
-                user.update_password(form.password.data)
-                UserToken.mark_as_used(token)
-                flash('Your password has been reset successfully. You can now log in.', 'success')
-                return redirect(url_for('auth.login'))
-
+    except PasswordHasherBusy:
+        flash('Too many requests right now. Please wait a moment and try again.', 'warning')
+        return render_template('auth/reset_password.html', form=form, token=token), 429
     except Exception as e:
         flash(f'An error occurred: {str(e)}', 'danger')
-        return redirect(url_for('auth.reset_password_request'))
 
     return render_template('auth/reset_password.html', form=form, token=token)
 
@@ -172,7 +187,7 @@ def reset_password(token):
 @login_required
 def enable_2fa():
     try:
-        user = User.get_by_id(session['user_id'])
+        user = get_current_user()
         if user:
             user.enable_two_factor()
             flash('Two-factor authentication has been enabled.', 'success')
@@ -185,7 +200,7 @@ def enable_2fa():
 @login_required
 def disable_2fa():
     try:
-        user = User.get_by_id(session['user_id'])
+        user = get_current_user()
         if user:
             user.disable_two_factor()
             flash('Two-factor authentication has been disabled.', 'success')
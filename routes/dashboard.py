@@ -1,24 +1,38 @@
-from flask import Blueprint, render_template, session, redirect, url_for, jsonify
+import asyncio
+from flask import Blueprint, render_template, session, redirect, url_for, jsonify, request, current_app
 from utils.decorators import login_required, two_factor_verified, role_required
 from models.user import User
 from models.project import Project
+from utils.current_user import get_current_user, get_current_user_async
+from utils.compression import wants_delta_coordinates
+from utils.geometry import requested_zoom
+from utils.query_registry import query_stats
 
 dashboard_bp = Blueprint('dashboard', __name__)
 
+USER_DIRECTORY_PAGE_SIZE = 50
+USER_DIRECTORY_MAX_PAGE_SIZE = 200
+USER_DIRECTORY_MAX_SEARCH_LENGTH = 100
+
+OVERLAPS_PAGE_SIZE = 50
+OVERLAPS_MAX_PAGE_SIZE = 500
+
 @dashboard_bp.route('/project-developer')
 @login_required
 @two_factor_verified
-def project_developer():
+async def project_developer():
     """Project Developer Dashboard"""
     user_id = session.get('user_id')
-    user = User.get_by_id(user_id)
+
+    # User and project statistics for initial page load, queried concurrently
+    user, stats = await asyncio.gather(
+        get_current_user_async(),
+        Project.get_user_stats_async(user_id),
+    )
     
     if not user:
         return redirect(url_for('auth.login'))
     
-    # Get project statistics for initial page load
-    stats = Project.get_user_stats(user_id)
-    
     return render_template(
         'dashboard/project_developer.html',
         user=user,
@@ -31,7 +45,7 @@ def project_developer():
 def farmer():
     """Farmer Dashboard"""
     user_id = session.get('user_id')
-    user = User.get_by_id(user_id)
+    user = get_current_user()
     
     if not user:
         return redirect(url_for('auth.login'))
@@ -44,7 +58,7 @@ def farmer():
 def verifier():
     """Verifier Dashboard"""
     user_id = session.get('user_id')
-    user = User.get_by_id(user_id)
+    user = get_current_user()
     
     if not user:
         return redirect(url_for('auth.login'))
@@ -55,7 +69,7 @@ def verifier():
 @login_required
 @two_factor_verified
 def index():
-    user = User.get_by_id(session['user_id'])
+    user = get_current_user()
 
     dashboard_data = {
         'user': user,
@@ -72,8 +86,8 @@ def index():
         dashboard_data['stats'] = stats
         return render_template('dashboard/project_developer.html', **dashboard_data)
     elif user.role == 'admin':
-        users = User.get_all_users()
-        dashboard_data['users'] = users
+        dashboard_data['role_counts'] = User.count_by_role()
+        dashboard_data['directory'] = User.search_directory(limit=USER_DIRECTORY_PAGE_SIZE)
         return render_template('dashboard/admin.html', **dashboard_data)
 
     return render_template('dashboard/base.html', **dashboard_data)
@@ -82,7 +96,7 @@ def index():
 @login_required
 @two_factor_verified
 def profile():
-    user = User.get_by_id(session['user_id'])
+    user = get_current_user()
     return render_template('dashboard/profile.html', user=user)
 
 @dashboard_bp.route('/admin/users')
@@ -98,11 +112,11 @@ def admin_users():
 @dashboard_bp.route('/api/stats')
 @login_required
 @two_factor_verified
-def api_dashboard_stats():
+async def api_dashboard_stats():
     """API endpoint for dashboard statistics"""
     try:
         user_id = session.get('user_id')
-        stats = Project.get_user_stats(user_id)
+        stats = await Project.get_user_stats_async(user_id)
         
         return jsonify({
             'success': True,
@@ -119,15 +133,16 @@ def api_dashboard_stats():
 @dashboard_bp.route('/api/projects')
 @login_required
 @two_factor_verified
-def api_user_projects():
+async def api_user_projects():
     """API endpoint for user projects"""
     try:
         user_id = session.get('user_id')
-        projects = Project.get_by_user(user_id)
+        projects = await Project.get_by_user_async(user_id)
         
         return jsonify({
             'success': True,
-            'projects': [p.to_dict() for p in projects]
+            'projects': [p.to_dict(delta_coordinates=wants_delta_coordinates(), zoom=requested_zoom())
+                         for p in projects]
         })
         
     except Exception as e:
@@ -140,13 +155,13 @@ def api_user_projects():
 @dashboard_bp.route('/api/activity')
 @login_required
 @two_factor_verified
-def api_recent_activity():
+async def api_recent_activity():
     """API endpoint for recent activity"""
     try:
         user_id = session.get('user_id')
         
         # For now, create mock activity based on projects
-        projects = Project.get_by_user(user_id)
+        projects = await Project.get_by_user_async(user_id)
         activities = []
         
         for project in projects[:5]:  # Last 5 projects as activity
@@ -168,4 +183,130 @@ def api_recent_activity():
         return jsonify({
             'success': False,
             'error': str(e)
-        }), 500
\ No newline at end of file
+        }), 500
+
+def _parse_bool(value):
+    if value is None or value == '':
+        return None
+    if value.lower() in ('true', '1', 'yes'):
+        return True
+    if value.lower() in ('false', '0', 'no'):
+        return False
+    raise ValueError(f"Invalid boolean: {value}")
+
+def _directory_user(row):
+    return {
+        **row,
+        'id': str(row['id']),
+        'created_at': row['created_at'].isoformat() if row['created_at'] else None,
+        'last_login': row['last_login'].isoformat() if row['last_login'] else None
+    }
+
+@dashboard_bp.route('/api/admin/users')
+@login_required
+@two_factor_verified
+@role_required('admin')
+async def api_admin_users():
+    """Paginated user directory for admins.
+
+    Query parameters: `role`, `organization`, `email_verified` (true/false),
+    `q` (email or name search), `limit` and `cursor` (the `next_cursor` of
+    the previous page).
+    """
+    try:
+        limit = min(max(int(request.args.get('limit', USER_DIRECTORY_PAGE_SIZE)), 1),
+                    USER_DIRECTORY_MAX_PAGE_SIZE)
+        email_verified = _parse_bool(request.args.get('email_verified'))
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+    search = request.args.get('q', '').strip()
+    if len(search) > USER_DIRECTORY_MAX_SEARCH_LENGTH:
+        return jsonify({'success': False, 'error': 'Search term is too long'}), 400
+
+    try:
+        page = await User.search_directory_async(
+            role=request.args.get('role') or None,
+            organization=request.args.get('organization') or None,
+            email_verified=email_verified,
+            search=search or None,
+            cursor=request.args.get('cursor') or None,
+            limit=limit
+        )
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        print(f"Error fetching user directory: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+    return jsonify({
+        'success': True,
+        'users': [_directory_user(row) for row in page['users']],
+        'next_cursor': page['next_cursor']
+    })
+
+def _overlap(row):
+    return {
+        'project_id': row['project_id'],
+        'project_name': row['project_name'],
+        'user_id': str(row['user_id']) if row['user_id'] else None,
+        'other_project_id': row['other_project_id'],
+        'other_project_name': row['other_project_name'],
+        'other_user_id': str(row['other_user_id']) if row['other_user_id'] else None,
+        'same_owner': row['user_id'] == row['other_user_id'],
+        'overlap_hectares': row['overlap_hectares'],
+        'project_fraction': row['project_fraction'],
+        'other_fraction': row['other_fraction'],
+        'detected_at': row['detected_at'].isoformat() if row['detected_at'] else None
+    }
+
+@dashboard_bp.route('/api/admin/overlaps')
+@login_required
+@two_factor_verified
+@role_required('admin')
+async def api_project_overlaps():
+    """Projects whose boundaries overlap, largest overlap first (admins only;
+    users.valid_role has no verifier role).
+
+    Query parameters: `project_id` (only the overlaps of that project),
+    `min_hectares` and `limit`.
+    """
+    try:
+        project_id = request.args.get('project_id', type=int)
+        min_hectares = float(request.args.get('min_hectares', 0))
+        limit = min(max(int(request.args.get('limit', OVERLAPS_PAGE_SIZE)), 1), OVERLAPS_MAX_PAGE_SIZE)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+    try:
+        rows = await Project.get_overlaps_async(project_id=project_id, min_hectares=min_hectares, limit=limit)
+    except Exception as e:
+        print(f"Error fetching project overlaps: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+    return jsonify({
+        'success': True,
+        'overlaps': [_overlap(row) for row in rows]
+    })
+
+@dashboard_bp.route('/api/admin/query-stats', methods=['GET', 'DELETE'])
+@login_required
+@two_factor_verified
+@role_required('admin')
+def api_query_stats():
+    """Per-query call counts, timings and last slow-query plans of this worker,
+    plus the health of any read replicas"""
+    if request.method == 'DELETE':
+        query_stats.reset()
+    router = current_app.extensions.get('db_replicas')
+    return jsonify({
+        'success': True,
+        'queries': query_stats.snapshot(),
+        'replicas': router.status() if router is not None else []
+    })
@@ -0,0 +1,336 @@
+# Script to Seed a Large Synthetic Portfolio for Capacity Planning
+
+import argparse
+import csv
+import io
+import os
+import time
+
+import bcrypt
+import numpy as np
+import psycopg2
+from dotenv import load_dotenv
+
+load_dotenv()
+
+EARTH_METERS_PER_DEGREE = 111320.0
+
+FIRST_NAMES = np.array([
+    'Amina', 'Brian', 'Caroline', 'David', 'Esther', 'Faith', 'George', 'Grace',
+    'Hassan', 'Irene', 'James', 'Joyce', 'Kevin', 'Lucy', 'Mary', 'Moses',
+    'Njeri', 'Otieno', 'Peter', 'Rose', 'Samuel', 'Wanjiku', 'Yusuf', 'Zawadi'
+])
+LAST_NAMES = np.array([
+    'Achieng', 'Baraka', 'Chebet', 'Kamau', 'Kariuki', 'Kibet', 'Korir', 'Mutua',
+    'Mwangi', 'Njoroge', 'Ochieng', 'Odhiambo', 'Omondi', 'Onyango', 'Wafula', 'Wambui'
+])
+ORGANIZATIONS = np.array([
+    'Kenya Forestry Research Institute', 'University of Nairobi', 'Green Belt Cooperative',
+    'Rift Valley Agroforestry Group', 'Lake Region Farmers Union', 'SHCAP Partners'
+])
+
+ROLES = np.array(['researcher', 'project_developer', 'admin'])
+ROLE_WEIGHTS = np.array([0.30, 0.68, 0.02])
+
+PROJECT_TYPES = np.array(['agroforestry', 'reforestation', 'afforestation', 'forest_conservation'])
+PROJECT_TYPE_WEIGHTS = np.array([0.55, 0.20, 0.15, 0.10])
+
+STATUSES = np.array(['draft', 'in_progress', 'completed'])
+STATUS_WEIGHTS = np.array([0.25, 0.55, 0.20])
+
+# (country, region, centre latitude, centre longitude, spread in degrees, weight)
+REGIONS = [
+    ('Kenya', 'Central', -0.42, 36.95, 0.6, 0.25),
+    ('Kenya', 'Rift Valley', 0.52, 35.27, 0.9, 0.20),
+    ('Kenya', 'Western', 0.28, 34.75, 0.5, 0.15),
+    ('Kenya', 'Coast', -3.22, 39.85, 0.7, 0.10),
+    ('Uganda', 'Central', 0.35, 32.58, 0.8, 0.12),
+    ('Tanzania', 'Kilimanjaro', -3.35, 37.34, 0.6, 0.10),
+    ('Rwanda', 'Northern', -1.58, 29.85, 0.3, 0.08),
+]
+
+MAX_VERTICES = 12
+
+USER_COLUMNS = (
+    'id', 'email', 'password_hash', 'role', 'first_name', 'last_name',
+    'organization', 'email_verified', 'two_factor_enabled', 'created_at'
+)
+PROJECT_COLUMNS = (
+    'user_id', 'project_name', 'project_type', 'country', 'region', 'description',
+    'area_hectares', 'boundary_coordinates', 'estimated_agb', 'estimated_carbon',
+    'estimated_co2', 'status', 'created_at', 'updated_at'
+)
+
+
+def generate_uuid_bytes(rng, count):
+    """Generate random version-4 UUIDs as an (count, 16) uint8 array"""
+    raw = rng.integers(0, 256, size=(count, 16), dtype=np.uint8)
+    raw[:, 6] = (raw[:, 6] & 0x0F) | 0x40
+    raw[:, 8] = (raw[:, 8] & 0x3F) | 0x80
+    return raw
+
+
+def format_uuids(raw):
+    """Format rows of UUID bytes as canonical strings"""
+    hex_rows = raw.tobytes().hex()
+    ids = []
+    for i in range(raw.shape[0]):
+        h = hex_rows[i * 32:(i + 1) * 32]
+        ids.append(f"{h[:8]}-{h[8:12]}-{h[12:16]}-{h[16:20]}-{h[20:]}")
+    return ids
+
+
+def random_timestamps(rng, count, days_back):
+    """Random timestamps spread over the last `days_back` days"""
+    now = np.datetime64('now', 's')
+    offsets = rng.integers(0, days_back * 86400, size=count).astype('timedelta64[s]')
+    return (now - offsets).astype(str)
+
+
+def generate_users(rng, start, count, email_pattern):
+    """Generate a chunk of users as column arrays"""
+    roles = rng.choice(ROLES, size=count, p=ROLE_WEIGHTS)
+    return {
+        'uuid_bytes': generate_uuid_bytes(rng, count),
+        'email': [email_pattern.format(i=i) for i in range(start, start + count)],
+        'role': roles,
+        'first_name': rng.choice(FIRST_NAMES, size=count),
+        'last_name': rng.choice(LAST_NAMES, size=count),
+        'organization': rng.choice(ORGANIZATIONS, size=count),
+        'email_verified': rng.random(count) < 0.9,
+        'created_at': random_timestamps(rng, count, 730),
+    }
+
+
+def generate_polygons(rng, latitudes, longitudes, areas_ha):
+    """Generate star-shaped farm boundaries around each centroid.
+
+    Vertices are placed at sorted random angles with jittered radii so every
+    polygon is simple. Returns vertex arrays padded to MAX_VERTICES, the vertex
+    count per polygon and the true polygon area in hectares.
+    """
+    count = latitudes.shape[0]
+    vertex_counts = rng.integers(5, MAX_VERTICES + 1, size=count)
+    slots = np.arange(MAX_VERTICES)
+    valid = slots[None, :] < vertex_counts[:, None]
+
+    # Unused slots sort to the end so the first k angles of each row are valid
+    angles = rng.uniform(0, 2 * np.pi, size=(count, MAX_VERTICES))
+    angles = np.sort(np.where(valid, angles, np.inf), axis=1)
+    angles = np.where(valid, angles, 0.0)
+
+    base_radius = np.sqrt(areas_ha * 10000.0 / np.pi)
+    radii = base_radius[:, None] * rng.uniform(0.7, 1.3, size=(count, MAX_VERTICES))
+    radii = np.where(valid, radii, 0.0)
+
+    # Polar shoelace: area = 1/2 * sum r_i * r_{i+1} * sin(theta_{i+1} - theta_i)
+    next_slot = np.where(slots[None, :] + 1 < vertex_counts[:, None], slots[None, :] + 1, 0)
+    next_radii = np.take_along_axis(radii, next_slot, axis=1)
+    next_angles = np.take_along_axis(angles, next_slot, axis=1)
+    sweep = np.mod(next_angles - angles, 2 * np.pi)
+    true_area_m2 = 0.5 * np.sum(np.where(valid, radii * next_radii * np.sin(sweep), 0.0), axis=1)
+
+    lat_offsets = radii * np.sin(angles) / EARTH_METERS_PER_DEGREE
+    lng_offsets = radii * np.cos(angles) / (EARTH_METERS_PER_DEGREE * np.cos(np.radians(latitudes))[:, None])
+
+    vertex_lats = latitudes[:, None] + lat_offsets
+    vertex_lngs = longitudes[:, None] + lng_offsets
+
+    return vertex_lats, vertex_lngs, vertex_counts, true_area_m2 / 10000.0
+
+
+def generate_projects(rng, count):
+    """Generate a chunk of projects as column arrays"""
+    region_weights = np.array([r[5] for r in REGIONS])
+    region_idx = rng.choice(len(REGIONS), size=count, p=region_weights / region_weights.sum())
+    centre_lat = np.array([r[2] for r in REGIONS])[region_idx]
+    centre_lng = np.array([r[3] for r in REGIONS])[region_idx]
+    spread = np.array([r[4] for r in REGIONS])[region_idx]
+
+    latitudes = centre_lat + rng.normal(0, 1, size=count) * spread / 2
+    longitudes = centre_lng + rng.normal(0, 1, size=count) * spread / 2
+
+    # Smallholder farms: median around 2 ha with a long tail of larger projects
+    target_areas = np.clip(rng.lognormal(mean=np.log(2.0), sigma=1.1, size=count), 0.1, 500.0)
+    vertex_lats, vertex_lngs, vertex_counts, areas = generate_polygons(rng, latitudes, longitudes, target_areas)
+
+    statuses = rng.choice(STATUSES, size=count, p=STATUS_WEIGHTS)
+    agb = np.clip(rng.lognormal(mean=np.log(40.0), sigma=0.6, size=count), 2.0, 135.0)
+    carbon = agb * 0.47
+    co2 = carbon * 3.67
+    has_estimates = statuses != 'draft'
+
+    created_at = random_timestamps(rng, count, 540)
+
+    return {
+        'project_type': rng.choice(PROJECT_TYPES, size=count, p=PROJECT_TYPE_WEIGHTS),
+        'country': np.array([r[0] for r in REGIONS])[region_idx],
+        'region': np.array([r[1] for r in REGIONS])[region_idx],
+        'area_hectares': np.round(areas, 2),
+        'vertex_lats': np.round(vertex_lats, 6),
+        'vertex_lngs': np.round(vertex_lngs, 6),
+        'vertex_counts': vertex_counts,
+        'estimated_agb': np.where(has_estimates, np.round(agb, 2), np.nan),
+        'estimated_carbon': np.where(has_estimates, np.round(carbon, 2), np.nan),
+        'estimated_co2': np.where(has_estimates, np.round(co2, 2), np.nan),
+        'status': statuses,
+        'created_at': created_at,
+    }
+
+
+def boundary_json(lats, lngs, k):
+    """Serialise one boundary in the same {lat, lng} shape the frontend posts"""
+    return '[' + ','.join(f'{{"lat": {lats[j]}, "lng": {lngs[j]}}}' for j in range(k)) + ']'
+
+
+def nullable(value):
+    return None if np.isnan(value) else value
+
+
+def write_users_csv(buffer, users, password_hash):
+    writer = csv.writer(buffer)
+    ids = format_uuids(users['uuid_bytes'])
+    for i in range(len(ids)):
+        writer.writerow((
+            ids[i], users['email'][i], password_hash, users['role'][i],
+            users['first_name'][i], users['last_name'][i], users['organization'][i],
+            't' if users['email_verified'][i] else 'f', 'f', users['created_at'][i]
+        ))
+
+
+def write_projects_csv(buffer, projects, owner_ids, start):
+    writer = csv.writer(buffer)
+    for i in range(len(owner_ids)):
+        writer.writerow((
+            owner_ids[i],
+            f"Load Test Project {start + i}",
+            projects['project_type'][i],
+            projects['country'][i],
+            projects['region'][i],
+            'Synthetic project generated for capacity planning',
+            projects['area_hectares'][i],
+            boundary_json(projects['vertex_lats'][i], projects['vertex_lngs'][i], projects['vertex_counts'][i]),
+            nullable(projects['estimated_agb'][i]),
+            nullable(projects['estimated_carbon'][i]),
+            nullable(projects['estimated_co2'][i]),
+            projects['status'][i],
+            projects['created_at'][i],
+            projects['created_at'][i],
+        ))
+
+
+class CopySink:
+    """Stream CSV chunks into Postgres with COPY, or into files for a dry run"""
+
+    def __init__(self, database_url=None, output_dir=None):
+        self.output_dir = output_dir
+        self.conn = None
+        if output_dir:
+            os.makedirs(output_dir, exist_ok=True)
+        else:
+            self.conn = psycopg2.connect(database_url)
+
+    def copy(self, table, columns, buffer):
+        buffer.seek(0)
+        if self.output_dir:
+            with open(os.path.join(self.output_dir, f'{table}.csv'), 'a', newline='') as f:
+                f.write(buffer.getvalue())
+            return
+
+        with self.conn.cursor() as cursor:
+            cursor.copy_expert(
+                f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)",
+                buffer
+            )
+        self.conn.commit()
+
+    def close(self):
+        if self.conn:
+            self.conn.close()
+
+
+def seed(user_count, project_count, chunk_size, email_pattern, password, seed_value,
+         database_url=None, output_dir=None):
+    """Bulk-generate users and projects and load them chunk by chunk"""
+    rng = np.random.default_rng(seed_value)
+
+    # One bcrypt hash shared by all synthetic users keeps generation fast while
+    # login still pays the real verification cost
+    password_hash = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+
+    sink = CopySink(database_url=database_url, output_dir=output_dir)
+    owner_uuid_bytes = []
+
+    try:
+        started = time.time()
+        for start in range(0, user_count, chunk_size):
+            count = min(chunk_size, user_count - start)
+            users = generate_users(rng, start, count, email_pattern)
+            owner_uuid_bytes.append(users['uuid_bytes'][users['role'] == 'project_developer'])
+
+            buffer = io.StringIO()
+            write_users_csv(buffer, users, password_hash)
+            sink.copy('users', USER_COLUMNS, buffer)
+            print(f" Users: {start + count}/{user_count} ({time.time() - started:.1f}s)")
+
+        owners = np.concatenate(owner_uuid_bytes) if owner_uuid_bytes else np.empty((0, 16), dtype=np.uint8)
+        if owners.shape[0] == 0:
+            print("No project developers generated - skipping projects")
+            return
+
+        # Most developers own a handful of projects; a Zipf-distributed share goes
+        # to a few large portfolio holders picked at random
+        owner_ranking = rng.permutation(owners.shape[0])
+
+        started = time.time()
+        for start in range(0, project_count, chunk_size):
+            count = min(chunk_size, project_count - start)
+            heavy = rng.random(count) < 0.2
+            zipf_rank = np.minimum(rng.zipf(1.5, size=count) - 1, owners.shape[0] - 1)
+            owner_indices = np.where(
+                heavy,
+                owner_ranking[zipf_rank],
+                rng.integers(0, owners.shape[0], size=count)
+            )
+            projects = generate_projects(rng, count)
+
+            buffer = io.StringIO()
+            write_projects_csv(buffer, projects, format_uuids(owners[owner_indices]), start)
+            sink.copy('projects', PROJECT_COLUMNS, buffer)
+            print(f" Projects: {start + count}/{project_count} ({time.time() - started:.1f}s)")
+    finally:
+        sink.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Seed SHCAP with a large synthetic portfolio')
+    parser.add_argument('--users', type=int, default=100000, help='Number of users to create')
+    parser.add_argument('--projects', type=int, default=1000000, help='Number of projects to create')
+    parser.add_argument('--chunk-size', type=int, default=50000, help='Rows generated and copied per batch')
+    parser.add_argument('--email-pattern', default='loadtest+{i}@example.org',
+                        help='Email template; {i} is replaced with the user index')
+    parser.add_argument('--password', default='LoadTest123!', help='Password shared by all synthetic users')
+    parser.add_argument('--seed', type=int, default=42, help='Random seed for reproducible data')
+    parser.add_argument('--output-dir', help='Write CSV files here instead of loading into the database')
+    args = parser.parse_args()
+
+    database_url = os.getenv('DATABASE_URL')
+    if not args.output_dir and not database_url:
+        print("❌ DATABASE_URL not found in environment variables")
+        return
+
+    seed(
+        user_count=args.users,
+        project_count=args.projects,
+        chunk_size=args.chunk_size,
+        email_pattern=args.email_pattern,
+        password=args.password,
+        seed_value=args.seed,
+        database_url=database_url,
+        output_dir=args.output_dir,
+    )
+    print("✅ Synthetic portfolio seeded successfully!")
+
+
+if __name__ == "__main__":
+    main()
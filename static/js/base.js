@@ -0,0 +1,179 @@
+document.addEventListener('DOMContentLoaded', function() {
+    const themeToggle = document.getElementById('themeToggle');
+    const themeToggleMobile = document.getElementById('themeToggleMobile');
+    const mobileSidebarToggle = document.getElementById('mobileSidebarToggle');
+    const sidebarToggleDesktop = document.getElementById('sidebarToggleDesktop');
+    const sidebar = document.getElementById('sidebar');
+    const mainContent = document.getElementById('mainContent');
+    const mobileOverlay = document.getElementById('mobileOverlay');
+    const htmlElement = document.documentElement;
+
+    // Theme Management
+    const currentTheme = localStorage.getItem('theme') || 'light';
+    htmlElement.setAttribute('data-theme', currentTheme);
+    updateThemeIcon(currentTheme);
+
+    function setupThemeToggle(button) {
+        if (button) {
+            button.addEventListener('click', function() {
+                const theme = htmlElement.getAttribute('data-theme') === 'light' ? 'dark' : 'light';
+                htmlElement.setAttribute('data-theme', theme);
+                localStorage.setItem('theme', theme);
+                updateThemeIcon(theme);
+            });
+        }
+    }
+
+    setupThemeToggle(themeToggle);
+    setupThemeToggle(themeToggleMobile);
+
+    function updateThemeIcon(theme) {
+        const icons = document.querySelectorAll('.theme-toggle i');
+        icons.forEach(icon => {
+            if (theme === 'dark') {
+                icon.className = 'bi bi-sun-fill';
+            } else {
+                icon.className = 'bi bi-moon-stars';
+            }
+        });
+    }
+
+    // FIXED: Sidebar Minimization with proper state management
+    if (sidebarToggleDesktop && sidebar && mainContent) {
+        const isMinimized = localStorage.getItem('sidebarMinimized') === 'true';
+
+        if (isMinimized) {
+            sidebar.classList.add('minimized');
+            mainContent.classList.add('sidebar-minimized');
+        }
+
+        sidebarToggleDesktop.addEventListener('click', function(e) {
+            e.preventDefault();
+            e.stopPropagation();
+            sidebar.classList.toggle('minimized');
+            mainContent.classList.toggle('sidebar-minimized');
+
+            const isNowMinimized = sidebar.classList.contains('minimized');
+            localStorage.setItem('sidebarMinimized', isNowMinimized);
+        });
+    }
+
+    // FIXED: Mobile Sidebar Toggle with overlay
+    if (mobileSidebarToggle && sidebar && mobileOverlay) {
+        mobileSidebarToggle.addEventListener('click', function(e) {
+            e.preventDefault();
+            e.stopPropagation();
+            sidebar.classList.add('mobile-open');
+            mobileOverlay.classList.add('active');
+            document.body.style.overflow = 'hidden';
+        });
+
+        // Close sidebar when clicking overlay
+        mobileOverlay.addEventListener('click', function() {
+            sidebar.classList.remove('mobile-open');
+            mobileOverlay.classList.remove('active');
+            document.body.style.overflow = '';
+        });
+    }
+
+    // FIXED: Better tooltip positioning for minimized sidebar
+    if (sidebar) {
+        const navLinks = sidebar.querySelectorAll('.nav-link');
+        navLinks.forEach(link => {
+            const tooltip = link.querySelector('.nav-tooltip');
+            if (tooltip) {
+                link.addEventListener('mouseenter', function() {
+                    if (sidebar.classList.contains('minimized')) {
+                        const rect = link.getBoundingClientRect();
+                        tooltip.style.left = (rect.right + 10) + 'px';
+                        tooltip.style.top = (rect.top + rect.height / 2) + 'px';
+                        tooltip.style.transform = 'translateY(-50%)';
+                    }
+                });
+            }
+        });
+    }
+
+    // Close mobile sidebar on window resize
+    window.addEventListener('resize', function() {
+        if (window.innerWidth > 768 && sidebar) {
+            sidebar.classList.remove('mobile-open');
+            if (mobileOverlay) {
+                mobileOverlay.classList.remove('active');
+            }
+            document.body.style.overflow = '';
+        }
+    });
+
+    // Auto-dismiss alerts after 5 seconds
+    const alerts = document.querySelectorAll('.alert:not(.alert-permanent)');
+    alerts.forEach(alert => {
+        setTimeout(() => {
+            const bsAlert = bootstrap.Alert.getOrCreateInstance(alert);
+            bsAlert.close();
+        }, 5000);
+    });
+
+    // Add loading state to forms
+    const forms = document.querySelectorAll('form[data-loading]');
+    forms.forEach(form => {
+        form.addEventListener('submit', function() {
+            const submitBtn = this.querySelector('[type="submit"]');
+            if (submitBtn) {
+                setLoadingState(submitBtn, true);
+            }
+        });
+    });
+
+    // Smooth scrolling for anchor links
+    document.querySelectorAll('a[href^="#"]').forEach(anchor => {
+        anchor.addEventListener('click', function (e) {
+            const href = this.getAttribute('href');
+            if (href !== '#') {
+                e.preventDefault();
+                const target = document.querySelector(href);
+                if (target) {
+                    target.scrollIntoView({
+                        behavior: 'smooth',
+                        block: 'start'
+                    });
+                }
+            }
+        });
+    });
+});
+
+// Utility function to show loading state
+function setLoadingState(button, isLoading) {
+    if (isLoading) {
+        button.dataset.originalText = button.innerHTML;
+        button.innerHTML = '<span class="loading-spinner me-2"></span> Loading...';
+        button.disabled = true;
+    } else {
+        button.innerHTML = button.dataset.originalText || button.innerHTML;
+        button.disabled = false;
+        delete button.dataset.originalText;
+    }
+}
+
+// Utility function for toast notifications (optional)
+function showToast(message, type = 'info') {
+    const alertDiv = document.createElement('div');
+    alertDiv.className = `alert alert-${type} alert-dismissible fade show`;
+    alertDiv.innerHTML = `
+        <div class="d-flex align-items-center">
+            <i class="bi bi-info-circle-fill me-2 fs-5"></i>
+            <span class="flex-grow-1">${message}</span>
+        </div>
+        <button type="button" class="btn-close" data-bs-dismiss="alert"></button>
+    `;
+
+    const contentBody = document.querySelector('.content-body');
+    if (contentBody) {
+        contentBody.insertBefore(alertDiv, contentBody.firstChild);
+        setTimeout(() => {
+            const bsAlert = bootstrap.Alert.getOrCreateInstance(alertDiv);
+            bsAlert.close();
+        }, 5000);
+    }
+}
@@ -0,0 +1,49 @@
+/*
+  # Email Outbox
+
+  ## Overview
+  Outgoing emails are written to `email_outbox` by the request that triggers
+  them and delivered by a background worker, so login and registration no
+  longer wait on SMTP round trips.
+
+  ## New Tables
+
+  ### `email_outbox` table
+  - `id` (bigserial, primary key) - Outbox entry identifier
+  - `to_email` (text) - Recipient address
+  - `subject` (text) - Message subject
+  - `html_body` (text) - Rendered HTML body
+  - `status` (text) - 'pending', 'sending', 'sent' or 'failed'
+  - `attempts` (integer) - Delivery attempts so far
+  - `next_attempt_at` (timestamptz) - Earliest time of the next attempt (retry backoff)
+  - `locked_at` (timestamptz, nullable) - When a worker claimed the row
+  - `last_error` (text, nullable) - Last delivery error
+  - `created_at` (timestamptz) - Enqueue time
+  - `sent_at` (timestamptz, nullable) - Delivery time
+
+  ## Indexes
+  - Partial index on due pending rows so the worker's claim query stays cheap
+    as sent rows accumulate
+*/
+
+CREATE TABLE IF NOT EXISTS email_outbox (
+  id bigserial PRIMARY KEY,
+  to_email text NOT NULL,
+  subject text NOT NULL,
+  html_body text NOT NULL,
+  status text NOT NULL DEFAULT 'pending',
+  attempts integer NOT NULL DEFAULT 0,
+  next_attempt_at timestamptz NOT NULL DEFAULT now(),
+  locked_at timestamptz,
+  last_error text,
+  created_at timestamptz DEFAULT now(),
+  sent_at timestamptz,
+  CONSTRAINT valid_outbox_status CHECK (status IN ('pending', 'sending', 'sent', 'failed'))
+);
+
+CREATE INDEX IF NOT EXISTS idx_email_outbox_due
+  ON email_outbox(next_attempt_at)
+  WHERE status IN ('pending', 'sending');
+
+-- Only the application's service connection reads or writes the outbox
+ALTER TABLE email_outbox ENABLE ROW LEVEL SECURITY;
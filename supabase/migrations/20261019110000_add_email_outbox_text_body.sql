@@ -0,0 +1,9 @@
+/*
+  # Plain-text alternative for outbox emails
+
+  Emails are rendered from templates as both HTML and plain text; the text
+  part is stored alongside the HTML body and sent as the first
+  multipart/alternative part.
+*/
+
+ALTER TABLE email_outbox ADD COLUMN IF NOT EXISTS text_body text;
@@ -0,0 +1,20 @@
+/*
+  # User token lookup and purge indexes
+
+  ## Indexes
+  - `idx_user_tokens_unused` - partial index on (token, token_type) for tokens
+    that have not been used yet. Token verification and the single-statement
+    consume (`UPDATE ... WHERE NOT used AND expires_at > now() RETURNING user_id`)
+    only ever look at unused tokens. The predicate cannot reference now()
+    because index predicates must be immutable, so expiry is checked on the
+    matching row.
+  - `idx_user_tokens_expires_at` - lets the background purge find expired
+    rows in small batches without scanning the table.
+*/
+
+CREATE INDEX IF NOT EXISTS idx_user_tokens_unused
+  ON user_tokens(token, token_type)
+  WHERE NOT used;
+
+CREATE INDEX IF NOT EXISTS idx_user_tokens_expires_at
+  ON user_tokens(expires_at);
@@ -0,0 +1,36 @@
+/*
+  # Server-side sessions
+
+  ## Overview
+  With `SESSION_BACKEND=postgres` the session cookie only carries a signed
+  session ID; the session data lives in `user_sessions`. Sessions can be
+  revoked by deleting their rows.
+
+  ## New Tables
+
+  ### `user_sessions` table
+  - `id` (text, primary key) - Random session identifier
+  - `user_id` (uuid, nullable) - Logged-in user, used to revoke all of a user's sessions
+  - `data` (text) - Serialized Flask session contents
+  - `created_at` (timestamptz) - Session creation time
+  - `last_accessed_at` (timestamptz) - Last request seen, written behind in batches
+  - `expires_at` (timestamptz) - Server-side expiry
+
+  ## Indexes
+  - `user_id` for per-user revocation
+  - `expires_at` for purging expired sessions
+*/
+
+CREATE TABLE IF NOT EXISTS user_sessions (
+  id text PRIMARY KEY,
+  user_id uuid REFERENCES users(id) ON DELETE CASCADE,
+  data text NOT NULL,
+  created_at timestamptz DEFAULT now(),
+  last_accessed_at timestamptz DEFAULT now(),
+  expires_at timestamptz NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_user_sessions_user_id ON user_sessions(user_id);
+CREATE INDEX IF NOT EXISTS idx_user_sessions_expires_at ON user_sessions(expires_at);
+
+ALTER TABLE user_sessions ENABLE ROW LEVEL SECURITY;
@@ -0,0 +1,54 @@
+/*
+  # Admin user directory indexes
+
+  ## Overview
+  The admin user directory pages through `users` newest first with a keyset
+  cursor on (created_at, id), optionally filtered by role, organization and
+  email verification and searched by email or name. These indexes keep every
+  page an index range scan however many users there are.
+
+  ## Extensions
+  - `pg_trgm` - trigram operator classes for substring search
+
+  ## Indexes
+  - `idx_users_created_at_id` - unfiltered keyset pagination
+  - `idx_users_role_created_at_id` - pagination within one role
+  - `idx_users_organization_created_at_id` - pagination within one organization
+  - `idx_users_unverified_created_at_id` - partial index for the (small)
+    set of users who have not verified their email yet
+  - `idx_users_email_prefix`, `idx_users_first_name_prefix`,
+    `idx_users_last_name_prefix` - case-insensitive prefix search
+    (`lower(col) LIKE 'abc%'`) for search terms shorter than a trigram
+  - `idx_users_email_trgm`, `idx_users_name_trgm` - case-insensitive
+    substring search (`LIKE '%abc%'`) for terms of three or more characters
+*/
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX IF NOT EXISTS idx_users_created_at_id
+  ON users(created_at DESC, id DESC);
+
+CREATE INDEX IF NOT EXISTS idx_users_role_created_at_id
+  ON users(role, created_at DESC, id DESC);
+
+CREATE INDEX IF NOT EXISTS idx_users_organization_created_at_id
+  ON users(organization, created_at DESC, id DESC);
+
+CREATE INDEX IF NOT EXISTS idx_users_unverified_created_at_id
+  ON users(created_at DESC, id DESC)
+  WHERE NOT email_verified;
+
+CREATE INDEX IF NOT EXISTS idx_users_email_prefix
+  ON users(lower(email) text_pattern_ops);
+
+CREATE INDEX IF NOT EXISTS idx_users_first_name_prefix
+  ON users(lower(first_name) text_pattern_ops);
+
+CREATE INDEX IF NOT EXISTS idx_users_last_name_prefix
+  ON users(lower(last_name) text_pattern_ops);
+
+CREATE INDEX IF NOT EXISTS idx_users_email_trgm
+  ON users USING gin (lower(email) gin_trgm_ops);
+
+CREATE INDEX IF NOT EXISTS idx_users_name_trgm
+  ON users USING gin ((lower(first_name || ' ' || last_name)) gin_trgm_ops);
@@ -0,0 +1,22 @@
+/*
+  # Multi-resolution project boundaries
+
+  ## Overview
+  Listing and map views draw project boundaries at every zoom level, but
+  far fewer vertices are visible when zoomed out. Boundaries are now
+  validated and repaired when a project is created and stored alongside
+  Douglas-Peucker simplified versions, so views can ask for the
+  resolution that suits their zoom.
+
+  ## Modified Tables
+
+  ### `projects` table
+  - `boundary_simplified` (jsonb, nullable) - Simplified boundaries keyed by
+    the highest map zoom they are meant for, e.g.
+    `{"8": [{lat, lng}, ...], "11": [...], "14": [...]}`. Levels that would
+    not drop any points are omitted. NULL for rows written before this
+    migration until `backfill_project_geometry.py` has run; those rows are
+    served at full resolution.
+*/
+
+ALTER TABLE projects ADD COLUMN IF NOT EXISTS boundary_simplified jsonb;
@@ -0,0 +1,32 @@
+/*
+  # Project bounding boxes for vector tiles
+
+  ## Overview
+  `/agb/tiles/{z}/{x}/{y}` serves project boundaries as Mapbox Vector
+  Tiles. Each tile needs the projects whose boundary falls inside it, so
+  every project stores the bounding box of its boundary, indexed for
+  rectangle overlap queries with the built-in `box` type (no PostGIS
+  needed).
+
+  ## Modified Tables
+
+  ### `projects` table
+  - `bbox_min_lng`, `bbox_min_lat`, `bbox_max_lng`, `bbox_max_lat`
+    (double precision, nullable) - Bounding box of `boundary_coordinates`,
+    set when a project is created. NULL for projects without a boundary,
+    and for rows written before this migration until
+    `backfill_project_geometry.py` has run; such projects are not drawn
+    on tiles.
+
+  ## Indexes
+  - `idx_projects_bbox` - GiST index on the bounding box as a `box`, used
+    by the `&&` overlap test of the tile queries
+*/
+
+ALTER TABLE projects ADD COLUMN IF NOT EXISTS bbox_min_lng double precision;
+ALTER TABLE projects ADD COLUMN IF NOT EXISTS bbox_min_lat double precision;
+ALTER TABLE projects ADD COLUMN IF NOT EXISTS bbox_max_lng double precision;
+ALTER TABLE projects ADD COLUMN IF NOT EXISTS bbox_max_lat double precision;
+
+CREATE INDEX IF NOT EXISTS idx_projects_bbox
+  ON projects USING gist (box(point(bbox_min_lng, bbox_min_lat), point(bbox_max_lng, bbox_max_lat)));
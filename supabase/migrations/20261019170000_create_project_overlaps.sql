@@ -0,0 +1,41 @@
+/*
+  # Project overlaps
+
+  ## Overview
+  Carbon projects whose boundaries overlap claim the same land twice. Every
+  pair of overlapping projects is recorded here for verifiers: when a
+  project is created it is checked against the projects whose bounding box
+  meets its own (`idx_projects_bbox`), and `detect_project_overlaps.py`
+  re-checks the whole table with a sweep over all bounding boxes.
+
+  ## New Tables
+
+  ### `project_overlaps` table
+  - `project_id`, `other_project_id` (integer) - The two projects, lower id
+    first, so each pair is stored once
+  - `overlap_hectares` (double precision) - Area claimed by both projects
+  - `project_fraction`, `other_fraction` (double precision) - Share of
+    each project's own boundary area that the overlap covers (0 to 1)
+  - `detected_at` (timestamptz) - When the overlap was last measured
+
+  ## Indexes
+  - Primary key on (`project_id`, `other_project_id`)
+  - `other_project_id` for the overlaps of one project
+  - `overlap_hectares` for listing the largest overlaps first
+*/
+
+CREATE TABLE IF NOT EXISTS project_overlaps (
+  project_id integer NOT NULL REFERENCES projects(id) ON DELETE CASCADE,
+  other_project_id integer NOT NULL REFERENCES projects(id) ON DELETE CASCADE,
+  overlap_hectares double precision NOT NULL,
+  project_fraction double precision NOT NULL,
+  other_fraction double precision NOT NULL,
+  detected_at timestamptz DEFAULT now(),
+  PRIMARY KEY (project_id, other_project_id),
+  CHECK (project_id < other_project_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_project_overlaps_other_project_id ON project_overlaps(other_project_id);
+CREATE INDEX IF NOT EXISTS idx_project_overlaps_hectares ON project_overlaps(overlap_hectares DESC);
+
+ALTER TABLE project_overlaps ENABLE ROW LEVEL SECURITY;
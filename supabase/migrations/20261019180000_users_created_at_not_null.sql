@@ -0,0 +1,23 @@
+/*
+  # Users always have a creation time
+
+  ## Overview
+  The admin user directory pages through `users` with a keyset cursor on
+  (created_at, id). A NULL `created_at` cannot be encoded in the cursor and
+  is never matched by the `(created_at, id) < (...)` keyset condition, so
+  such users would end pagination or be skipped. `created_at` already
+  defaults to now(); this makes it mandatory.
+
+  ## Modified Tables
+
+  ### `users` table
+  - `created_at` is NOT NULL. Rows without one get their last login time,
+    or the Unix epoch when they never logged in, so they sort as the
+    oldest accounts.
+*/
+
+UPDATE users
+SET created_at = COALESCE(last_login, to_timestamp(0))
+WHERE created_at IS NULL;
+
+ALTER TABLE users ALTER COLUMN created_at SET NOT NULL;
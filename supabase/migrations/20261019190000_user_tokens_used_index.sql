@@ -0,0 +1,14 @@
+/*
+  # Index used tokens for the purge
+
+  ## Indexes
+  - `idx_user_tokens_used` - partial index on `id` for tokens that have been
+    used. The background purge deletes expired tokens through
+    `idx_user_tokens_expires_at` and used ones through this index, in
+    separate batches. Used tokens are purged soon after use, so the index
+    stays small.
+*/
+
+CREATE INDEX IF NOT EXISTS idx_user_tokens_used
+  ON user_tokens(id)
+  WHERE used;
@@ -0,0 +1,219 @@
+import heapq
+import itertools
+import math
+import os
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from flask import current_app, jsonify, session
+from utils.cache import TTLCache
+
+# Fair-queue weights: interactive single-point predictions get four times
+# the share of bulk/polygon work when both are waiting
+WEIGHTS = {'interactive': 4, 'bulk': 1}
+
+# Token cost of one request per kind of prediction endpoint
+COSTS = {'predict': 1, 'polygon': 2, 'batch': 5}
+
+DEFAULT_RATE_LIMITS = 'default=2/10,admin=20/50'
+
+
+class QueueFull(Exception):
+    pass
+
+
+def parse_rate_limits(spec):
+    """'default=2/10,admin=20/50' -> {'default': (2.0, 10.0), 'admin': (20.0, 50.0)}
+
+    Each role gets `rate` tokens per second with a burst of `burst` tokens.
+    """
+    limits = {}
+    for part in spec.split(','):
+        if not part.strip():
+            continue
+        role, _, value = part.partition('=')
+        rate, _, burst = value.partition('/')
+        limits[role.strip()] = (float(rate), float(burst or rate))
+    limits.setdefault('default', (2.0, 10.0))
+    return limits
+
+
+class TokenBucket:
+    __slots__ = ('tokens', 'updated_at')
+
+    def __init__(self, burst):
+        self.tokens = burst
+        self.updated_at = time.monotonic()
+
+
+class RateLimiter:
+    """Per-user token buckets with rate and burst chosen by role.
+
+    Buckets of idle users expire from an LRU cache; by then they would have
+    refilled completely, so recreating them full changes nothing.
+    """
+
+    def __init__(self, limits, max_users=100000):
+        self.limits = limits
+        slowest_refill = max(burst / rate for rate, burst in limits.values() if rate > 0)
+        self.buckets = TTLCache(maxsize=max_users, ttl=max(600, slowest_refill))
+        self._lock = threading.Lock()
+
+    def acquire(self, user_id, role, cost=1):
+        """Take `cost` tokens; returns 0 on success or the seconds to wait"""
+        rate, burst = self.limits.get(role, self.limits['default'])
+        with self._lock:
+            bucket = self.buckets.get(user_id)
+            if bucket is None:
+                bucket = TokenBucket(burst)
+            now = time.monotonic()
+            bucket.tokens = min(burst, bucket.tokens + (now - bucket.updated_at) * rate)
+            bucket.updated_at = now
+            self.buckets.set(user_id, bucket)
+
+            if bucket.tokens >= cost:
+                bucket.tokens -= cost
+                return 0
+            if rate <= 0 or cost > burst:
+                return math.inf
+            return (cost - bucket.tokens) / rate
+
+
+class WeightedFairQueue:
+    """Bounded worker pool that serves flows by weighted fair queueing.
+
+    Each (kind, user) flow gets a virtual finish time of
+    max(virtual clock, its previous finish) + cost / weight, and workers
+    always take the job with the smallest one. A heavy flow therefore
+    cannot starve others, and interactive work overtakes queued bulk work
+    in proportion to its weight.
+    """
+
+    def __init__(self, workers, max_queue, weights=WEIGHTS):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.weights = weights
+        self._heap = []
+        self._seq = itertools.count()
+        self._virtual_time = 0.0
+        self._last_finish = {}
+        self._cond = threading.Condition()
+        self._threads = []
+        self._pid = None
+        self.metrics = {'submitted': 0, 'rejected': 0, 'expired': 0}
+
+    def _ensure_workers(self):
+        # Started lazily so every forked worker process gets its own threads
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._threads = []
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._work, name=f'prediction-{i}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def submit(self, kind, flow, fn, cost=1):
+        future = Future()
+        with self._cond:
+            self._ensure_workers()
+            if len(self._heap) >= self.max_queue:
+                self.metrics['rejected'] += 1
+                raise QueueFull()
+            start = max(self._virtual_time, self._last_finish.get(flow, 0.0))
+            finish = start + cost / self.weights.get(kind, 1)
+            self._last_finish[flow] = finish
+            heapq.heappush(self._heap, (finish, next(self._seq), future, fn))
+            self.metrics['submitted'] += 1
+            self._cond.notify()
+        return future
+
+    def _work(self):
+        while True:
+            with self._cond:
+                while not self._heap:
+                    self._cond.wait()
+                finish, _, future, fn = heapq.heappop(self._heap)
+                self._virtual_time = max(self._virtual_time, finish)
+                if len(self._last_finish) > 10000:
+                    # Flows that are caught up with the clock carry no history
+                    self._last_finish = {
+                        flow: f for flow, f in self._last_finish.items() if f > self._virtual_time
+                    }
+
+            # Jobs cancelled while waiting (request timed out) are skipped
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(fn())
+            except BaseException as e:
+                future.set_exception(e)
+
+    def cancel(self, future):
+        """Withdraw a job that has not started; False once it is running"""
+        if not future.cancel():
+            return False
+        with self._cond:
+            self.metrics['expired'] += 1
+        return True
+
+    def stats(self):
+        with self._cond:
+            return {'queued': len(self._heap), 'workers': self.workers, **self.metrics}
+
+
+def _over_limit(status, message, retry_after):
+    response = jsonify({'success': False, 'error': message})
+    response.status_code = status
+    response.headers['Retry-After'] = str(max(1, math.ceil(retry_after)))
+    return response
+
+
+def get_admission(app):
+    """The process-wide limiter and fair queue, created from app config"""
+    admission = app.extensions.get('prediction_admission')
+    if admission is None:
+        limiter = RateLimiter(parse_rate_limits(app.config.get('PREDICTION_RATE_LIMITS', DEFAULT_RATE_LIMITS)))
+        queue = WeightedFairQueue(
+            workers=app.config.get('PREDICTION_WORKERS', os.cpu_count() or 2),
+            max_queue=app.config.get('PREDICTION_QUEUE_SIZE', 64),
+        )
+        admission = app.extensions.setdefault('prediction_admission', (limiter, queue))
+    return admission
+
+
+def run_admitted(kind, endpoint, fn):
+    """Rate-limit the current user, then run `fn` on the fair prediction queue.
+
+    Over-budget users get 429 with Retry-After; a full or stalled queue gets
+    503 with Retry-After so clients back off instead of piling up. A job
+    that started before PREDICTION_QUEUE_TIMEOUT ran out gets another
+    PREDICTION_RUN_GRACE seconds to finish; after that the request answers
+    503 and stops waiting for it.
+    """
+    app = current_app._get_current_object()
+    limiter, queue = get_admission(app)
+    user_id = session.get('user_id')
+    cost = COSTS.get(endpoint, 1)
+
+    retry_after = limiter.acquire(user_id, session.get('user_role', 'default'), cost)
+    if retry_after:
+        if math.isinf(retry_after):
+            return _over_limit(429, 'Request exceeds your prediction budget', 60)
+        return _over_limit(429, 'Too many prediction requests', retry_after)
+
+    try:
+        future = queue.submit(kind, (kind, user_id), fn, cost)
+    except QueueFull:
+        return _over_limit(503, 'Prediction service is busy', 1)
+
+    timeout = app.config.get('PREDICTION_QUEUE_TIMEOUT', 30)
+    try:
+        return future.result(timeout=timeout)
+    except FutureTimeout:
+        if queue.cancel(future):
+            return _over_limit(503, 'Prediction service is busy', 5)
+    try:
+        # Already running: let it finish rather than waste the work
+        return future.result(timeout=app.config.get('PREDICTION_RUN_GRACE', 30))
+    except FutureTimeout:
+        return _over_limit(503, 'Prediction timed out', 5)
@@ -0,0 +1,79 @@
+import json
+import mimetypes
+import os
+from flask import Blueprint, abort, current_app, request, send_file, url_for
+
+assets_bp = Blueprint('assets', __name__)
+
+# Hashed filenames never change content, so browsers may cache them forever
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+
+def load_manifest(app):
+    path = os.path.join(app.config['ASSET_BUILD_DIR'], 'manifest.json')
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def asset_url(filename):
+    """URL of the fingerprinted build of a static file.
+
+    Falls back to the plain static URL when the asset has not been built, so
+    templates work in development without running build_assets.py.
+    """
+    hashed = current_app.extensions['asset_manifest'].get(filename)
+    if hashed:
+        return url_for('assets.serve', filename=hashed)
+    return url_for('static', filename=filename)
+
+
+def accepted_encodings():
+    accepted = set()
+    for part in request.headers.get('Accept-Encoding', '').split(','):
+        name, _, params = part.strip().partition(';')
+        params = params.strip()
+        q = 1.0
+        if params.startswith('q='):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        if name and q > 0:
+            accepted.add(name.strip().lower())
+    return accepted
+
+
+@assets_bp.route('/assets/<path:filename>')
+def serve(filename):
+    """Serve a built asset, preferring a precompressed variant"""
+    build_dir = current_app.config['ASSET_BUILD_DIR']
+    path = os.path.realpath(os.path.join(build_dir, filename))
+    if not path.startswith(os.path.realpath(build_dir) + os.sep) or not os.path.isfile(path):
+        abort(404)
+
+    mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    accepted = accepted_encodings()
+
+    for encoding, suffix in ENCODINGS:
+        if encoding in accepted and os.path.isfile(path + suffix):
+            response = send_file(path + suffix, mimetype=mimetype, conditional=True)
+            response.headers['Content-Encoding'] = encoding
+            break
+    else:
+        response = send_file(path, mimetype=mimetype, conditional=True)
+
+    response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+    response.headers['Vary'] = 'Accept-Encoding'
+    return response
+
+
+def init_assets(app):
+    app.config.setdefault('ASSET_BUILD_DIR', os.path.join(app.static_folder, 'dist'))
+    app.extensions['asset_manifest'] = load_manifest(app)
+    app.add_template_global(asset_url)
+    app.register_blueprint(assets_bp)
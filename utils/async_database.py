@@ -0,0 +1,169 @@
+import asyncio
+import os
+import threading
+import time
+from flask import current_app
+from utils.database import execute_query, read_target
+from utils.query_registry import NamedQuery, query_stats
+
+try:
+    import psycopg
+    from psycopg.rows import dict_row
+    from psycopg_pool import AsyncConnectionPool, PoolTimeout
+except ImportError:
+    AsyncConnectionPool = None
+
+
+class AsyncDatabase:
+    """Asynchronous queries over psycopg 3 connection pools.
+
+    Flask runs every async view on a fresh event loop, while a pool's
+    connections belong to the loop that opened them. The pools therefore
+    live on a dedicated event loop thread, and each query is handed to it
+    and awaited from whatever loop the view runs on. Queries from many
+    views and threads share one pool per database (the primary, plus any
+    read replica in use), so a worker holds at most `max_size`
+    connections to each instead of opening one per query.
+
+    Without psycopg 3 installed, queries fall back to the synchronous
+    execute_query on a thread, which keeps the async views working.
+    """
+
+    def __init__(self, dsn, min_size=1, max_size=10, timeout=30, prepare=True):
+        self.dsn = dsn
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.prepare = prepare
+        self._loop = None
+        self._pools = {}
+        self._pid = None
+        self._lock = threading.Lock()
+
+    @property
+    def pooled(self):
+        return AsyncConnectionPool is not None
+
+    def _ensure_started(self):
+        # Started lazily so every forked worker process gets its own loop and pools
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            loop = asyncio.new_event_loop()
+            thread = threading.Thread(target=loop.run_forever, name='async-db', daemon=True)
+            thread.start()
+            self._loop, self._pools, self._pid = loop, {}, os.getpid()
+
+    async def _get_pool(self, dsn):
+        # Only ever runs on the database loop, so no locking is needed
+        pool = self._pools.get(dsn)
+        if pool is None:
+            pool = self._pools[dsn] = AsyncConnectionPool(
+                dsn, min_size=self.min_size, max_size=self.max_size,
+                timeout=self.timeout, open=False,
+            )
+            await pool.open(wait=False)
+        return pool
+
+    async def _run(self, dsn, query, params, fetch_one, fetch_all):
+        # psycopg keeps its own per-connection cache of prepared statements;
+        # named queries are prepared on first use like on the sync path
+        if not self.prepare:
+            prepare = False
+        elif isinstance(query, NamedQuery):
+            prepare = query.preparable
+        else:
+            prepare = None
+        pool = await self._get_pool(dsn)
+        async with pool.connection() as conn:
+            async with conn.cursor(row_factory=dict_row) as cursor:
+                await cursor.execute(str(query), params, prepare=prepare)
+                if fetch_one:
+                    return await cursor.fetchone()
+                if fetch_all:
+                    return await cursor.fetchall()
+                return cursor.rowcount
+
+    async def _submit(self, dsn, query, params, fetch_one, fetch_all):
+        name = query.name if isinstance(query, NamedQuery) else query_stats.ADHOC
+        started = time.perf_counter()
+        future = asyncio.run_coroutine_threadsafe(
+            self._run(dsn, query, params or (), fetch_one, fetch_all), self._loop
+        )
+        try:
+            result = await asyncio.wrap_future(future)
+        except Exception:
+            query_stats.record(name, (time.perf_counter() - started) * 1000, error=True)
+            raise
+        query_stats.record(name, (time.perf_counter() - started) * 1000, replica=dsn != self.dsn)
+        return result
+
+    async def execute(self, query, params=None, fetch_one=False, fetch_all=False, replica=None):
+        """Run a query; `replica` is a (router, dsn) pair from read_target
+        to try first, falling back to the primary if that replica fails"""
+        if not self.pooled:
+            return await asyncio.to_thread(execute_query, query, params, fetch_one, fetch_all)
+
+        self._ensure_started()
+        if replica is not None:
+            router, dsn = replica
+            try:
+                return await self._submit(dsn, query, params, fetch_one, fetch_all)
+            except (psycopg.OperationalError, PoolTimeout) as e:
+                router.mark_failed(dsn, e)
+            except psycopg.errors.SerializationFailure:
+                # Cancelled by a conflict with WAL replay: the replica itself is fine
+                pass
+            print(f" DATABASE: Retrying '{query.name}' on the primary")
+
+        try:
+            return await self._submit(self.dsn, query, params, fetch_one, fetch_all)
+        except Exception as e:
+            print(f" DATABASE ERROR: {e}")
+            print(f" Query: {query}")
+            print(f" Params: {params}")
+            raise
+
+    def stats(self, router=None):
+        if self._pid != os.getpid():
+            return {'pooled': self.pooled, 'pools': {}}
+        label = router.label if router is not None else (lambda dsn: 'primary')
+        return {
+            'pooled': True,
+            'pools': {label(dsn): pool.get_stats() for dsn, pool in list(self._pools.items())},
+        }
+
+    def close(self, timeout=5):
+        if self._pid != os.getpid():
+            return
+        for pool in list(self._pools.values()):
+            asyncio.run_coroutine_threadsafe(pool.close(), self._loop).result(timeout)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._pools, self._loop, self._pid = {}, None, None
+
+
+def get_async_database(app):
+    """The process-wide async database, created from app config"""
+    database = app.extensions.get('async_database')
+    if database is None:
+        database = AsyncDatabase(
+            app.config['DATABASE_URL'],
+            min_size=app.config.get('ASYNC_DB_POOL_MIN_SIZE', 1),
+            max_size=app.config.get('ASYNC_DB_POOL_MAX_SIZE', 10),
+            timeout=app.config.get('ASYNC_DB_POOL_TIMEOUT', 30),
+            prepare=app.config.get('DB_PREPARE_STATEMENTS', True),
+        )
+        database = app.extensions.setdefault('async_database', database)
+    return database
+
+
+async def execute_query_async(query, params=None, fetch_one=False, fetch_all=False):
+    """Awaitable counterpart of utils.database.execute_query, with the same
+    replica routing for read-only named queries"""
+    app = current_app._get_current_object()
+    database = get_async_database(app)
+    dsn = read_target(app, query)
+    replica = (app.extensions['db_replicas'], dsn) if dsn is not None else None
+    return await database.execute(query, params, fetch_one=fetch_one, fetch_all=fetch_all, replica=replica)
@@ -0,0 +1,49 @@
+import os
+import threading
+
+
+class PeriodicTask:
+    """Run a function every `interval` seconds on a daemon thread.
+
+    The function runs inside the application context so it can use
+    execute_query and current_app like a request handler. Tasks are started
+    lazily per process, which keeps them alive across gunicorn forks.
+    """
+
+    def __init__(self, name, interval, fn, app):
+        self.name = name
+        self.interval = interval
+        self.fn = fn
+        self.app = app
+        self._stop = threading.Event()
+        self._thread = None
+        self._pid = None
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            return
+        self._stop.clear()
+        self._pid = os.getpid()
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                with self.app.app_context():
+                    self.fn()
+            except Exception as e:
+                print(f" {self.name} task failed: {e}")
+            self._stop.wait(self.interval)
+
+
+def start_on_first_request(app, task):
+    """Start a background task the first time this process serves a request"""
+    @app.before_request
+    def _start_task():
+        task.start()
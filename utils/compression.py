@@ -0,0 +1,126 @@
+import gzip
+from flask import request
+from flask.json.provider import DefaultJSONProvider
+from utils.assets import accepted_encodings
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_MIMETYPES = {'application/json', 'text/csv', 'application/vnd.mapbox-vector-tile'}
+
+# Fixed-point scale for delta-encoded coordinates: 1e-6 degrees is ~0.1 m
+COORDINATE_SCALE = 1000000
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """JSON provider that uses orjson when it is installed.
+
+    Output matches the default provider: keys are sorted, numpy scalars
+    (float subclasses the stdlib encoder accepts) are serialized natively,
+    and values orjson does not know (Decimal, UUID, datetimes as HTTP
+    dates) go through the same default() hook.
+    """
+
+    def dumps(self, obj, **kwargs):
+        if orjson is None or kwargs:
+            return super().dumps(obj, **kwargs)
+        return orjson.dumps(
+            obj,
+            default=self.default,
+            option=(orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS
+                    | orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_SERIALIZE_NUMPY),
+        ).decode('utf-8')
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        if orjson is None or self._app.debug:
+            return super().response(*args, **kwargs)
+        return self._app.response_class(self.dumps(obj), mimetype=self.mimetype)
+
+
+def delta_encode_coordinates(coordinates):
+    """Encode [{lat, lng}, ...] as integer micro-degree deltas.
+
+    The first vertex is absolute and every following value is the difference
+    from the previous vertex, flattened as [lat0, lng0, dlat1, dlng1, ...].
+    Neighbouring farm vertices are close together, so the deltas are short
+    integers instead of long floats.
+    """
+    values = []
+    prev_lat = prev_lng = 0
+    for point in coordinates or []:
+        lat = round(float(point['lat']) * COORDINATE_SCALE)
+        lng = round(float(point['lng']) * COORDINATE_SCALE)
+        values.append(lat - prev_lat)
+        values.append(lng - prev_lng)
+        prev_lat, prev_lng = lat, lng
+    return {'encoding': 'delta-e6', 'values': values}
+
+
+def delta_decode_coordinates(encoded):
+    coordinates = []
+    lat = lng = 0
+    values = encoded['values']
+    for i in range(0, len(values), 2):
+        lat += values[i]
+        lng += values[i + 1]
+        coordinates.append({'lat': lat / COORDINATE_SCALE, 'lng': lng / COORDINATE_SCALE})
+    return coordinates
+
+
+def wants_delta_coordinates():
+    return request.args.get('coords') == 'delta'
+
+
+def _choose_encoding():
+    accepted = accepted_encodings()
+    if brotli is not None and 'br' in accepted:
+        return 'br'
+    if 'gzip' in accepted:
+        return 'gzip'
+    return None
+
+
+def compress_response(response, min_size):
+    """Compress JSON/CSV/vector tile bodies above `min_size` bytes for clients that accept it"""
+    if (response.direct_passthrough
+            or response.status_code < 200 or response.status_code >= 300
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES
+            or 'Content-Encoding' in response.headers):
+        return response
+
+    response.vary.add('Accept-Encoding')
+    data = response.get_data()
+    if len(data) < min_size:
+        return response
+
+    encoding = _choose_encoding()
+    if encoding is None:
+        return response
+
+    if encoding == 'br':
+        # Low brotli quality keeps on-the-fly compression cheap
+        compressed = brotli.compress(data, quality=4)
+    else:
+        compressed = gzip.compress(data, compresslevel=6)
+
+    response.set_data(compressed)
+    response.headers['Content-Encoding'] = encoding
+    response.headers['Content-Length'] = str(len(compressed))
+    return response
+
+
+def init_compression(app):
+    app.json = FastJSONProvider(app)
+    min_size = app.config.get('COMPRESS_MIN_SIZE', 1024)
+
+    @app.after_request
+    def _compress(response):
+        return compress_response(response, min_size)
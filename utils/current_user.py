@@ -0,0 +1,30 @@
+from flask import g, session
+from models.user import User
+
+
+def get_current_user():
+    """Load the logged-in user once per request.
+
+    The user is memoised on flask.g for the rest of the request, and
+    User.get_cached serves repeat page loads from a short-TTL process cache.
+    """
+    if 'current_user' not in g:
+        user_id = session.get('user_id')
+        g.current_user = User.get_cached(user_id) if user_id else None
+    return g.current_user
+
+
+async def get_current_user_async():
+    """Async version of get_current_user for async views"""
+    if 'current_user' not in g:
+        user_id = session.get('user_id')
+        g.current_user = await User.get_cached_async(user_id) if user_id else None
+    return g.current_user
+
+
+def forget_current_user():
+    """Drop the request-scoped and process-wide copies of the current user"""
+    user = g.pop('current_user', None)
+    user_id = session.get('user_id') or (user.id if user else None)
+    if user_id:
+        User.invalidate_cache(user_id)
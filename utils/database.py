@@ -1,36 +1,332 @@
+import itertools
+import os
+import threading
+import time
 import uuid
 import psycopg2
+import psycopg2.pool
+from psycopg2 import errorcodes
 from psycopg2.extras import register_uuid
 from psycopg2.extras import RealDictCursor
-from flask import current_app
+from flask import current_app, g, has_request_context, session
 from contextlib import contextmanager
+from utils.query_registry import NamedQuery, query_stats
+
+# Register UUID adapter
+register_uuid()
+
+# Set up UUID handling
+def adapt_uuid(uuid_obj):
+    return str(uuid_obj)
+
+# Register adapter for UUID type
+psycopg2.extensions.register_adapter(uuid.UUID, adapt_uuid)
+
+
+class PooledConnection(psycopg2.extensions.connection):
+    """Connection that remembers which named queries it has PREPAREd"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prepared = set()
+
+
+class ConnectionPool:
+    """Thread-safe psycopg2 pool that waits for a free connection.
+
+    ThreadedConnectionPool raises as soon as every connection is checked
+    out; the semaphore makes callers queue for up to `timeout` seconds
+    instead, the way they used to wait on a fresh connect.
+    """
+
+    def __init__(self, dsn, min_size=1, max_size=10, timeout=30):
+        self.timeout = timeout
+        self._pool = psycopg2.pool.ThreadedConnectionPool(
+            min_size, max_size, dsn, connection_factory=PooledConnection
+        )
+        self._slots = threading.BoundedSemaphore(max_size)
+
+    def getconn(self):
+        if not self._slots.acquire(timeout=self.timeout):
+            raise psycopg2.pool.PoolError("Timed out waiting for a database connection")
+        try:
+            return self._pool.getconn()
+        except Exception:
+            self._slots.release()
+            raise
+
+    def putconn(self, conn):
+        try:
+            self._pool.putconn(conn, close=bool(conn.closed))
+        finally:
+            self._slots.release()
+
+    def closeall(self):
+        self._pool.closeall()
+
+
+_pool_lock = threading.Lock()
+
+
+def get_pool(app, dsn=None):
+    """Connection pool of this worker process for `dsn` (default: the primary)"""
+    dsn = dsn or app.config['DATABASE_URL']
+    pools = app.extensions.get('db_pools')
+    # Connections cannot be shared with forked workers: each process opens its own
+    if pools is None or pools[0] != os.getpid() or dsn not in pools[1]:
+        with _pool_lock:
+            pools = app.extensions.get('db_pools')
+            if pools is None or pools[0] != os.getpid():
+                pools = app.extensions['db_pools'] = (os.getpid(), {})
+            if dsn not in pools[1]:
+                pools[1][dsn] = ConnectionPool(
+                    dsn,
+                    min_size=app.config.get('DB_POOL_MIN_SIZE', 1),
+                    max_size=app.config.get('DB_POOL_MAX_SIZE', 10),
+                    timeout=app.config.get('DB_POOL_TIMEOUT', 30),
+                )
+    return pools[1][dsn]
+
+
+class ReplicaRouter:
+    """Sends read-only queries to healthy, caught-up read replicas.
+
+    A background task (init_replicas) measures every replica's replay lag;
+    replicas that cannot be reached, are not in recovery or lag more than
+    `max_lag` seconds get no traffic until a later check passes. Requests
+    that wrote through a model query in the last `sticky_seconds` keep
+    reading from the primary so they see their own writes. Whenever no
+    replica qualifies, reads go to the primary.
+    """
+
+    # Replay lag in seconds: 0 once the replica has replayed up to the
+    # primary's current WAL position (or, if the primary could not be asked,
+    # all WAL it received), so an idle primary does not look like a lagging
+    # replica; otherwise the age of the last replayed transaction
+    LAG_QUERY = """
+        SELECT pg_is_in_recovery() AS in_recovery,
+               CASE WHEN pg_last_wal_replay_lsn() >= COALESCE(%s::pg_lsn, pg_last_wal_receive_lsn()) THEN 0
+                    ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+               END AS lag
+    """
+
+    def __init__(self, dsns, max_lag=5, sticky_seconds=15, connect_timeout=2):
+        self.dsns = list(dsns)
+        self.max_lag = max_lag
+        self.sticky_seconds = sticky_seconds
+        self.connect_timeout = connect_timeout
+        self._state = {
+            dsn: {'name': f'replica-{i}', 'healthy': False, 'lag': None, 'checked_at': None, 'error': None}
+            for i, dsn in enumerate(self.dsns)
+        }
+        self._lock = threading.Lock()
+        self._turn = itertools.count()
+
+    def check(self, primary_lsn=None):
+        """Probe every replica once and update its health"""
+        for dsn in self.dsns:
+            try:
+                conn = psycopg2.connect(dsn, connect_timeout=self.connect_timeout)
+                try:
+                    with conn.cursor() as cursor:
+                        cursor.execute(self.LAG_QUERY, (primary_lsn,))
+                        in_recovery, lag = cursor.fetchone()
+                finally:
+                    conn.close()
+                lag = float(lag)
+                if not in_recovery:
+                    error = 'not a replica (promoted?)'
+                elif lag > self.max_lag:
+                    error = f'lagging {lag:.1f}s'
+                else:
+                    error = None
+                self._update(dsn, healthy=error is None, lag=lag, error=error)
+            except psycopg2.Error as e:
+                self._update(dsn, healthy=False, lag=None, error=str(e).strip())
+
+    def _update(self, dsn, **state):
+        with self._lock:
+            previous = self._state[dsn]['healthy']
+            self._state[dsn].update(state, checked_at=time.time())
+            if previous != state['healthy']:
+                status = 'healthy' if state['healthy'] else f"unavailable: {state['error']}"
+                print(f" DATABASE: {self._state[dsn]['name']} {status}")
+
+    def mark_failed(self, dsn, error):
+        """Take a replica out of rotation after a failed query until the next check"""
+        self._update(dsn, healthy=False, lag=None, error=str(error).strip())
+
+    def choose(self):
+        """DSN of a healthy replica (round robin), or None for the primary"""
+        with self._lock:
+            healthy = [dsn for dsn in self.dsns if self._state[dsn]['healthy']]
+        if not healthy:
+            return None
+        return healthy[next(self._turn) % len(healthy)]
+
+    def status(self):
+        with self._lock:
+            return [dict(state) for state in self._state.values()]
+
+    def label(self, dsn):
+        return self._state[dsn]['name'] if dsn in self._state else 'primary'
+
+
+def _note_write(app):
+    """Keep this user's reads on the primary until replicas have the write.
+
+    The current request is pinned through `g`. The session only stores the
+    time when it moves forward by more than the replica lag limit, so a
+    user writing on every request does not rewrite their (server-side)
+    session every time; the stored time is then at most `max_lag` behind.
+    """
+    router = app.extensions.get('db_replicas')
+    if router is None or not has_request_context():
+        return
+    now = time.time()
+    g._db_last_write = now
+    stored = session.get('_db_last_write')
+    if stored is None or now - stored > router.max_lag:
+        session['_db_last_write'] = now
+
+
+def read_target(app, query):
+    """Replica DSN a query may run on, or None to use the primary"""
+    router = app.extensions.get('db_replicas')
+    if router is None or not isinstance(query, NamedQuery) or not query.read_only:
+        return None
+    if has_request_context():
+        if g.get('_db_last_write') is not None:
+            return None
+        last_write = session.get('_db_last_write')
+        # The stored time may trail the real last write by up to max_lag
+        if last_write is not None and time.time() - last_write < router.sticky_seconds + router.max_lag:
+            return None
+    return router.choose()
+
+
+def init_replicas(app):
+    """Route read-only queries to DATABASE_REPLICA_URLS, checking replica health in the background"""
+    dsns = [dsn.strip() for dsn in app.config.get('DATABASE_REPLICA_URLS', '').split(',') if dsn.strip()]
+    if not dsns:
+        return None
+    from utils.background import PeriodicTask, start_on_first_request
+
+    router = ReplicaRouter(
+        dsns,
+        max_lag=app.config.get('REPLICA_MAX_LAG_SECONDS', 5),
+        sticky_seconds=app.config.get('READ_YOUR_WRITES_SECONDS', 15),
+    )
+    app.extensions['db_replicas'] = router
+
+    def check():
+        try:
+            primary_lsn = execute_query("SELECT pg_current_wal_lsn()::text AS lsn", fetch_one=True)['lsn']
+        except psycopg2.Error:
+            primary_lsn = None
+        router.check(primary_lsn)
+
+    task = PeriodicTask('replica-health', app.config.get('REPLICA_HEALTH_INTERVAL', 5), check, app)
+    start_on_first_request(app, task)
+    return router
+
 
 @contextmanager
-def get_db_connection():
-    conn = psycopg2.connect(current_app.config['DATABASE_URL'])
+def get_db_connection(dsn=None):
+    pool = get_pool(current_app._get_current_object(), dsn)
+    conn = pool.getconn()
     try:
-        # Register UUID adapter
-        register_uuid()
-        
-        # Set up UUID handling
-        def adapt_uuid(uuid_obj):
-            return str(uuid_obj)
-        
-        # Register adapter for UUID type
-        psycopg2.extensions.register_adapter(uuid.UUID, adapt_uuid)
-        
         yield conn
         conn.commit()
     except Exception as e:
-        conn.rollback()
+        if not conn.closed:
+            try:
+                conn.rollback()
+            except psycopg2.Error:
+                conn.close()
         raise e
     finally:
-        conn.close()
+        pool.putconn(conn)
+
+
+# PREPARE errors that mean the statement can never be prepared: its
+# parameter types cannot be inferred without the values
+_UNPREPARABLE = {
+    errorcodes.INDETERMINATE_DATATYPE,
+    errorcodes.AMBIGUOUS_PARAMETER,
+    errorcodes.AMBIGUOUS_FUNCTION,
+}
+
+
+def _prepare(conn, cursor, query):
+    """PREPARE a named query on this connection once; False if it cannot be"""
+    if query.name in conn.prepared:
+        return True
+    try:
+        cursor.execute(f"PREPARE {query.statement_name} AS {query.prepared_sql}")
+    except psycopg2.errors.DuplicatePreparedStatement:
+        # Prepared by an earlier use whose bookkeeping was lost
+        conn.rollback()
+    except psycopg2.Error as e:
+        if e.pgcode not in _UNPREPARABLE:
+            # Connection loss, timeouts, failover: nothing wrong with the query
+            raise
+        # Parameter types the server cannot infer: always run it as plain SQL
+        conn.rollback()
+        query.preparable = False
+        print(f" DATABASE: Query '{query.name}' cannot be prepared, running unprepared: {e}")
+        return False
+    conn.prepared.add(query.name)
+    return True
+
+
+def _explain(cursor, sql, params):
+    """EXPLAIN (ANALYZE, BUFFERS) a statement that was just run.
+
+    ANALYZE executes the statement again, so it runs inside a savepoint
+    that is rolled back: a slow INSERT/UPDATE/DELETE is not applied twice.
+    """
+    cursor.execute("SAVEPOINT slow_query_explain")
+    try:
+        cursor.execute(f"EXPLAIN (ANALYZE, BUFFERS) {sql}", params)
+        return '\n'.join(row['QUERY PLAN'] for row in cursor.fetchall())
+    finally:
+        cursor.execute("ROLLBACK TO SAVEPOINT slow_query_explain")
+
 
 def execute_query(query, params=None, fetch_one=False, fetch_all=False):
+    """Run a query on a pooled connection.
+
+    `query` is SQL text or a NamedQuery from utils.query_registry. Named
+    queries are PREPAREd per connection on first use (unless
+    DB_PREPARE_STATEMENTS is off, e.g. behind a transaction-mode
+    pgbouncer) and timed under their name. A query slower than
+    DB_SLOW_QUERY_MS gets its plan logged with EXPLAIN (ANALYZE, BUFFERS),
+    at most once per DB_SLOW_QUERY_EXPLAIN_INTERVAL seconds per query.
+
+    Read-only named queries run on a replica when one is configured and
+    healthy (see ReplicaRouter); if the replica fails they are retried on
+    the primary.
+    """
+    app = current_app._get_current_object()
+    dsn = read_target(app, query)
+    if dsn is not None:
+        router = app.extensions['db_replicas']
+        try:
+            return _execute(query, params, fetch_one, fetch_all, dsn)
+        except (psycopg2.OperationalError, psycopg2.pool.PoolError) as e:
+            router.mark_failed(dsn, e)
+        except psycopg2.errors.SerializationFailure:
+            # Cancelled by a conflict with WAL replay: the replica itself is fine
+            pass
+        print(f" DATABASE: Retrying '{query.name}' on the primary")
+    return _execute(query, params, fetch_one, fetch_all)
+
+
+def _execute(query, params, fetch_one, fetch_all, dsn=None):
     # print(f" DATABASE: Executing query: {query}")
     # print(f" DATABASE: Params: {params}")
-    
+
     # Process parameters to handle UUIDs
     processed_params = []
     if params:
@@ -40,26 +336,61 @@ def execute_query(query, params=None, fetch_one=False, fetch_all=False):
             else:
                 processed_params.append(param)
         params = tuple(processed_params)
-    
-    with get_db_connection() as conn:
+
+    config = current_app.config
+    named = isinstance(query, NamedQuery)
+    name = query.name if named else query_stats.ADHOC
+
+    with get_db_connection(dsn) as conn:
         with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+            started = time.perf_counter()
             try:
-                cursor.execute(query, params or ())
-                
+                sql = str(query)
+                if named and query.preparable and config.get('DB_PREPARE_STATEMENTS', True):
+                    if _prepare(conn, cursor, query):
+                        sql = query.execute_sql()
+                try:
+                    cursor.execute(sql, params or ())
+                except psycopg2.errors.InvalidSqlStatementName:
+                    # The server dropped our statements (DISCARD ALL, failover): prepare again
+                    conn.rollback()
+                    conn.prepared.clear()
+                    if not _prepare(conn, cursor, query):
+                        sql = str(query)
+                    cursor.execute(sql, params or ())
+
                 if fetch_one:
                     result = cursor.fetchone()
                     # print(f" DATABASE: Fetch one result: {result}")
-                    return result
                 elif fetch_all:
                     result = cursor.fetchall()
                     # print(f" DATABASE: Fetch all results: {len(result)} rows")
-                    return result
-                
-                print(f" DATABASE: Row count: {cursor.rowcount}")
-                return cursor.rowcount
-                
+                else:
+                    print(f" DATABASE: Row count: {cursor.rowcount}")
+                    result = cursor.rowcount
+
+                # Reads of this session stay on the primary until replicas have caught up
+                if named and query.read_back and cursor.rowcount > 0 and \
+                        (cursor.statusmessage or '').split(' ')[0] in ('INSERT', 'UPDATE', 'DELETE'):
+                    _note_write(current_app)
+
             except Exception as e:
+                query_stats.record(name, (time.perf_counter() - started) * 1000, error=True)
                 print(f" DATABASE ERROR: {e}")
                 print(f" Query: {query}")
                 print(f" Params: {params}")
-                raise e
\ No newline at end of file
+                raise e
+
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            slow_ms = config.get('DB_SLOW_QUERY_MS', 500)
+            slow = bool(slow_ms) and elapsed_ms >= slow_ms
+            query_stats.record(name, elapsed_ms, slow=slow, replica=dsn is not None)
+            if slow and named and query_stats.should_explain(
+                    name, time.monotonic(), config.get('DB_SLOW_QUERY_EXPLAIN_INTERVAL', 300)):
+                try:
+                    plan = _explain(cursor, sql, params or ())
+                    query_stats.set_plan(name, plan)
+                    print(f" DATABASE: Slow query '{name}' took {elapsed_ms:.0f} ms:\n{plan}")
+                except psycopg2.Error as e:
+                    print(f" DATABASE: Could not explain slow query '{name}': {e}")
+            return result
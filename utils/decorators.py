@@ -1,34 +1,54 @@
+import inspect
 from functools import wraps
-from flask import session, redirect, url_for, flash
+from flask import session, redirect, url_for, flash, copy_current_request_context, current_app
+
+def _guard(f, check):
+    """Wrap a view so `check()` runs first; a non-None result replaces the
+    view's response. Async views get an async wrapper so Flask still
+    recognises them as coroutine functions."""
+    if inspect.iscoroutinefunction(f):
+        @wraps(f)
+        async def decorated_async(*args, **kwargs):
+            response = check()
+            if response is not None:
+                return response
+            return await f(*args, **kwargs)
+        return decorated_async
 
-def login_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
+        response = check()
+        if response is not None:
+            return response
+        return f(*args, **kwargs)
+    return decorated_function
+
+def login_required(f):
+    def check():
         if 'user_id' not in session:
             flash('Please log in to access this page.', 'warning')
             return redirect(url_for('auth.login'))
-        return f(*args, **kwargs)
-    return decorated_function
+        return None
+
+    return _guard(f, check)
 
 def role_required(*roles):
-    def decorator(f):
-        @wraps(f)
-        def decorated_function(*args, **kwargs):
-            if 'user_id' not in session:
-                flash('Please log in to access this page.', 'warning')
-                return redirect(url_for('auth.login'))
+    def check():
+        if 'user_id' not in session:
+            flash('Please log in to access this page.', 'warning')
+            return redirect(url_for('auth.login'))
 
-            if 'user_role' not in session or session['user_role'] not in roles:
-                flash('You do not have permission to access this page.', 'danger')
-                return redirect(url_for('dashboard.index'))
+        if 'user_role' not in session or session['user_role'] not in roles:
+            flash('You do not have permission to access this page.', 'danger')
+            return redirect(url_for('dashboard.index'))
+        return None
 
-            return f(*args, **kwargs)
-        return decorated_function
+    def decorator(f):
+        return _guard(f, check)
     return decorator
 
 def two_factor_verified(f):
-    @wraps(f)
-    def decorated_function(*args, **kwargs):
+    def check():
         if 'user_id' not in session:
             flash('Please log in to access this page.', 'warning')
             return redirect(url_for('auth.login'))
@@ -36,14 +56,36 @@ def two_factor_verified(f):
         if session.get('two_factor_required') and not session.get('two_factor_verified'):
             flash('Please complete two-factor authentication.', 'warning')
             return redirect(url_for('auth.verify_2fa'))
+        return None
 
-        return f(*args, **kwargs)
-    return decorated_function
+    return _guard(f, check)
+
+def csrf_required(f):
+    """Validate the CSRF token (form field or X-CSRFToken header) of
+    state-changing requests to a view on a CSRF-exempt blueprint"""
+    def check():
+        if current_app.config.get('WTF_CSRF_ENABLED', True):
+            current_app.extensions['csrf'].protect()
+        return None
+
+    return _guard(f, check)
+
+def prediction_admission(kind, endpoint):
+    """Admit a prediction request through the per-user rate limit and the
+    weighted fair queue; the view then runs on a prediction worker"""
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            from utils.admission import run_admitted
+            view = copy_current_request_context(f)
+            return run_admitted(kind, endpoint, lambda: view(*args, **kwargs))
+        return decorated_function
+    return decorator
 
 def logout_required(f):
-    @wraps(f)
-    def decorated_function(*args, **kwargs):
+    def check():
         if 'user_id' in session:
             return redirect(url_for('dashboard.index'))
-        return f(*args, **kwargs)
-    return decorated_function
+        return None
+
+    return _guard(f, check)
@@ -0,0 +1,232 @@
+import smtplib
+import threading
+import time
+from contextlib import contextmanager
+from email.mime.text import MIMEText
+from email.mime.multipart import MIMEMultipart
+from flask import current_app
+from utils.database import execute_query
+from utils.background import PeriodicTask, start_on_first_request
+
+
+def build_message(sender, to_email, subject, html_content, text_content=None):
+    msg = MIMEMultipart('alternative')
+    msg['Subject'] = subject
+    msg['From'] = sender
+    msg['To'] = to_email
+
+    # Parts go from least to most preferred, so plain text comes first
+    if text_content:
+        msg.attach(MIMEText(text_content, 'plain'))
+
+    html_part = MIMEText(html_content, 'html')
+    msg.attach(html_part)
+    return msg
+
+
+class SMTPConnectionPool:
+    """Keep authenticated SMTP connections open between sends.
+
+    STARTTLS and login are done once per connection instead of once per
+    message. Connections idle longer than `max_idle` are checked with NOOP
+    before reuse and reopened if the server has dropped them.
+    """
+
+    def __init__(self, server, port, use_tls, username=None, password=None,
+                 maxsize=2, max_idle=60, timeout=30):
+        self.server = server
+        self.port = port
+        self.use_tls = use_tls
+        self.username = username
+        self.password = password
+        self.max_idle = max_idle
+        self.timeout = timeout
+        self._idle = []
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(maxsize)
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            server=config['MAIL_SERVER'],
+            port=config['MAIL_PORT'],
+            use_tls=config['MAIL_USE_TLS'],
+            username=config.get('MAIL_USERNAME'),
+            password=config.get('MAIL_PASSWORD'),
+            maxsize=config.get('MAIL_POOL_SIZE', 2),
+        )
+
+    def _connect(self):
+        server = smtplib.SMTP(self.server, self.port, timeout=self.timeout)
+        if self.use_tls:
+            server.starttls()
+        if self.username and self.password:
+            server.login(self.username, self.password)
+        return server
+
+    def _checkout(self):
+        with self._lock:
+            while self._idle:
+                server, last_used = self._idle.pop()
+                if time.monotonic() - last_used < self.max_idle:
+                    return server
+                try:
+                    if server.noop()[0] == 250:
+                        return server
+                except smtplib.SMTPException:
+                    pass
+                self._close(server)
+        return self._connect()
+
+    def _close(self, server):
+        try:
+            server.quit()
+        except Exception:
+            server.close()
+
+    @contextmanager
+    def connection(self):
+        """A pooled connection, returned to the pool only after a clean exit.
+
+        Any exception leaving the block (a dropped connection, or a 4xx/5xx
+        reply in the middle of a message) leaves the SMTP session in an
+        unknown state, so the connection is closed instead.
+        """
+        self._slots.acquire()
+        try:
+            server = self._checkout()
+            try:
+                yield server
+            except BaseException:
+                self._close(server)
+                raise
+            with self._lock:
+                self._idle.append((server, time.monotonic()))
+        finally:
+            self._slots.release()
+
+    def close_all(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for server, _ in idle:
+            self._close(server)
+
+
+def enqueue_email(to_email, subject, html_content, text_content=None):
+    """Store an email for background delivery"""
+    query = """
+        INSERT INTO email_outbox (to_email, subject, html_body, text_body)
+        VALUES (%s, %s, %s, %s)
+        RETURNING id
+    """
+    result = execute_query(query, (to_email, subject, html_content, text_content), fetch_one=True)
+    return result['id'] if result else None
+
+
+def claim_batch(batch_size, lock_timeout_minutes=10):
+    """Claim due emails for this worker.
+
+    SKIP LOCKED lets several processes drain the outbox without sending the
+    same message twice, and rows left in 'sending' by a crashed worker are
+    picked up again once their lock is stale.
+    """
+    query = """
+        UPDATE email_outbox
+        SET status = 'sending', attempts = attempts + 1, locked_at = now()
+        WHERE id IN (
+            SELECT id FROM email_outbox
+            WHERE (status = 'pending' AND next_attempt_at <= now())
+               OR (status = 'sending' AND locked_at < now() - make_interval(mins => %s))
+            ORDER BY next_attempt_at
+            LIMIT %s
+            FOR UPDATE SKIP LOCKED
+        )
+        RETURNING id, to_email, subject, html_body, text_body, attempts
+    """
+    return execute_query(query, (lock_timeout_minutes, batch_size), fetch_all=True) or []
+
+
+def mark_sent(email_ids):
+    if email_ids:
+        query = """
+            UPDATE email_outbox
+            SET status = 'sent', sent_at = now(), locked_at = NULL, last_error = NULL
+            WHERE id = ANY(%s)
+        """
+        execute_query(query, (list(email_ids),))
+
+
+def mark_failed(email_id, attempts, error, max_attempts, base_delay):
+    """Schedule a retry with exponential backoff, or give up after max_attempts"""
+    if attempts >= max_attempts:
+        query = """
+            UPDATE email_outbox
+            SET status = 'failed', locked_at = NULL, last_error = %s
+            WHERE id = %s
+        """
+        execute_query(query, (error, email_id))
+        return
+
+    delay = min(base_delay * (2 ** (attempts - 1)), 3600)
+    query = """
+        UPDATE email_outbox
+        SET status = 'pending', locked_at = NULL, last_error = %s,
+            next_attempt_at = now() + make_interval(secs => %s)
+        WHERE id = %s
+    """
+    execute_query(query, (error, delay, email_id))
+
+
+def deliver_pending(pool, batch_size=50):
+    """Send one batch of due emails over a pooled connection"""
+    config = current_app.config
+    batch = claim_batch(batch_size)
+    if not batch:
+        return 0
+
+    sent = []
+    remaining = list(batch)
+    try:
+        with pool.connection() as server:
+            while remaining:
+                row = remaining[0]
+                msg = build_message(config['MAIL_DEFAULT_SENDER'], row['to_email'],
+                                    row['subject'], row['html_body'], row['text_body'])
+                try:
+                    server.send_message(msg)
+                except smtplib.SMTPRecipientsRefused as e:
+                    # Permanent for this message only - keep the connection
+                    remaining.pop(0)
+                    mark_failed(row['id'], row['attempts'], str(e),
+                                max_attempts=row['attempts'], base_delay=0)
+                    continue
+                # Recorded straight away, so a crash later in the batch cannot
+                # send this message again once its claim expires
+                remaining.pop(0)
+                mark_sent([row['id']])
+                sent.append(row['id'])
+    except Exception as e:
+        # Connection-level failure: put the rest of the batch back with backoff
+        print(f" Email delivery failed, {len(remaining)} message(s) rescheduled: {e}")
+        for row in remaining:
+            mark_failed(row['id'], row['attempts'], str(e),
+                        max_attempts=config.get('MAIL_OUTBOX_MAX_ATTEMPTS', 5),
+                        base_delay=config.get('MAIL_OUTBOX_RETRY_DELAY', 30))
+
+    return len(sent)
+
+
+def init_outbox(app):
+    """Start the outbox delivery worker in each process that serves requests"""
+    pool = SMTPConnectionPool.from_config(app.config)
+    batch_size = app.config.get('MAIL_OUTBOX_BATCH_SIZE', 50)
+
+    def drain():
+        # Keep draining while full batches come back, then wait for the next poll
+        while deliver_pending(pool, batch_size) >= batch_size:
+            pass
+
+    task = PeriodicTask('email-outbox', app.config.get('MAIL_OUTBOX_POLL_INTERVAL', 2), drain, app)
+    start_on_first_request(app, task)
+    app.extensions['email_outbox'] = task
+    return task
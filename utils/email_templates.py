@@ -0,0 +1,52 @@
+import os
+import threading
+from jinja2 import Environment, FileSystemLoader, select_autoescape
+
+TEMPLATE_ROOT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'templates')
+
+# Email templates never change at runtime, so they are compiled once and kept
+# in memory; rendering is then just a call into the compiled template code.
+_env = Environment(
+    loader=FileSystemLoader(TEMPLATE_ROOT),
+    autoescape=select_autoescape(enabled_extensions=('html',), default_for_string=False),
+    auto_reload=False,
+    cache_size=-1,
+    keep_trailing_newline=True,
+)
+_compiled = {}
+_compiled_lock = threading.Lock()
+
+
+def get_email_template(name):
+    """Return the compiled (html, text) template pair for an email name"""
+    pair = _compiled.get(name)
+    if pair is None:
+        with _compiled_lock:
+            pair = _compiled.get(name)
+            if pair is None:
+                pair = (
+                    _env.get_template(f'emails/{name}.html'),
+                    _env.get_template(f'emails/{name}.txt'),
+                )
+                _compiled[name] = pair
+    return pair
+
+
+def render_email(name, **context):
+    """Render the HTML body and plain-text alternative of an email"""
+    html_template, text_template = get_email_template(name)
+    return html_template.render(**context), text_template.render(**context)
+
+
+def render_many(name, contexts):
+    """Render an email for many recipients, e.g. portfolio-wide notifications"""
+    html_template, text_template = get_email_template(name)
+    for context in contexts:
+        yield html_template.render(**context), text_template.render(**context)
+
+
+def preload_email_templates():
+    for filename in os.listdir(os.path.join(TEMPLATE_ROOT, 'emails')):
+        name, ext = os.path.splitext(filename)
+        if ext == '.html' and name != 'base':
+            get_email_template(name)
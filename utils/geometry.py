@@ -0,0 +1,380 @@
+import math
+import numpy as np
+from flask import request
+
+# Simplified boundaries are stored for maps up to each of these zoom levels;
+# above the last one the full-resolution boundary is served
+SIMPLIFY_ZOOMS = (8, 11, 14)
+
+# Simplification tolerance in screen pixels at the level's zoom
+SIMPLIFY_PIXELS = 0.5
+
+TILE_SIZE = 256
+
+# Vertices closer than this many degrees (~1 cm) are duplicates
+DUPLICATE_EPSILON = 1e-7
+
+MAX_VERTICES = 5000
+
+# Web Mercator cannot represent the poles
+MAX_MERCATOR_LAT = 85.05112878
+
+
+class GeometryError(ValueError):
+    """A boundary that is not a usable polygon and cannot be repaired"""
+
+
+def boundary_array(coordinates):
+    """[{lat, lng}, ...] -> (n, 2) float array of (lng, lat)"""
+    try:
+        ring = np.array([(float(p['lng']), float(p['lat'])) for p in coordinates], dtype=float)
+    except (KeyError, TypeError, ValueError) as e:
+        raise GeometryError('Boundary points must be objects with numeric lat and lng') from e
+    return ring.reshape(-1, 2)
+
+
+def boundary_points(ring):
+    """(n, 2) array of (lng, lat) -> [{lat, lng}, ...]"""
+    return [{'lat': float(lat), 'lng': float(lng)} for lng, lat in ring]
+
+
+def _cross(a, b):
+    return a[..., 0] * b[..., 1] - a[..., 1] * b[..., 0]
+
+
+def signed_area(ring):
+    """Shoelace area in square degrees; positive for counter-clockwise rings"""
+    following = np.roll(ring, -1, axis=0)
+    return float(_cross(ring, following).sum()) / 2
+
+
+def _drop_duplicates(ring):
+    # A vertex equal to the one before it (including the closing vertex
+    # equal to the first) adds nothing to the ring
+    step = np.hypot(*(ring - np.roll(ring, 1, axis=0)).T)
+    keep = step > DUPLICATE_EPSILON
+    if not keep.any():
+        return ring[:1]
+    return ring[keep]
+
+
+def _drop_spikes(ring):
+    # A spike goes out and straight back along the same line (a -> b -> a'),
+    # enclosing no area; drop such vertices until none are left
+    while len(ring) >= 3:
+        incoming = ring - np.roll(ring, 1, axis=0)
+        outgoing = np.roll(ring, -1, axis=0) - ring
+        scale = np.hypot(*incoming.T) * np.hypot(*outgoing.T)
+        spikes = (np.abs(_cross(incoming, outgoing)) <= 1e-12 * scale) & ((incoming * outgoing).sum(axis=1) < 0)
+        if not spikes.any():
+            break
+        ring = _drop_duplicates(ring[~spikes])
+    return ring
+
+
+def _candidate_pairs(lo, hi):
+    """Index pairs (i, j), i < j, of intervals [lo, hi] that overlap.
+
+    Sweep over the intervals sorted by start: each one is paired with the
+    following intervals that start before it ends. All pairs are built with
+    array operations, in O(n log n + pairs).
+    """
+    order = np.argsort(lo, kind='stable')
+    lo, hi = lo[order], hi[order]
+    ends = np.searchsorted(lo, hi, side='right')
+    counts = np.maximum(ends - np.arange(len(lo)) - 1, 0)
+    first = np.repeat(np.arange(len(lo)), counts)
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    second = first + 1 + offsets
+    return order[first], order[second]
+
+
+def _non_adjacent_pairs(ring):
+    """Index pairs (i, j) of non-adjacent ring edges whose longitude ranges
+    overlap; only these can meet"""
+    n = len(ring)
+    ends = np.roll(ring, -1, axis=0)
+    i, j = _candidate_pairs(np.minimum(ring[:, 0], ends[:, 0]), np.maximum(ring[:, 0], ends[:, 0]))
+    # An edge always meets its two neighbours
+    distance = np.abs(i - j)
+    adjacent = (distance == 1) | (distance == n - 1)
+    return i[~adjacent], j[~adjacent]
+
+
+def has_self_intersection(ring):
+    """Whether any two non-adjacent edges of the closed ring cross or touch"""
+    starts = ring
+    ends = np.roll(ring, -1, axis=0)
+    i, j = _non_adjacent_pairs(ring)
+
+    r = ends[i] - starts[i]
+    s = ends[j] - starts[j]
+    offset = starts[j] - starts[i]
+    denominator = _cross(r, s)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t = _cross(offset, s) / denominator
+        u = _cross(offset, r) / denominator
+    if ((denominator != 0) & (t >= 0) & (t <= 1) & (u >= 0) & (u <= 1)).any():
+        return True
+
+    # Parallel edges meet only when they lie on the same line and their
+    # projections onto it overlap (a ring doubling back along itself)
+    r_length = np.hypot(*r.T)
+    collinear = (np.abs(denominator) <= 1e-12 * r_length * np.hypot(*s.T)) & \
+                (np.abs(_cross(offset, r)) <= 1e-12 * r_length * np.hypot(*offset.T))
+    if not collinear.any():
+        return False
+    r, s, offset, r_length = r[collinear], s[collinear], offset[collinear], r_length[collinear]
+    start = (offset * r).sum(axis=1) / r_length ** 2
+    end = start + (s * r).sum(axis=1) / r_length ** 2
+    return bool((np.maximum(np.minimum(start, end), 0) <= np.minimum(np.maximum(start, end), 1)).any())
+
+
+def _crossing_points(ring):
+    """(edge, position along the edge, point) for every point where two
+    non-adjacent edges of the ring meet. A crossing is listed for both
+    edges with the same coordinates, so the ring can be cut there; a vertex
+    lying on another edge is listed for that edge.
+    """
+    n = len(ring)
+    starts = ring
+    ends = np.roll(ring, -1, axis=0)
+    i, j = _non_adjacent_pairs(ring)
+
+    r = ends[i] - starts[i]
+    s = ends[j] - starts[j]
+    offset = starts[j] - starts[i]
+    denominator = _cross(r, s)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t = _cross(offset, s) / denominator
+        u = _cross(offset, r) / denominator
+    crossing = (denominator != 0) & (t >= 0) & (t <= 1) & (u >= 0) & (u <= 1)
+
+    cuts = []
+    for a, b, ta, ub in zip(i[crossing], j[crossing], t[crossing], u[crossing]):
+        # A crossing at a vertex is that vertex, so both sides share it exactly
+        if ub in (0, 1):
+            point = ring[(b + int(ub)) % n]
+        elif ta in (0, 1):
+            point = ring[(a + int(ta)) % n]
+        else:
+            point = starts[a] + ta * (ends[a] - starts[a])
+        cuts.append((a, ta, tuple(point)))
+        cuts.append((b, ub, tuple(point)))
+
+    # Collinear edges: each endpoint lying on the other edge cuts it there
+    parallel = (denominator == 0) & (np.abs(_cross(offset, r)) <= 1e-12 * np.hypot(*r.T) * np.hypot(*offset.T))
+    for a, b in zip(i[parallel], j[parallel]):
+        for edge, other in ((a, b), (b, a)):
+            direction = ends[edge] - starts[edge]
+            length = (direction * direction).sum()
+            for point in (starts[other], ends[other]):
+                position = ((point - starts[edge]) * direction).sum() / length
+                if 0 < position < 1:
+                    cuts.append((edge, position, tuple(point)))
+    return cuts
+
+
+def _simple_loops(ring):
+    """Split a self-intersecting ring at the points where it meets itself
+    into closed loops that do not cross themselves"""
+    cuts = {}
+    for edge, position, point in _crossing_points(ring):
+        cuts.setdefault(edge, []).append((position, point))
+    walk = []
+    for edge, start in enumerate(map(tuple, ring)):
+        walk.append(start)
+        walk.extend(point for position, point in sorted(cuts.get(edge, [])) if 0 < position < 1)
+
+    # Walk the ring; coming back to a point already on the path closes the
+    # loop since that point, which is cut off
+    loops, path, seen = [], [], {}
+    for point in walk:
+        if point in seen:
+            first = seen[point]
+            loops.append(path[first:])
+            for dropped in path[first + 1:]:
+                del seen[dropped]
+            del path[first + 1:]
+        else:
+            seen[point] = len(path)
+            path.append(point)
+    loops.append(path)
+    return [np.array(loop, dtype=float) for loop in loops if len(loop) >= 3]
+
+
+def _largest_valid_part(ring):
+    parts = []
+    for loop in _simple_loops(ring):
+        loop = _drop_spikes(_drop_duplicates(loop))
+        if len(loop) >= 3 and abs(signed_area(loop)) >= DUPLICATE_EPSILON ** 2:
+            parts.append(loop)
+    if not parts:
+        raise GeometryError('Boundary does not enclose an area')
+    largest = max(parts, key=lambda part: abs(signed_area(part)))
+    if has_self_intersection(largest):
+        raise GeometryError('Boundary edges cross each other')
+    return largest
+
+
+def repair_boundary(coordinates):
+    """Validate a project boundary and repair what can be repaired.
+
+    Returns (points, repairs): the boundary as a list of {lat, lng} points
+    forming an open, counter-clockwise ring, and a description of every
+    repair applied. Duplicate and closing vertices and zero-width spikes
+    are removed and clockwise rings reversed; a self-intersecting ring is
+    split where it meets itself and reduced to its largest loop. Raises
+    GeometryError for anything else. An empty boundary is returned as is.
+    """
+    if not coordinates:
+        return [], []
+    if not isinstance(coordinates, list):
+        raise GeometryError('Boundary must be a list of points')
+    if len(coordinates) > MAX_VERTICES:
+        raise GeometryError(f'Boundary has more than {MAX_VERTICES} points')
+
+    ring = boundary_array(coordinates)
+    if not np.isfinite(ring).all():
+        raise GeometryError('Boundary coordinates must be finite numbers')
+    if (np.abs(ring[:, 0]) > 180).any() or (np.abs(ring[:, 1]) > 90).any():
+        raise GeometryError('Boundary coordinates are out of range')
+
+    repairs = []
+    count = len(ring)
+    ring = _drop_duplicates(ring)
+    if len(ring) < count:
+        repairs.append(f'removed {count - len(ring)} duplicate points')
+    count = len(ring)
+    ring = _drop_spikes(ring)
+    if len(ring) < count:
+        repairs.append(f'removed {count - len(ring)} spike points')
+
+    if len(ring) < 3:
+        raise GeometryError('Boundary needs at least 3 distinct points')
+
+    # A crossed ring's signed area nets its loops against each other, so
+    # only check the area once the ring is simple
+    if has_self_intersection(ring):
+        ring = _largest_valid_part(ring)
+        repairs.append('reduced a self-intersecting boundary to its largest valid part')
+    elif abs(signed_area(ring)) < DUPLICATE_EPSILON ** 2:
+        raise GeometryError('Boundary does not enclose an area')
+
+    if signed_area(ring) < 0:
+        ring = ring[::-1]
+        repairs.append('reversed clockwise boundary')
+
+    return boundary_points(ring), repairs
+
+
+def boundary_bbox(points):
+    """(min_lng, min_lat, max_lng, max_lat) of a boundary, or None if empty"""
+    if not points:
+        return None
+    ring = boundary_array(points)
+    return (*map(float, ring.min(axis=0)), *map(float, ring.max(axis=0)))
+
+
+def zoom_tolerance(zoom):
+    """Mercator degrees covered by SIMPLIFY_PIXELS screen pixels at `zoom`"""
+    return SIMPLIFY_PIXELS * 360.0 / (TILE_SIZE * 2 ** zoom)
+
+
+def mercator(ring):
+    """(lng, lat) degrees -> Web Mercator x, y, both in degrees of longitude"""
+    lat = np.radians(np.clip(ring[:, 1], -MAX_MERCATOR_LAT, MAX_MERCATOR_LAT))
+    y = np.degrees(np.log(np.tan(math.pi / 4 + lat / 2)))
+    return np.column_stack([ring[:, 0], y])
+
+
+def _segment_distances(points, a, b):
+    """Distance from each point to the segment a-b"""
+    ab = b - a
+    length_sq = float(ab @ ab)
+    if length_sq == 0:
+        return np.hypot(*(points - a).T)
+    t = np.clip(((points - a) @ ab) / length_sq, 0.0, 1.0)
+    return np.hypot(*(points - a - t[:, None] * ab).T)
+
+
+def douglas_peucker(line, tolerance):
+    """Keep-mask of the vertices of an open polyline that Douglas-Peucker retains.
+
+    Each step measures all vertices of a span against its chord in one
+    vectorized operation; spans still to split are kept on a stack.
+    """
+    keep = np.zeros(len(line), dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(line) - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+        distances = _segment_distances(line[first + 1:last], line[first], line[last])
+        farthest = int(np.argmax(distances))
+        if distances[farthest] > tolerance:
+            split = first + 1 + farthest
+            keep[split] = True
+            stack.append((first, split))
+            stack.append((split, last))
+    return keep
+
+
+def simplify_ring(ring, tolerance):
+    """Douglas-Peucker simplification of a closed (lng, lat) ring.
+
+    Distances are measured in Web Mercator, so a tolerance means the same
+    on screen at every latitude. The ring is split at its first vertex and
+    the vertex farthest from it and both halves are simplified; at least a
+    triangle is always kept so the polygon still draws.
+    """
+    if len(ring) <= 3:
+        return ring
+    xy = mercator(ring)
+    far = int(np.argmax(np.hypot(*(xy - xy[0]).T)))
+    closed = np.vstack([xy, xy[:1]])
+    keep = np.zeros(len(ring), dtype=bool)
+    keep[:far + 1] = douglas_peucker(closed[:far + 1], tolerance)
+    keep[far:] |= douglas_peucker(closed[far:], tolerance)[:-1]
+    if keep.sum() < 3:
+        keep[int(np.argmax(_segment_distances(xy, xy[0], xy[far])))] = True
+    return ring[keep]
+
+
+def simplify_boundary(points):
+    """Simplified versions of a repaired boundary, keyed by maximum zoom.
+
+    A level is only stored when it has fewer points than the next finer
+    one; boundary_for_zoom then falls through to that finer level.
+    """
+    if len(points) <= 3:
+        return {}
+    ring = boundary_array(points)
+    levels = {}
+    finer_count = len(ring)
+    for zoom in sorted(SIMPLIFY_ZOOMS, reverse=True):
+        simplified = simplify_ring(ring, zoom_tolerance(zoom))
+        if len(simplified) < finer_count:
+            levels[str(zoom)] = boundary_points(simplified)
+            finer_count = len(simplified)
+    return levels
+
+
+def simplify_level(zoom):
+    """The stored simplification level meant for `zoom`, None for full resolution"""
+    return next((level for level in SIMPLIFY_ZOOMS if zoom <= level), None)
+
+
+def boundary_for_zoom(boundary, simplified, zoom):
+    """The coarsest stored boundary suitable for a map at `zoom`"""
+    if zoom is not None and simplified:
+        for level in SIMPLIFY_ZOOMS:
+            if zoom <= level and str(level) in simplified:
+                return simplified[str(level)]
+    return boundary
+
+
+def requested_zoom():
+    """The map zoom a client asked boundaries for (?zoom=), if any"""
+    return request.args.get('zoom', type=int)
@@ -0,0 +1,174 @@
+import math
+import numpy as np
+from utils.geometry import _cross, boundary_array, signed_area
+
+# Metres per degree of latitude, and of longitude at the equator
+METERS_PER_DEGREE = 111320.0
+
+SQUARE_METERS_PER_HECTARE = 10000.0
+
+# Smaller overlaps are digitizing slivers along a shared boundary, not
+# double-counted land
+MIN_OVERLAP_HECTARES = 0.01
+
+# Points closer than this many metres to an edge lie on it
+ON_EDGE_METERS = 1e-6
+
+
+def overlapping_boxes(boxes, chunk_size=100000):
+    """Yield (i, j) index arrays, i < j, of the bounding boxes that meet.
+
+    `boxes` is an (n, 4) array of (min_lng, min_lat, max_lng, max_lat).
+    A sweep along longitude pairs each box with the boxes that start
+    before it ends, and those pairs are then filtered on latitude. Pairs
+    are built with array operations for `chunk_size` boxes at a time, so
+    memory stays bounded: O(n log n + pairs) overall.
+    """
+    boxes = np.asarray(boxes, dtype=float).reshape(-1, 4)
+    order = np.argsort(boxes[:, 0], kind='stable')
+    boxes = boxes[order]
+    ends = np.searchsorted(boxes[:, 0], boxes[:, 2], side='right')
+    for first in range(0, len(boxes), chunk_size):
+        rows = np.arange(first, min(first + chunk_size, len(boxes)))
+        counts = np.maximum(ends[rows] - rows - 1, 0)
+        i = np.repeat(rows, counts)
+        j = i + 1 + np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        keep = (boxes[i, 1] <= boxes[j, 3]) & (boxes[j, 1] <= boxes[i, 3])
+        i, j = order[i[keep]], order[j[keep]]
+        yield np.minimum(i, j), np.maximum(i, j)
+
+
+def local_meters(rings):
+    """Project (lng, lat) rings onto a plane in metres centred on them.
+
+    Equirectangular around the centre of their common bounding box, which
+    is exact to well under a percent over the extent of a project.
+    """
+    stacked = np.vstack(rings)
+    lng0, lat0 = (stacked.min(axis=0) + stacked.max(axis=0)) / 2
+    scale = np.array([METERS_PER_DEGREE * math.cos(math.radians(lat0)), METERS_PER_DEGREE])
+    return [(ring - (lng0, lat0)) * scale for ring in rings]
+
+
+def _edge_boxes(ring, pad=0.0):
+    following = np.roll(ring, -1, axis=0)
+    return np.hstack([np.minimum(ring, following) - pad, np.maximum(ring, following) + pad])
+
+
+def _box_pairs(boxes_a, boxes_b, axis=0):
+    # Pairs (i, j) of a box of boxes_a and a box of boxes_b that meet,
+    # sweeping along longitude (axis 0) or latitude (axis 1)
+    boxes = np.vstack([boxes_a, boxes_b])
+    if axis:
+        boxes = boxes[:, [1, 0, 3, 2]]
+    first, second = [], []
+    for i, j in overlapping_boxes(boxes):
+        keep = (i < len(boxes_a)) & (j >= len(boxes_a))
+        first.append(i[keep])
+        second.append(j[keep] - len(boxes_a))
+    return np.concatenate(first), np.concatenate(second)
+
+
+def _split_edges(ring, other):
+    # Cut every edge of `ring` where it crosses an edge of `other` or passes
+    # through one of its vertices (which also covers edges lying along each
+    # other); returns the (start, end) points of the non-empty pieces. Only
+    # edges whose bounding boxes meet are compared.
+    edge = np.roll(ring, -1, axis=0) - ring
+    other_edge = np.roll(other, -1, axis=0) - other
+    i, j = _box_pairs(_edge_boxes(ring, ON_EDGE_METERS), _edge_boxes(other, ON_EDGE_METERS))
+    r, s = edge[i], other_edge[j]
+    offset = other[j] - ring[i]
+    denominator = _cross(r, s)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t = _cross(offset, s) / denominator
+        u = _cross(offset, r) / denominator
+        along = (offset * r).sum(axis=1) / (r * r).sum(axis=1)
+    crossing = (denominator != 0) & (t >= 0) & (t <= 1) & (u >= 0) & (u <= 1)
+    touching = (np.hypot(*(offset - along[:, None] * r).T) <= ON_EDGE_METERS) & (along > 0) & (along < 1)
+    cut = np.where(crossing, t, np.where(touching, along, np.nan))
+    cut_edge = i[~np.isnan(cut)]
+
+    # Every edge runs from 0 to 1 through its cuts in order
+    edges = np.concatenate([cut_edge, np.arange(len(ring)), np.arange(len(ring))])
+    cuts = np.concatenate([cut[~np.isnan(cut)], np.zeros(len(ring)), np.ones(len(ring))])
+    order = np.lexsort((cuts, edges))
+    edges, cuts = edges[order], cuts[order]
+    piece = (edges[:-1] == edges[1:]) & (np.diff(cuts) > 1e-12)
+    edges, low, high = edges[:-1][piece], cuts[:-1][piece], cuts[1:][piece]
+    return ring[edges] + low[:, None] * edge[edges], ring[edges] + high[:, None] * edge[edges]
+
+
+def _locate(points, ring):
+    # For each point: whether it is strictly inside the ring (crossing
+    # number), and the index of the ring edge it lies on, or -1
+    edge = np.roll(ring, -1, axis=0) - ring
+    boxes = _edge_boxes(ring, ON_EDGE_METERS)
+
+    on_edge = np.full(len(points), -1)
+    i, j = _box_pairs(np.hstack([points, points]), boxes)
+    offset = points[i] - ring[j]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t = np.clip((offset * edge[j]).sum(axis=1) / (edge[j] * edge[j]).sum(axis=1), 0.0, 1.0)
+    close = np.hypot(*(offset - t[:, None] * edge[j]).T) <= ON_EDGE_METERS
+    on_edge[i[close]] = j[close]
+
+    # Rays towards +x only meet edges that span their latitude, so sweep
+    # along latitude
+    rays = np.column_stack([points, np.full(len(points), boxes[:, 2].max()), points[:, 1]])
+    i, j = _box_pairs(rays, boxes, axis=1)
+    start, y = ring[j], points[i, 1]
+    straddles = (start[:, 1] > y) != (start[:, 1] + edge[j, 1] > y)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        x = start[:, 0] + (y - start[:, 1]) * edge[j, 0] / edge[j, 1]
+    crossings = np.bincount(i[straddles & (points[i, 0] < x)], minlength=len(points))
+    return (crossings % 2 == 1) & (on_edge < 0), on_edge
+
+
+def _boundary_integral(ring, other, shared):
+    # Green's theorem over the part of ring's boundary that bounds the
+    # intersection: pieces inside `other`, plus (if `shared`) pieces along
+    # an edge of `other` running the same way
+    starts, ends = _split_edges(ring, other)
+    inside, on_edge = _locate((starts + ends) / 2, other)
+    keep = inside
+    if shared:
+        other_edge = np.roll(other, -1, axis=0) - other
+        along = on_edge >= 0
+        same_way = ((ends - starts) * other_edge[np.maximum(on_edge, 0)]).sum(axis=1) > 0
+        keep = keep | (along & same_way)
+    return float(_cross(starts[keep], ends[keep]).sum()) / 2
+
+
+def intersection_area(a, b):
+    """Exact area of the intersection of two simple counter-clockwise rings.
+
+    The boundary of the intersection is made of the parts of each ring's
+    edges that lie inside the other ring, plus the stretches where both
+    rings run along the same line in the same direction (counted once).
+    Summing the shoelace terms of those pieces gives the area without
+    building the intersection polygon, for any pair of simple polygons,
+    convex or not. Rings only touching along an edge have zero overlap.
+    """
+    return max(_boundary_integral(a, b, True) + _boundary_integral(b, a, False), 0.0)
+
+
+def _counter_clockwise(ring):
+    return ring if signed_area(ring) >= 0 else ring[::-1]
+
+
+def measure_overlap(points_a, points_b):
+    """Overlap of two {lat, lng} boundaries.
+
+    Returns (overlap_hectares, fraction_a, fraction_b), the fractions being
+    the share of each project's own area that the overlap covers.
+    """
+    a, b = local_meters([_counter_clockwise(boundary_array(points_a)),
+                         _counter_clockwise(boundary_array(points_b))])
+    overlap = intersection_area(a, b)
+    area_a, area_b = signed_area(a), signed_area(b)
+    return (
+        overlap / SQUARE_METERS_PER_HECTARE,
+        min(overlap / area_a, 1.0) if area_a > 0 else 0.0,
+        min(overlap / area_b, 1.0) if area_b > 0 else 0.0,
+    )
@@ -0,0 +1,119 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+import bcrypt
+from flask import current_app, has_app_context
+
+
+class PasswordHasherBusy(Exception):
+    """Raised when a client or the whole hashing pool is over its limit"""
+
+
+_executor = None
+_executor_lock = threading.Lock()
+_pending = None
+_inflight_by_ip = {}
+_inflight_lock = threading.Lock()
+
+
+def _config(key, default):
+    if has_app_context():
+        return current_app.config.get(key, default)
+    return default
+
+
+def _get_executor():
+    """Create the bcrypt pool on first use so each forked worker gets its own"""
+    global _executor, _pending
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                workers = _config('PASSWORD_HASH_WORKERS', max(1, (os.cpu_count() or 2) // 2))
+                queue_size = _config('PASSWORD_HASH_QUEUE_SIZE', workers * 8)
+                _pending = threading.BoundedSemaphore(workers + queue_size)
+                _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='bcrypt')
+    return _executor
+
+
+def _acquire_client_slot(client_ip):
+    """Limit how many hashes a single client can have in flight at once"""
+    if client_ip is None:
+        return
+    limit = _config('PASSWORD_HASH_PER_IP_LIMIT', 2)
+    with _inflight_lock:
+        if _inflight_by_ip.get(client_ip, 0) >= limit:
+            raise PasswordHasherBusy(f'Too many concurrent password checks from {client_ip}')
+        _inflight_by_ip[client_ip] = _inflight_by_ip.get(client_ip, 0) + 1
+
+
+def _release_client_slot(client_ip):
+    if client_ip is None:
+        return
+    with _inflight_lock:
+        remaining = _inflight_by_ip[client_ip] - 1
+        if remaining:
+            _inflight_by_ip[client_ip] = remaining
+        else:
+            del _inflight_by_ip[client_ip]
+
+
+def _run(fn, *args, client_ip=None):
+    """Run a bcrypt call on the hashing pool and wait for its result.
+
+    The request thread blocks here until the hash is done, so a sync worker
+    stays occupied for the whole hash; the pool only caps how many cores
+    hashing can take (bcrypt releases the GIL). The queue and per-client
+    slots are released when the job finishes, not when the caller stops
+    waiting, so jobs that outlive a timeout still count against both limits.
+    """
+    executor = _get_executor()
+    timeout = _config('PASSWORD_HASH_TIMEOUT', 10)
+
+    _acquire_client_slot(client_ip)
+    if not _pending.acquire(timeout=timeout):
+        _release_client_slot(client_ip)
+        raise PasswordHasherBusy('Password hashing queue is full')
+
+    def release(_future):
+        _pending.release()
+        _release_client_slot(client_ip)
+
+    try:
+        future = executor.submit(fn, *args)
+    except BaseException:
+        release(None)
+        raise
+    future.add_done_callback(release)
+
+    try:
+        return future.result(timeout=timeout)
+    except FutureTimeoutError as e:
+        # Drop the job if it has not started; a running one frees its slots when done
+        future.cancel()
+        raise PasswordHasherBusy('Password hashing timed out') from e
+
+
+def _hash(password, rounds):
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds=rounds)).decode('utf-8')
+
+
+def _check(password, password_hash):
+    return bcrypt.checkpw(password.encode('utf-8'), password_hash.encode('utf-8'))
+
+
+def hash_password(password, client_ip=None):
+    rounds = _config('BCRYPT_ROUNDS', 12)
+    return _run(_hash, password, rounds, client_ip=client_ip)
+
+
+def verify_password(password, password_hash, client_ip=None):
+    return _run(_check, password, password_hash, client_ip=client_ip)
+
+
+def needs_rehash(password_hash):
+    """True when a stored hash was made with a different cost than configured"""
+    try:
+        cost = int(password_hash.split('$')[2])
+    except (AttributeError, IndexError, ValueError):
+        return False
+    return cost != _config('BCRYPT_ROUNDS', 12)
@@ -0,0 +1,141 @@
+import re
+import threading
+
+# Each %s placeholder becomes a numbered $n parameter in the PREPAREd form,
+# and %% a literal %
+_PLACEHOLDER = re.compile(r'%[s%]')
+
+
+class NamedQuery:
+    """A model query declared once under a stable name.
+
+    execute_query accepts a NamedQuery anywhere it accepts SQL text; on
+    each pooled connection the statement is PREPAREd on first use and then
+    run with EXECUTE, so the server parses and plans it once per
+    connection instead of on every call. Queries declared `read_only` may
+    be served by a read replica (see utils.database.ReplicaRouter). Writes
+    keep the user's following reads on the primary unless declared with
+    `read_back=False` (bookkeeping the user does not look at right away).
+    Queries declared `prepare=False` are always sent as plain SQL, so they
+    are planned for their actual parameter values every time.
+    """
+
+    __slots__ = ('name', 'sql', 'read_only', 'read_back', 'prepare', 'param_count', 'prepared_sql', 'preparable')
+
+    def __init__(self, name, sql, read_only=False, read_back=True, prepare=True):
+        self.name = name
+        self.sql = sql
+        self.read_only = read_only
+        self.read_back = read_back
+        self.prepare = prepare
+        self.param_count = _PLACEHOLDER.findall(sql).count('%s')
+        counter = iter(range(1, self.param_count + 1))
+        self.prepared_sql = _PLACEHOLDER.sub(
+            lambda m: '%' if m.group() == '%%' else f"${next(counter)}", sql
+        )
+        # Cleared when the server cannot infer the parameter types
+        self.preparable = prepare
+
+    @property
+    def statement_name(self):
+        return 'q_' + re.sub(r'\W', '_', self.name)
+
+    def execute_sql(self):
+        """EXECUTE statement with psycopg2 placeholders for the parameters"""
+        if not self.param_count:
+            return f"EXECUTE {self.statement_name}"
+        return f"EXECUTE {self.statement_name} ({', '.join(['%s'] * self.param_count)})"
+
+    def __str__(self):
+        return self.sql
+
+    def __repr__(self):
+        return f"NamedQuery({self.name!r})"
+
+
+_queries = {}
+
+
+def register_query(name, sql, read_only=False, read_back=True, prepare=True):
+    """Declare a named query; names must be unique across the application.
+
+    Only mark a query `read_only` when it may see data a few seconds
+    old: such queries can be routed to a lagging replica. Mark a write
+    `read_back=False` when the user does not need to see it on their next
+    request, so it does not pin their reads to the primary. Declare
+    `prepare=False` when the best plan depends on a parameter's value
+    (e.g. a LIKE pattern that only an index range scan serves well): a
+    prepared statement may switch to a generic plan that ignores it.
+    """
+    existing = _queries.get(name)
+    if existing is not None:
+        if (existing.sql != sql or existing.read_only != read_only or existing.read_back != read_back
+                or existing.prepare != prepare):
+            raise ValueError(f"Query '{name}' is already registered with different SQL")
+        return existing
+    query = _queries[name] = NamedQuery(name, sql, read_only=read_only, read_back=read_back, prepare=prepare)
+    return query
+
+
+def registered_queries():
+    return dict(_queries)
+
+
+class QueryStats:
+    """Per-query call counts and timings, shared by all threads of a worker"""
+
+    ADHOC = '<adhoc>'
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def _entry(self, name):
+        entry = self._stats.get(name)
+        if entry is None:
+            entry = self._stats[name] = {
+                'calls': 0, 'replica_calls': 0, 'errors': 0, 'total_ms': 0.0, 'max_ms': 0.0,
+                'slow': 0, 'last_plan': None, 'last_explained_at': None,
+            }
+        return entry
+
+    def record(self, name, elapsed_ms, error=False, slow=False, replica=False):
+        with self._lock:
+            entry = self._entry(name)
+            entry['calls'] += 1
+            if replica:
+                entry['replica_calls'] += 1
+            entry['total_ms'] += elapsed_ms
+            entry['max_ms'] = max(entry['max_ms'], elapsed_ms)
+            if error:
+                entry['errors'] += 1
+            if slow:
+                entry['slow'] += 1
+
+    def should_explain(self, name, now, interval):
+        """Claim the right to EXPLAIN a slow query at most once per interval"""
+        with self._lock:
+            entry = self._entry(name)
+            last = entry['last_explained_at']
+            if last is not None and now - last < interval:
+                return False
+            entry['last_explained_at'] = now
+            return True
+
+    def set_plan(self, name, plan):
+        with self._lock:
+            self._entry(name)['last_plan'] = plan
+
+    def snapshot(self):
+        with self._lock:
+            stats = {name: dict(entry) for name, entry in self._stats.items()}
+        for entry in stats.values():
+            entry['mean_ms'] = entry['total_ms'] / entry['calls'] if entry['calls'] else 0.0
+        return dict(sorted(stats.items(), key=lambda item: -item[1]['total_ms']))
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+
+query_stats = QueryStats()
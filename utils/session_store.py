@@ -0,0 +1,284 @@
+import os
+import secrets
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SessionInterface, SessionMixin
+from itsdangerous import BadSignature, Signer
+from werkzeug.datastructures import CallbackDict
+from utils.background import PeriodicTask, start_on_first_request
+from utils.cache import TTLCache
+from utils.database import execute_query
+
+# Sessions that are not permanent still need a server-side expiry
+DEFAULT_SESSION_LIFETIME = timedelta(days=1)
+
+
+class ServerSession(CallbackDict, SessionMixin):
+    """Session data kept on the server; the cookie only carries its signed ID"""
+
+    def __init__(self, initial=None, sid=None, new=False):
+        def on_update(self):
+            self.modified = True
+
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.new = new
+        self.modified = False
+        self.original_user_id = (initial or {}).get('user_id')
+
+
+class PostgresSessionBackend:
+    """Sessions stored in the user_sessions table"""
+
+    def load(self, sid):
+        query = """
+            SELECT data FROM user_sessions
+            WHERE id = %s AND expires_at > now()
+        """
+        result = execute_query(query, (sid,), fetch_one=True)
+        return result['data'] if result else None
+
+    def save(self, sid, data, user_id, expires_at):
+        query = """
+            INSERT INTO user_sessions (id, user_id, data, expires_at, last_accessed_at)
+            VALUES (%s, %s, %s, %s, now())
+            ON CONFLICT (id) DO UPDATE
+            SET user_id = EXCLUDED.user_id, data = EXCLUDED.data,
+                expires_at = EXCLUDED.expires_at, last_accessed_at = now()
+        """
+        execute_query(query, (sid, user_id, data, expires_at))
+
+    def delete(self, sid):
+        execute_query("DELETE FROM user_sessions WHERE id = %s", (sid,))
+
+    def delete_user_sessions(self, user_id):
+        query = "DELETE FROM user_sessions WHERE user_id = %s RETURNING id"
+        return [row['id'] for row in execute_query(query, (user_id,), fetch_all=True) or []]
+
+    def touch_many(self, touches):
+        query = """
+            UPDATE user_sessions AS s
+            SET last_accessed_at = t.accessed_at, expires_at = t.expires_at
+            FROM unnest(%s::text[], %s::timestamptz[], %s::timestamptz[]) AS t(id, accessed_at, expires_at)
+            WHERE s.id = t.id
+        """
+        execute_query(query, (
+            list(touches.keys()),
+            [accessed_at for accessed_at, _ in touches.values()],
+            [expires_at for _, expires_at in touches.values()],
+        ))
+
+    def purge_expired(self):
+        return execute_query("DELETE FROM user_sessions WHERE expires_at < now()")
+
+
+class SQLiteSessionBackend:
+    """Sessions stored in a local SQLite file, for single-host deployments"""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        with self._connection() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS user_sessions (
+                    id TEXT PRIMARY KEY,
+                    user_id TEXT,
+                    data TEXT NOT NULL,
+                    expires_at REAL NOT NULL,
+                    last_accessed_at REAL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_user_sessions_user_id ON user_sessions(user_id)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_user_sessions_expires_at ON user_sessions(expires_at)")
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def load(self, sid):
+        row = self._connection().execute(
+            "SELECT data FROM user_sessions WHERE id = ? AND expires_at > ?",
+            (sid, time.time())
+        ).fetchone()
+        return row[0] if row else None
+
+    def save(self, sid, data, user_id, expires_at):
+        with self._connection() as conn:
+            conn.execute("""
+                INSERT INTO user_sessions (id, user_id, data, expires_at, last_accessed_at)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (id) DO UPDATE
+                SET user_id = excluded.user_id, data = excluded.data,
+                    expires_at = excluded.expires_at, last_accessed_at = excluded.last_accessed_at
+            """, (sid, user_id, data, expires_at.timestamp(), time.time()))
+
+    def delete(self, sid):
+        with self._connection() as conn:
+            conn.execute("DELETE FROM user_sessions WHERE id = ?", (sid,))
+
+    def delete_user_sessions(self, user_id):
+        with self._connection() as conn:
+            sids = [row[0] for row in conn.execute(
+                "SELECT id FROM user_sessions WHERE user_id = ?", (user_id,)
+            )]
+            conn.execute("DELETE FROM user_sessions WHERE user_id = ?", (user_id,))
+        return sids
+
+    def touch_many(self, touches):
+        with self._connection() as conn:
+            conn.executemany(
+                "UPDATE user_sessions SET last_accessed_at = ?, expires_at = ? WHERE id = ?",
+                [(accessed_at.timestamp(), expires_at.timestamp(), sid)
+                 for sid, (accessed_at, expires_at) in touches.items()]
+            )
+
+    def purge_expired(self):
+        with self._connection() as conn:
+            return conn.execute("DELETE FROM user_sessions WHERE expires_at < ?", (time.time(),)).rowcount
+
+
+class ServerSideSessionInterface(SessionInterface):
+    """Flask session interface backed by a server-side store.
+
+    Reads go through a small per-process LRU cache, so most requests resolve
+    their session without touching the store. Last-access times are buffered
+    in memory and written behind in one batch by a background task. Cached
+    entries live for at most `cache_ttl` seconds, which bounds how long a
+    revoked session stays usable in another process.
+    """
+
+    serializer = TaggedJSONSerializer()
+
+    def __init__(self, backend, cache_size=4096, cache_ttl=5):
+        self.backend = backend
+        self.cache = TTLCache(maxsize=cache_size, ttl=cache_ttl)
+        self._touches = {}
+        self._touches_lock = threading.Lock()
+
+    def _signer(self, app):
+        return Signer(app.secret_key, salt='shcap-server-session')
+
+    def _expires_at(self, app, session):
+        lifetime = app.permanent_session_lifetime if session.permanent else DEFAULT_SESSION_LIFETIME
+        return datetime.now(timezone.utc) + lifetime
+
+    def open_session(self, app, request):
+        cookie = request.cookies.get(self.get_cookie_name(app))
+        if not cookie:
+            return ServerSession(sid=secrets.token_urlsafe(32), new=True)
+
+        try:
+            sid = self._signer(app).unsign(cookie).decode('utf-8')
+        except BadSignature:
+            return ServerSession(sid=secrets.token_urlsafe(32), new=True)
+
+        # The cache holds the serialized form so every request gets its own copy
+        raw = self.cache.get(sid)
+        if raw is None:
+            raw = self.backend.load(sid)
+            if raw is None:
+                return ServerSession(sid=secrets.token_urlsafe(32), new=True)
+            self.cache.set(sid, raw)
+
+        return ServerSession(self.serializer.loads(raw), sid=sid)
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+
+        if not session:
+            if session.modified:
+                self.backend.delete(session.sid)
+                self.cache.pop(session.sid)
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+
+        if not session.modified and not session.new:
+            # Unchanged session: buffer the access and extend its expiry
+            # without a write, then refresh the cookie as Flask would
+            with self._touches_lock:
+                self._touches[session.sid] = (datetime.now(timezone.utc), self._expires_at(app, session))
+            if self.should_set_cookie(app, session):
+                self._set_cookie(app, session, response)
+            return
+
+        user_id = session.get('user_id')
+        if not session.new and user_id != session.original_user_id:
+            # Issue a fresh ID when the logged-in user changes (session fixation)
+            self.backend.delete(session.sid)
+            self.cache.pop(session.sid)
+            session.sid = secrets.token_urlsafe(32)
+
+        raw = self.serializer.dumps(dict(session))
+        self.backend.save(session.sid, raw, user_id, self._expires_at(app, session))
+        self.cache.set(session.sid, raw)
+        self._set_cookie(app, session, response)
+
+    def _set_cookie(self, app, session, response):
+        response.set_cookie(
+            self.get_cookie_name(app),
+            self._signer(app).sign(session.sid).decode('utf-8'),
+            expires=self.get_expiration_time(app, session),
+            httponly=self.get_cookie_httponly(app),
+            domain=self.get_cookie_domain(app),
+            path=self.get_cookie_path(app),
+            secure=self.get_cookie_secure(app),
+            samesite=self.get_cookie_samesite(app),
+        )
+
+    def flush_touches(self):
+        """Write buffered last-access and expiry times to the store in one batch"""
+        with self._touches_lock:
+            touches, self._touches = self._touches, {}
+        if touches:
+            self.backend.touch_many(touches)
+
+    def revoke_user_sessions(self, user_id):
+        """Log a user out everywhere"""
+        for sid in self.backend.delete_user_sessions(str(user_id)):
+            self.cache.pop(sid)
+
+
+def revoke_user_sessions(app, user_id):
+    """Revoke all sessions of a user when a server-side store is configured"""
+    if isinstance(app.session_interface, ServerSideSessionInterface):
+        app.session_interface.revoke_user_sessions(user_id)
+
+
+def init_session_store(app):
+    """Replace the signed-cookie session with the configured server-side store"""
+    backend_name = app.config.get('SESSION_BACKEND', 'cookie')
+    if backend_name == 'cookie':
+        return None
+
+    if backend_name == 'postgres':
+        backend = PostgresSessionBackend()
+    elif backend_name == 'sqlite':
+        backend = SQLiteSessionBackend(app.config.get('SESSION_SQLITE_PATH', 'sessions.sqlite3'))
+    else:
+        raise ValueError(f"Unknown SESSION_BACKEND: {backend_name}")
+
+    interface = ServerSideSessionInterface(
+        backend,
+        cache_size=app.config.get('SESSION_CACHE_SIZE', 4096),
+        cache_ttl=app.config.get('SESSION_CACHE_TTL', 5),
+    )
+    app.session_interface = interface
+
+    def maintain():
+        interface.flush_touches()
+        backend.purge_expired()
+
+    task = PeriodicTask('session-store', app.config.get('SESSION_TOUCH_INTERVAL', 30), maintain, app)
+    start_on_first_request(app, task)
+    return interface
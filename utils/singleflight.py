@@ -0,0 +1,68 @@
+import threading
+
+
+class _Call:
+    __slots__ = ('event', 'result', 'error', 'waiters')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Coalesce concurrent calls that share a key into one computation.
+
+    The first caller for a key (the leader) runs the function; callers that
+    arrive while it is in flight wait for its result instead of repeating
+    the work. Followers wait at most `timeout` seconds and then compute the
+    result themselves, so a slow leader never blocks them for longer than
+    that. Results are shared between callers and must not be mutated.
+    """
+
+    def __init__(self, name, timeout=10):
+        self.name = name
+        self.timeout = timeout
+        self._calls = {}
+        self._lock = threading.Lock()
+        self._metrics = {'leaders': 0, 'coalesced': 0, 'timeouts': 0, 'errors': 0, 'max_waiters': 0}
+
+    def do(self, key, fn, timeout=None):
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = self._calls[key] = _Call()
+                self._metrics['leaders'] += 1
+                leader = True
+            else:
+                call.waiters += 1
+                self._metrics['coalesced'] += 1
+                self._metrics['max_waiters'] = max(self._metrics['max_waiters'], call.waiters)
+                leader = False
+
+        if leader:
+            try:
+                call.result = fn()
+                return call.result
+            except Exception as e:
+                call.error = e
+                with self._lock:
+                    self._metrics['errors'] += 1
+                raise
+            finally:
+                with self._lock:
+                    del self._calls[key]
+                call.event.set()
+
+        if not call.event.wait(self.timeout if timeout is None else timeout):
+            with self._lock:
+                self._metrics['timeouts'] += 1
+            return fn()
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    def metrics(self):
+        with self._lock:
+            return {'name': self.name, 'in_flight': len(self._calls), **self._metrics}
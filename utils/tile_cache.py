@@ -0,0 +1,127 @@
+import os
+import tempfile
+import time
+from flask import current_app, has_app_context
+from utils.vector_tiles import tile_range
+
+# Scope of the tiles that show every project rather than one user's
+ALL_PROJECTS = 'all'
+
+
+class TileCache:
+    """Rendered vector tiles on local disk, as <dir>/<scope>/<z>/<x>/<y>.mvt.
+
+    The directory is shared by all worker processes. When a project
+    changes, every cached tile its bounding box touches is deleted, from
+    its owner's scope and from the all-projects scope. A tile rendered
+    while such an invalidation ran could still hold the old project, so
+    each scope keeps an `.invalidated` marker and tiles whose rendering
+    started before its last change are not kept. Tiles above `max_zoom`
+    are always rendered fresh: they are cheap, and a large project covers
+    too many of them to invalidate.
+    """
+
+    def __init__(self, directory, max_zoom=16):
+        self.directory = directory
+        self.max_zoom = max_zoom
+
+    def _path(self, scope, z, x, y):
+        return os.path.join(self.directory, str(scope), str(z), str(x), f"{y}.mvt")
+
+    def _marker(self, scope):
+        return os.path.join(self.directory, str(scope), '.invalidated')
+
+    def get(self, scope, z, x, y):
+        if z > self.max_zoom:
+            return None
+        try:
+            with open(self._path(scope, z, x, y), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def _invalidated_since(self, scope, rendered_at):
+        try:
+            return os.stat(self._marker(scope)).st_mtime >= rendered_at
+        except FileNotFoundError:
+            return False
+
+    def put(self, scope, z, x, y, data, rendered_at):
+        """Store a tile whose rendering started at `rendered_at` (time.time())"""
+        if z > self.max_zoom or self._invalidated_since(scope, rendered_at):
+            return
+
+        path = self._path(scope, z, x, y)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except OSError:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+            raise
+
+        # invalidate() touches the marker before it deletes tiles, so a tile
+        # written during its scan is either deleted by it or caught here
+        if self._invalidated_since(scope, rendered_at):
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+
+    def _touch_marker(self, scope):
+        marker = self._marker(scope)
+        os.makedirs(os.path.dirname(marker), exist_ok=True)
+        with open(marker, 'a'):
+            pass
+        now = time.time()
+        os.utime(marker, (now, now))
+
+    def invalidate(self, owner_id, bbox):
+        """Delete the cached tiles a project's (min_lng, min_lat, max_lng,
+        max_lat) bounding box touches; returns the number deleted"""
+        deleted = 0
+        for scope in (str(owner_id), ALL_PROJECTS):
+            self._touch_marker(scope)
+            for z in range(self.max_zoom + 1):
+                x0, y0, x1, y1 = tile_range(z, *bbox)
+                # Walk the tiles that are cached rather than all the tiles
+                # in range, which are many for a large project at high zoom
+                zoom_dir = os.path.join(self.directory, scope, str(z))
+                try:
+                    columns = [e for e in os.scandir(zoom_dir) if e.name.isdigit() and x0 <= int(e.name) <= x1]
+                except FileNotFoundError:
+                    continue
+                for column in columns:
+                    for entry in os.scandir(column.path):
+                        name, ext = os.path.splitext(entry.name)
+                        if ext == '.mvt' and y0 <= int(name) <= y1:
+                            try:
+                                os.unlink(entry.path)
+                                deleted += 1
+                            except FileNotFoundError:
+                                pass
+        return deleted
+
+
+def get_tile_cache(app):
+    """The tile cache configured for the app"""
+    cache = app.extensions.get('tile_cache')
+    if cache is None:
+        cache = TileCache(app.config['TILE_CACHE_DIR'], max_zoom=app.config.get('TILE_CACHE_MAX_ZOOM', 16))
+        cache = app.extensions.setdefault('tile_cache', cache)
+    return cache
+
+
+def invalidate_project_tiles(owner_id, bbox):
+    """Drop the cached tiles a changed project appears in"""
+    if bbox is None or not has_app_context() or not current_app.config.get('TILE_CACHE_DIR'):
+        return
+    try:
+        get_tile_cache(current_app).invalidate(owner_id, bbox)
+    except OSError as e:
+        print(f" TILE CACHE ERROR: {e}")
@@ -0,0 +1,249 @@
+import math
+import struct
+import numpy as np
+from utils.geometry import boundary_array
+
+# Tile coordinate space of each feature geometry, per the MVT 2 spec
+EXTENT = 4096
+
+# Geometry is kept this many units beyond the tile edge so strokes of
+# polygons that cross the edge join up with the neighbouring tile
+BUFFER = 64
+
+MAX_ZOOM = 22
+
+# Protobuf wire types
+_VARINT = 0
+_FIXED64 = 1
+_LENGTH = 2
+
+# Geometry commands
+_MOVE_TO = 1
+_LINE_TO = 2
+_CLOSE_PATH = 7
+
+# Feature.type
+_POLYGON = 3
+
+
+def valid_tile(z, x, y):
+    return 0 <= z <= MAX_ZOOM and 0 <= x < 2 ** z and 0 <= y < 2 ** z
+
+
+def _world_y(lat):
+    lat = np.radians(np.clip(lat, -85.05112878, 85.05112878))
+    return (1 - np.arcsinh(np.tan(lat)) / math.pi) / 2
+
+
+def _lat(world_y):
+    return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * world_y))))
+
+
+def tile_bounds(z, x, y, buffer=BUFFER):
+    """(min_lng, min_lat, max_lng, max_lat) of a tile including its buffer"""
+    n = 2 ** z
+    pad = buffer / EXTENT
+    return (
+        (x - pad) / n * 360 - 180,
+        _lat(min((y + 1 + pad) / n, 1.0)),
+        (x + 1 + pad) / n * 360 - 180,
+        _lat(max((y - pad) / n, 0.0)),
+    )
+
+
+def tile_range(z, min_lng, min_lat, max_lng, max_lat, buffer=BUFFER):
+    """Inclusive (x0, y0, x1, y1) of the tiles at zoom z whose buffered
+    area touches a bounding box"""
+    n = 2 ** z
+    pad = buffer / EXTENT
+    x0 = math.floor((min_lng + 180) / 360 * n - pad)
+    x1 = math.floor((max_lng + 180) / 360 * n + pad)
+    y0 = math.floor(float(_world_y(max_lat)) * n - pad)
+    y1 = math.floor(float(_world_y(min_lat)) * n + pad)
+    clamp = lambda v: min(max(v, 0), n - 1)
+    return clamp(x0), clamp(y0), clamp(x1), clamp(y1)
+
+
+def to_tile_coordinates(ring, z, x, y):
+    """(lng, lat) ring -> float tile coordinates, y pointing down"""
+    n = 2 ** z
+    tx = ((ring[:, 0] + 180) / 360 * n - x) * EXTENT
+    ty = (_world_y(ring[:, 1]) * n - y) * EXTENT
+    return np.column_stack([tx, ty])
+
+
+def _clip_half_plane(ring, axis, bound, keep_below):
+    # One Sutherland-Hodgman pass: every edge i -> i+1 contributes its
+    # crossing point (if it crosses the bound) and then its end point (if
+    # that is inside), built for all edges at once
+    inside = ring[:, axis] <= bound if keep_below else ring[:, axis] >= bound
+    following = np.roll(ring, -1, axis=0)
+    following_inside = np.roll(inside, -1)
+    crosses = inside != following_inside
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t = (bound - ring[:, axis]) / (following[:, axis] - ring[:, axis])
+        # Edges parallel to the bound get t = inf/nan; they never cross it
+        crossing = ring + t[:, None] * (following - ring)
+    crossing[:, axis] = bound
+    points = np.stack([crossing, following], axis=1)
+    return points[np.stack([crosses, following_inside], axis=1)]
+
+
+def clip_ring(ring, low=-BUFFER, high=EXTENT + BUFFER):
+    for axis in (0, 1):
+        for bound, keep_below in ((low, False), (high, True)):
+            if len(ring) == 0:
+                return ring
+            ring = _clip_half_plane(ring, axis, bound, keep_below)
+    return ring
+
+
+def quantize_ring(ring):
+    """Round to integer tile coordinates and drop points that collapse
+    together; None when nothing with an area is left"""
+    ring = np.rint(ring).astype(np.int64)
+    if len(ring):
+        ring = ring[np.any(ring != np.roll(ring, 1, axis=0), axis=1)]
+    if len(ring) < 3:
+        return None
+    area = int((ring[:, 0] * np.roll(ring[:, 1], -1) - np.roll(ring[:, 0], -1) * ring[:, 1]).sum())
+    if area == 0:
+        return None
+    # Exterior rings wind clockwise on screen: positive area with y down
+    return ring if area > 0 else ring[::-1]
+
+
+def _zigzag(values):
+    return (values << 1) ^ (values >> 63)
+
+
+def _varint(value, out):
+    while value > 0x7F:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _key(field, wire_type, out):
+    _varint((field << 3) | wire_type, out)
+
+
+def _bytes_field(field, data, out):
+    _key(field, _LENGTH, out)
+    _varint(len(data), out)
+    out += data
+
+
+def _packed_field(field, values, out):
+    packed = bytearray()
+    for value in values:
+        _varint(int(value), packed)
+    _bytes_field(field, packed, out)
+
+
+def encode_ring_commands(ring, cursor):
+    """Geometry commands for one closed ring, continuing from `cursor`"""
+    deltas = np.diff(np.vstack([cursor, ring]), axis=0)
+    params = _zigzag(deltas).ravel()
+    commands = [(_MOVE_TO | (1 << 3)), int(params[0]), int(params[1]),
+                (_LINE_TO | ((len(ring) - 1) << 3))]
+    commands.extend(params[2:].tolist())
+    commands.append(_CLOSE_PATH | (1 << 3))
+    return commands, ring[-1]
+
+
+def _encode_value(value):
+    out = bytearray()
+    if isinstance(value, bool):
+        _key(7, _VARINT, out)
+        _varint(int(value), out)
+    elif isinstance(value, int):
+        _key(6, _VARINT, out)
+        _varint(int(_zigzag(np.int64(value))), out)
+    elif isinstance(value, float):
+        _key(3, _FIXED64, out)
+        out += struct.pack('<d', value)
+    else:
+        _bytes_field(1, str(value).encode('utf-8'), out)
+    return bytes(out)
+
+
+class Layer:
+    """One MVT layer of polygon features, with shared key and value tables"""
+
+    def __init__(self, name, extent=EXTENT):
+        self.name = name
+        self.extent = extent
+        self.features = []
+        self._keys = {}
+        self._values = {}
+
+    def _index(self, table, item):
+        index = table.get(item)
+        if index is None:
+            index = table[item] = len(table)
+        return index
+
+    def add_polygon(self, feature_id, rings, properties):
+        """Add a feature from already clipped and quantized rings"""
+        geometry = []
+        cursor = np.zeros(2, dtype=np.int64)
+        for ring in rings:
+            commands, cursor = encode_ring_commands(ring, cursor)
+            geometry.extend(commands)
+
+        tags = []
+        for key, value in properties.items():
+            if value is None:
+                continue
+            # Keyed by type too, so 1 and 1.0 and True stay distinct values
+            tags.append(self._index(self._keys, key))
+            tags.append(self._index(self._values, (type(value).__name__, value)))
+
+        feature = bytearray()
+        _key(1, _VARINT, feature)
+        _varint(int(feature_id), feature)
+        _packed_field(2, tags, feature)
+        _key(3, _VARINT, feature)
+        _varint(_POLYGON, feature)
+        _packed_field(4, geometry, feature)
+        self.features.append(bytes(feature))
+
+    def encode(self):
+        out = bytearray()
+        _key(15, _VARINT, out)
+        _varint(2, out)
+        _bytes_field(1, self.name.encode('utf-8'), out)
+        for feature in self.features:
+            _bytes_field(2, feature, out)
+        for key in self._keys:
+            _bytes_field(3, key.encode('utf-8'), out)
+        for _, value in self._values:
+            _bytes_field(4, _encode_value(value), out)
+        _key(5, _VARINT, out)
+        _varint(self.extent, out)
+        return bytes(out)
+
+
+def encode_tile(layers):
+    """Serialize a Tile message from layers that have features"""
+    out = bytearray()
+    for layer in layers:
+        if layer.features:
+            _bytes_field(3, layer.encode(), out)
+    return bytes(out)
+
+
+def add_boundary(layer, z, x, y, feature_id, boundary, properties):
+    """Project, clip and quantize a {lat, lng} boundary into the tile.
+
+    Returns False when nothing of the polygon is left in the tile.
+    """
+    if not boundary or len(boundary) < 3:
+        return False
+    ring = to_tile_coordinates(boundary_array(boundary), z, x, y)
+    ring = quantize_ring(clip_ring(ring))
+    if ring is None:
+        return False
+    layer.add_polygon(feature_id, [ring], properties)
+    return True